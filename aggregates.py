@@ -0,0 +1,83 @@
+import threading
+from collections import Counter, defaultdict
+
+from customers import normalize_phone
+
+
+class OrderAggregates:
+    """Dashboard numbers kept up to date as each order is recorded.
+
+    record() is O(items in the order); snapshot() never walks the orders.
+    Hourly and daily buckets are keyed by the prefix of the order's
+    "YYYY-MM-DD HH:MM:SS" time string.
+    """
+
+    def __init__(self, orders=()):
+        self._lock = threading.Lock()
+        self.total_orders = 0
+        self.revenue = 0
+        self.phones = set()
+        self.rating_sum = 0
+        self.rating_count = 0
+        self.items = Counter()
+        self.hourly = defaultdict(lambda: {"orders": 0, "revenue": 0})
+        self.daily = defaultdict(lambda: {"orders": 0, "revenue": 0})
+        for order in orders:
+            self.record(order)
+
+    def record(self, order):
+        total = order.get("total") or 0
+        time = order.get("time", "")
+        with self._lock:
+            self.total_orders += 1
+            self.revenue += total
+            self.phones.add(normalize_phone(order.get("phone")))
+            if order.get("rating"):
+                self.rating_sum += order["rating"]
+                self.rating_count += 1
+            self.items.update(order.get("items", []))
+            for bucket in (self.hourly[time[:13]], self.daily[time[:10]]):
+                bucket["orders"] += 1
+                bucket["revenue"] += total
+
+    def avg_rating(self):
+        return round(self.rating_sum / max(self.rating_count, 1), 1)
+
+    def top_items(self, n=5):
+        with self._lock:
+            return self.items.most_common(n)
+
+    def snapshot(self):
+        return {
+            "total_orders": self.total_orders,
+            "total_revenue": self.revenue,
+            "unique_customers": len(self.phones),
+            "avg_rating": self.avg_rating(),
+            "top_items": self.top_items(),
+        }
+
+    def changes(self, order):
+        """What record(order) changed, as current values (not increments).
+
+        Applying the same change twice, or after a fresh snapshot that
+        already includes the order, leaves a dashboard correct.
+        """
+        time = order.get("time", "")
+        with self._lock:
+            return {
+                "total_orders": self.total_orders,
+                "total_revenue": self.revenue,
+                "unique_customers": len(self.phones),
+                "avg_rating": self.avg_rating(),
+                "items": {item: self.items[item] for item in order.get("items", [])},
+                "hourly": {time[:13]: dict(self.hourly[time[:13]])},
+                "daily": {time[:10]: dict(self.daily[time[:10]])},
+            }
+
+    def rollups(self, hours=24, days=30):
+        """Most recent hourly and daily buckets, oldest first."""
+        with self._lock:
+            return {
+                "hourly": {k: dict(self.hourly[k]) for k in sorted(self.hourly)[-hours:]},
+                "daily": {k: dict(self.daily[k]) for k in sorted(self.daily)[-days:]},
+            }
@@ -0,0 +1,61 @@
+"""Static pages and scripts, built once and served with validators.
+
+Each asset is read at startup, precompressed (gzip, plus brotli when the
+optional `brotli` package is installed) and given a strong ETag per
+encoding. Conditional requests get a bodiless 304.
+"""
+import gzip
+import hashlib
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HTML_CACHE = "no-cache"  # always revalidate; a match costs one 304
+SCRIPT_CACHE = "public, max-age=300"
+
+
+class Asset:
+    def __init__(self, body, media_type, cache_control=HTML_CACHE):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.media_type = media_type
+        self.cache_control = cache_control
+        tag = hashlib.sha256(body).hexdigest()[:32]
+        # encoding -> (bytes, etag)
+        self.variants = {"identity": (body, f'"{tag}"')}
+        self.variants["gzip"] = (gzip.compress(body, 9, mtime=0), f'"{tag}-gz"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body), f'"{tag}-br"')
+
+    @classmethod
+    def from_file(cls, path, media_type, cache_control=HTML_CACHE):
+        with open(path, "rb") as f:
+            return cls(f.read(), media_type, cache_control)
+
+    def pick(self, accept_encoding):
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return encoding
+        return "identity"
+
+    def response(self, request):
+        encoding = self.pick(request.headers.get("accept-encoding", ""))
+        body, etag = self.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
@@ -0,0 +1,199 @@
+"""Admission control: limiter overhead at high request rates and an abusive client.
+
+1. limits.RateLimiter.hit() per call with a few hot keys and with a
+   stream of --keys distinct ones (table full, sweeping), and the memory
+   it holds per key, against a dict of scheduler.TokenBucket objects.
+
+2. /chat menu questions (answered locally, no LLM) in-process from
+   --clients client IPs, with admission control on and off: the cost per
+   request it adds at the highest rate this process can drive.
+
+3. Against the stub Groq server: one client opening new sessions as
+   fast as it can next to --customers customers ordering normally, with
+   and without the limits. Counts the LLM calls each side got and how
+   the customers fared:
+
+    python bench/admission_bench.py --keys 1000000 --clients 1000 --customers 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import limits  # noqa: E402
+import scheduler  # noqa: E402
+import stub_groq  # noqa: E402
+
+
+def limiter_cost(keys):
+    limiter = limits.RateLimiter(60, burst=20, max_keys=100_000)
+    hot = [f"10.0.0.{i}" for i in range(256)]
+    n = 1_000_000
+    start = time.perf_counter()
+    for i in range(n):
+        limiter.hit(hot[i & 255])
+    hot_ns = (time.perf_counter() - start) / n * 1e9
+
+    names = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(keys)]
+    start = time.perf_counter()
+    for name in names:
+        limiter.hit(name)
+    cold_ns = (time.perf_counter() - start) / keys * 1e9
+
+    def held(make, fill):
+        tracemalloc.start()
+        table = make()
+        fill(table)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return size / 100_000
+
+    now = time.monotonic()
+    gcra = held(lambda: limits.RateLimiter(60, burst=20, max_keys=100_000),
+                lambda t: [t.hit(i, now) for i in range(100_000)])
+
+    def buckets(table):
+        for i in range(100_000):
+            bucket = table[i] = scheduler.TokenBucket(20, 20.0)
+            bucket.take(1)
+
+    objects = held(dict, buckets)
+    print(f"RateLimiter.hit(): {hot_ns:.0f} ns with 256 hot keys, {cold_ns:.0f} ns per new key "
+          f"over {keys:,} keys ({limiter.metrics['evicted']:,} evicted, {len(limiter):,} held)")
+    print(f"memory per key: {gcra:.0f} bytes (one float) vs {objects:.0f} bytes (TokenBucket objects)")
+
+
+async def menu_rps(clients, requests, admission):
+    import httpx
+    import main
+
+    saved = main.ip_limiter, main.session_limiter, main.chat_slots
+    if admission:
+        main.ip_limiter = limits.RateLimiter(600, burst=100)
+        main.session_limiter = limits.RateLimiter(600, burst=100)
+        main.chat_slots = limits.ConcurrencyLimit(500)
+    latency = []
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                     base_url="http://bench", timeout=None) as client:
+            async def one(i):
+                start = time.perf_counter()
+                r = await client.post("/chat", json={"text": "menu", "session_id": f"rps-{i % clients}"},
+                                      headers={"X-Forwarded-For": f"10.1.{i % clients >> 8}.{i % clients & 255}"})
+                latency.append(time.perf_counter() - start)
+                return r.status_code
+
+            start = time.perf_counter()
+            statuses = []
+            for batch in range(0, requests, 100):
+                statuses += await asyncio.gather(*(one(i) for i in range(batch, min(batch + 100, requests))))
+            elapsed = time.perf_counter() - start
+    finally:
+        main.ip_limiter, main.session_limiter, main.chat_slots = saved
+    latency.sort()
+    return requests / elapsed, latency[len(latency) // 2], statuses.count(429)
+
+
+async def abuse(args, admission):
+    import httpx
+    import main
+
+    saved = main.ip_limiter, main.session_limiter, main.chat_slots
+    if admission:
+        main.ip_limiter = limits.RateLimiter(60, burst=20)
+        main.session_limiter = limits.RateLimiter(20, burst=6)
+        main.chat_slots = limits.ConcurrencyLimit(args.max_in_flight)
+    stats = {"abuser": {"ok": 0, "429": 0, "other": 0}, "customers": {"ok": 0, "429": 0, "other": 0}}
+    latency = []
+    url = os.environ["GROQ_BASE_URL"]
+    before = httpx.get(f"{url}/stub/stats").json()["served"]
+    stop = asyncio.Event()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                     base_url="http://bench", timeout=None) as client:
+            async def post(who, ip, session, text):
+                r = await client.post("/chat", json={"text": text, "session_id": session},
+                                      headers={"X-Forwarded-For": ip})
+                kind = "ok" if r.status_code == 200 else "429" if r.status_code == 429 else "other"
+                stats[who][kind] += 1
+                return r
+
+            async def abuser(worker):
+                # A script on a new session every time, never honouring Retry-After; distinct
+                # texts so the reply cache can't coalesce them. Refused requests pause briefly
+                # only because client and server share this CPU
+                n = 0
+                while not stop.is_set():
+                    n += 1
+                    r = await post("abuser", "10.9.9.9", f"loop-{worker}-{n}", f"hello again {worker}-{n}")
+                    if r.status_code == 429:
+                        await asyncio.sleep(0.01)
+
+            async def customer(i):
+                ip = f"10.2.0.{i}"
+                for text in (f"i want 1 zinger burger please, table {i}", f"naam Ali number 0300 {i:07d}"):
+                    await asyncio.sleep(random.uniform(0.5, 2.0))
+                    start = time.perf_counter()
+                    await post("customers", ip, f"customer-{i}", text)
+                    latency.append(time.perf_counter() - start)
+
+            flood = [asyncio.create_task(abuser(w)) for w in range(args.abuser_workers)]
+            await asyncio.gather(*(customer(i) for i in range(args.customers)))
+            stop.set()
+            await asyncio.gather(*flood)
+    finally:
+        main.ip_limiter, main.session_limiter, main.chat_slots = saved
+    calls = httpx.get(f"{url}/stub/stats").json()["served"] - before
+    latency.sort()
+    return stats, calls, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--customers", type=int, default=20)
+    parser.add_argument("--abuser-workers", type=int, default=20)
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    limiter_cost(args.keys)
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ["ADMISSION_CONTROL"] = "0"  # each run below installs its own limits
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    with stub_groq.running(args.port, "--latency", args.latency):
+        rps, abused = asyncio.run(run_all(args))  # one loop: the LLM client's connections belong to it
+
+    print(f"/chat menu questions, {args.requests:,} requests from {args.clients:,} clients:")
+    for admission, (rate, p50, limited) in rps:
+        print(f"  admission {'on ' if admission else 'off'}  {rate:8,.0f} req/s  p50 {p50 * 1000:6.2f} ms"
+              f"  ({limited} limited)")
+    print(f"one client looping ({args.abuser_workers} at a time) next to {args.customers} customers, "
+          f"stub {args.latency * 1000:.0f} ms:")
+    for admission, (stats, calls, latency) in abused:
+        a, c = stats["abuser"], stats["customers"]
+        print(f"  admission {'on ' if admission else 'off'}  LLM calls {calls:5}  abuser {a['ok']} served, "
+              f"{a['429']} refused; customers {c['ok']}/{sum(c.values())} served, "
+              f"turn p50 {latency[len(latency) // 2] * 1000:.0f} ms, max {latency[-1] * 1000:.0f} ms")
+
+
+async def run_all(args):
+    rps = [(admission, await menu_rps(args.clients, args.requests, admission)) for admission in (False, True)]
+    abused = [(admission, await abuse(args, admission)) for admission in (False, True)]
+    return rps, abused
+
+
+if __name__ == "__main__":
+    main()
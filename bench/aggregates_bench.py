@@ -0,0 +1,80 @@
+"""Incremental dashboard aggregates vs the old full rescan per /admin load.
+
+    python bench/aggregates_bench.py --orders 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregates import OrderAggregates  # noqa: E402
+
+ITEMS = ["Zinger Burger", "Chicken Karahi", "Biryani", "Fries", "Cold Drink", "Pizza"]
+
+
+def make_orders(n):
+    rng = random.Random(1)
+    for i in range(n):
+        order = {
+            "id": i + 1,
+            "phone": f"03{rng.randrange(10**9):09d}",
+            "items": rng.sample(ITEMS, rng.randint(1, 3)),
+            "total": rng.randrange(100, 2000, 50),
+            "time": f"2026-10-{1 + i * 30 // n:02d} {i % 24:02d}:00:00",
+        }
+        if rng.random() < 0.3:
+            order["rating"] = rng.randint(1, 5)
+        yield order
+
+
+def rescan(orders):
+    """What admin_dashboard() computed on every request before."""
+    total_revenue = sum(o.get('total', 0) for o in orders)
+    unique_customers = len(set(o.get('phone', '') for o in orders))
+    avg_rating = round(sum(o.get('rating', 0) for o in orders if o.get('rating')) / max(len([o for o in orders if o.get('rating')]), 1), 1)
+    item_counts = Counter()
+    for o in orders:
+        for item in o.get('items', []):
+            item_counts[item] += 1
+    return total_revenue, unique_customers, avg_rating, item_counts.most_common(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    orders = list(make_orders(args.orders))
+    agg = OrderAggregates()
+    start = time.perf_counter()
+    for order in orders:
+        agg.record(order)
+    record = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        snap = agg.snapshot()
+    snapshot = (time.perf_counter() - start) / 1000
+
+    start = time.perf_counter()
+    old = rescan(orders)
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    agg.rollups()
+    rollups = time.perf_counter() - start
+
+    assert (snap["total_revenue"], snap["unique_customers"], snap["avg_rating"], snap["top_items"]) == old
+    print(f"{args.orders:,} orders")
+    print(f"record():   {record / args.orders * 1e6:.2f} us/order")
+    print(f"snapshot(): {snapshot * 1e6:.1f} us per /admin load")
+    print(f"rescan:     {scan * 1000:.0f} ms per /admin load ({scan / snapshot:,.0f}x slower)")
+    print(f"rollups():  {rollups * 1e6:.0f} us (24 hourly + 30 daily buckets)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Response cache hit rate and single-flight on common opening turns.
+
+Many fresh sessions send the opening turn(s) of bench/conversations.jsonl
+at once, the way landing-page and widget visitors do:
+
+    python bench/cache_bench.py --sessions 500 --opening-turns 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+
+
+async def run(openings):
+    import httpx
+    import llm
+    import main
+
+    calls = 0
+    original = llm.complete
+
+    async def counted(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return await original(*args, **kwargs)
+
+    llm.complete = counted
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def session(i, turns):
+            for text in turns:
+                r = await client.post("/chat", json={"text": text, "session_id": f"cache-{i}"})
+                r.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(session(i, t) for i, t in enumerate(openings)))
+        wall = time.perf_counter() - start
+    return calls, wall, main.reply_cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(HERE, "conversations.jsonl"))
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--opening-turns", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    with open(args.corpus) as f:
+        corpus = [json.loads(line)["turns"][:args.opening_turns] for line in f if line.strip()]
+    openings = [corpus[i % len(corpus)] for i in range(args.sessions)]
+    turns = sum(len(t) for t in openings)
+
+    with stub_groq.running(args.port, "--latency", args.latency):
+        calls, wall, stats = asyncio.run(run(openings))
+
+    print(f"{args.sessions} sessions, {turns} turns in {wall:.2f} s")
+    print(f"LLM calls: {calls} ({calls / turns:.0%} of turns)")
+    print(f"cache: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Prompt tokens per turn and latency: full history vs budgeted context.
+
+Joins conversations from bench/conversations.jsonl into long sessions and
+replays them through /chat, first sending the whole stored history (the
+old behaviour) and then context.turn_messages():
+
+    python bench/context_bench.py --sessions 20 --turns 40 --prefill 0.5
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+
+
+def long_sessions(path, sessions, turns):
+    with open(path) as f:
+        all_turns = itertools.cycle([t for line in f if line.strip() for t in json.loads(line)["turns"]])
+    return [[next(all_turns) for _ in range(turns)] for _ in range(sessions)]
+
+
+async def measure(sessions, tag):
+    """Prompt tokens keyed by turn index, and per-turn latency."""
+    import httpx
+    import context
+    import llm
+    import main
+
+    tokens = {}
+    latency = []
+    current = [0]
+    original = llm.complete
+
+    async def measured(messages, *args, **kwargs):
+        n = sum(context.estimate_tokens(m["content"]) for m in messages)
+        tokens.setdefault(current[0], []).append(n)
+        return await original(messages, *args, **kwargs)
+
+    llm.complete = measured
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for i, turns in enumerate(sessions):
+            for t, text in enumerate(turns):
+                current[0] = t
+                start = time.perf_counter()
+                r = await client.post("/chat", json={"text": text, "session_id": f"{tag}-{i}"})
+                r.raise_for_status()
+                latency.append(time.perf_counter() - start)
+    llm.complete = original
+    return tokens, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(HERE, "conversations.jsonl"))
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--prefill", type=float, default=0.5,
+                        help="stub seconds per 1000 prompt tokens")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    sessions = long_sessions(args.corpus, args.sessions, args.turns)
+
+    with stub_groq.running(args.port, "--latency", args.latency, "--prefill", args.prefill):
+        import context
+
+        async def both():
+            build = context.turn_messages
+            context.turn_messages = lambda session, catalog: (list(session["history"]), None)
+            before = await measure(sessions, "full")
+            context.turn_messages = build
+            return before, await measure(sessions, "budget")
+
+        (full_tokens, full_lat), (new_tokens, new_lat) = asyncio.run(both())
+
+    print(f"{args.sessions} sessions x {args.turns} turns, stub {args.latency * 1000:.0f} ms "
+          f"+ {args.prefill * 1000:.0f} ms per 1k prompt tokens")
+    print("prompt tokens per LLM turn (mean by turn number):")
+    for t in (1, 5, 10, 20, 30, 40):
+        if t <= args.turns:
+            a = statistics.mean(full_tokens.get(t - 1, [0]) or [0])
+            b = statistics.mean(new_tokens.get(t - 1, [0]) or [0])
+            print(f"  turn {t:>2}: {a:6.0f} -> {b:6.0f}")
+    a = statistics.mean(x for xs in full_tokens.values() for x in xs)
+    b = statistics.mean(x for xs in new_tokens.values() for x in xs)
+    print(f"  overall: {a:.0f} -> {b:.0f} ({1 - b / a:.0%} fewer)")
+    print(f"mean turn latency: {statistics.mean(full_lat) * 1000:.0f} ms -> {statistics.mean(new_lat) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
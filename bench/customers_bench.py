@@ -0,0 +1,82 @@
+"""Repeat-customer lookup: customer index vs scanning the order store.
+
+Fills a MemoryOrderStore and a SQLiteOrderStore with --orders orders
+from --customers customers (numbers written in the different ways
+customers type them), then times building the CustomerIndex and looking
+a customer up in it against the store's phone query, which only finds
+the orders whose number was written the same way.
+
+    python bench/customers_bench.py --orders 1000000 --customers 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import customers  # noqa: E402
+import order_store  # noqa: E402
+
+FORMATS = ["0300{:07d}", "0300-{:07d}", "+92 300 {:07d}", "+92300{:07d}"]
+ITEMS = ["Zinger Burger", "Fries", "Cold Drink", "Chicken Biryani", "Chicken Karahi"]
+
+
+def orders(count, people, seed=1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        number = rng.randrange(people)
+        yield {"name": f"Customer {number}", "phone": rng.choice(FORMATS).format(number),
+               "items": rng.sample(ITEMS, rng.randint(1, 3)), "total": 500}
+
+
+def timed(fn, repeat):
+    """Best of repeat runs (a gen-2 collection over the store's orders can land in any one)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def compare(label, store, people, lookups):
+    build, index = timed(lambda: customers.CustomerIndex(store.iter()), 1)
+    numbers = [FORMATS[0].format(n) for n in random.Random(2).sample(range(people), lookups)]
+    indexed, found = timed(lambda: [index.get(n) for n in numbers], 5)
+    scanned, scans = timed(lambda: [store.by_phone(n) for n in numbers], 3)
+    all_orders = sum(c["orders"] for c in found if c)
+    same_format = sum(len(s) for s in scans)
+    print(f"{label}: index built in {build:.2f} s ({len(index):,} customers, "
+          f"{index.repeat:,} repeat)")
+    print(f"  index lookup {indexed / lookups * 1e6:9.1f} µs  ({all_orders:,} orders for {lookups} customers)")
+    print(f"  by_phone     {scanned / lookups * 1e6:9.1f} µs  ({same_format:,} orders: only the same spelling)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=50_000)
+    parser.add_argument("--lookups", type=int, default=100)
+    parser.add_argument("--sqlite-orders", type=int, default=200_000)
+    args = parser.parse_args()
+
+    memory = order_store.MemoryOrderStore()
+    for order in orders(args.orders, args.customers):
+        memory.add(order)
+    compare(f"memory store, {args.orders:,} orders", memory, args.customers, args.lookups)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = order_store.SQLiteOrderStore(os.path.join(tmp, "orders.db"))
+        for order in orders(args.sqlite_orders, args.customers):
+            store.add(order)
+        store.flush()
+        compare(f"sqlite store, {args.sqlite_orders:,} orders", store, args.customers, args.lookups)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""LLM calls saved and turn latency with the local menu fast path.
+
+Replays bench/conversations.jsonl through /chat twice, with and without
+menu.answer(), against the stub Groq server:
+
+    python bench/fastpath_bench.py --latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+
+
+def load(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(conversations, tag):
+    import httpx
+    import llm
+    import main
+
+    calls = 0
+    original = llm.complete
+
+    async def counted(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return await original(*args, **kwargs)
+
+    llm.complete = counted
+    latencies = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def run(conv):
+            for text in conv["turns"]:
+                start = time.perf_counter()
+                r = await client.post("/chat", json={"text": text, "session_id": f"{tag}-{conv['session']}"})
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+        await asyncio.gather(*(run(c) for c in conversations))
+    llm.complete = original
+    return calls, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(HERE, "conversations.jsonl"))
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    conversations = load(args.corpus)
+    with stub_groq.running(args.port, "--latency", args.latency):
+        import menu
+
+        async def both():
+            # The app answers through the tenant's Menu; disable the default one
+            menu.DEFAULT.answer = lambda text: None
+            base = await replay(conversations, "llm")
+            del menu.DEFAULT.answer
+            return base, await replay(conversations, "fast")
+
+        (base_calls, base_lat), (fast_calls, fast_lat) = asyncio.run(both())
+
+    turns = len(base_lat)
+    local = [menu.answer(t) is not None for c in conversations for t in c["turns"]]
+    start = time.perf_counter()
+    for c in conversations:
+        for t in c["turns"]:
+            menu.answer(t)
+    per_answer = (time.perf_counter() - start) / turns
+
+    print(f"{len(conversations)} conversations, {turns} turns")
+    print(f"LLM calls: {base_calls} -> {fast_calls} "
+          f"({(base_calls - fast_calls) / base_calls:.0%} fewer, {sum(local)} turns answered locally)")
+    print(f"mean turn latency: {statistics.mean(base_lat) * 1000:.0f} ms -> {statistics.mean(fast_lat) * 1000:.0f} ms")
+    print(f"menu.answer(): {per_answer * 1e6:.1f} us per turn")
+
+
+if __name__ == "__main__":
+    main()
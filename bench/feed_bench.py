@@ -0,0 +1,172 @@
+"""Push feed vs page reloads for admin dashboards.
+
+In-process: cost of Broadcaster.publish() by subscriber count, and what a
+stalled subscriber costs (its queue stays bounded; it gets a resync
+instead of a backlog).
+
+Over HTTP (stub Groq + uvicorn): --dashboards clients hold /admin/feed
+open, reconnecting like EventSource as streams reach FEED_MAX_AGE, while
+--orders customers confirm orders through /chat. Checks every dashboard
+gets every order exactly once with no resyncs, and reports how long after
+the customer's confirmation every dashboard had the order, and the bytes
+a dashboard receives per order compared with one Refresh (the page,
+/admin/stats and the first /orders page):
+
+    python bench/feed_bench.py --dashboards 200 --orders 100
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+from replay import serving  # noqa: E402
+
+ORDER = {"order": {"id": 1, "name": "Ali", "phone": "03001234567", "items": ["Zinger Burger"],
+                   "total": 350, "time": "2026-01-01 12:00:00"},
+         "stats": {"total_orders": 1, "total_revenue": 350, "unique_customers": 1, "avg_rating": 0,
+                   "items": {"Zinger Burger": 1}}}
+
+
+async def publish_cost(counts, n=2000):
+    import feed
+
+    results = {}
+    for count in counts:
+        broadcaster = feed.Broadcaster(queue_size=n + 1, max_subscribers=count)
+        for _ in range(count):
+            broadcaster.subscribe()
+        start = time.perf_counter()
+        for _ in range(n):
+            broadcaster.publish("order", ORDER)
+        results[count] = (time.perf_counter() - start) / n
+    return results
+
+
+async def stalled(n=10_000, queue_size=100):
+    import feed
+
+    broadcaster = feed.Broadcaster(queue_size=queue_size)
+    reader, stuck = broadcaster.subscribe(), broadcaster.subscribe()
+    received = 0
+    for _ in range(n):
+        broadcaster.publish("order", ORDER)
+        while not reader.queue.empty():
+            reader.queue.get_nowait()
+            received += 1
+    return received, stuck.queue.qsize(), stuck.lagged
+
+
+async def dashboard(url, arrivals, ready, size, stats):
+    """An EventSource: reconnects with Last-Event-ID whenever the stream ends."""
+    last_id = None
+    async with httpx.AsyncClient(timeout=None) as client:
+        while True:
+            headers = {"Last-Event-ID": last_id} if last_id else {}
+            async with client.stream("GET", f"{url}/admin/feed", headers=headers) as r:
+                if ready is not None:
+                    ready.release()
+                    ready = None
+                event = None
+                async for line in r.aiter_lines():
+                    size[0] += len(line) + 1
+                    if line.startswith("id: "):
+                        last_id = line[4:]
+                    elif line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: ") and event == "order":
+                        arrivals.append(time.perf_counter())
+                    elif line.startswith("data: ") and event == "resync":
+                        stats["resyncs"] += 1
+            stats["reconnects"] += 1
+            await asyncio.sleep(0.1)
+
+
+async def end_to_end(url, args):
+    arrivals = [[] for _ in range(args.dashboards)]
+    sizes = [[0] for _ in range(args.dashboards)]
+    ready = asyncio.Semaphore(0)
+    stats = {"reconnects": 0, "resyncs": 0}
+    tasks = [asyncio.create_task(dashboard(url, arrivals[i], ready, sizes[i], stats))
+             for i in range(args.dashboards)]
+    for _ in range(args.dashboards):
+        await ready.acquire()
+
+    lags = []
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        for i in range(args.orders):
+            r = await client.post("/chat", json={"text": f"Ali, 0300{i:07d}", "session_id": f"feed-{i}"})
+            r.raise_for_status()
+            confirmed = time.perf_counter()
+            deadline = confirmed + 5
+            while any(len(a) <= i for a in arrivals) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.001)
+            lags.append(max(a[i] for a in arrivals if len(a) > i) - confirmed)
+
+        refresh = 0
+        for path in ("/admin", "/admin/stats", "/orders?limit=50"):
+            refresh += len((await client.get(path)).content)
+        subscribers = (await client.get("/admin/stats")).json()["feed"]["subscribers"]
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    delivered = sum(len(a) for a in arrivals)
+    per_order = sum(s[0] for s in sizes) / max(delivered, 1)
+    return lags, delivered, per_order, refresh, subscribers, stats
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dashboards", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--max-age", type=float, default=2,
+                        help="FEED_MAX_AGE for the app, short so reconnects happen during the run")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--app-port", type=int, default=8901)
+    args = parser.parse_args()
+
+    print("publish() per event, in-process:")
+    for count, per in asyncio.run(publish_cost((1, 10, 100, 1000))).items():
+        print(f"  {count:>5} subscribers  {per * 1e6:8.1f} µs  ({per / count * 1e9:.0f} ns per subscriber)")
+    received, queued, lagged = asyncio.run(stalled())
+    print(f"stalled subscriber over 10000 events: {queued} queued (cap 100), resynced {lagged} times; "
+          f"live subscriber received {received}")
+
+    with tempfile.TemporaryDirectory() as tmp, stub_groq.running(args.port, "--latency", 0.05):
+        env = {"ORDER_DB": os.path.join(tmp, "orders.db"),
+               "GROQ_BASE_URL": os.environ["GROQ_BASE_URL"], "GROQ_API_KEY": "stub",
+               "RESPONSE_CACHE_SIZE": "0", "FEED_MAX_AGE": str(args.max_age),
+               "ADMISSION_CONTROL": "0"}
+        with serving(args.app_port, env):
+            lags, delivered, per_order, refresh, subscribers, stats = asyncio.run(
+                end_to_end(f"http://127.0.0.1:{args.app_port}", args))
+
+    expected = args.dashboards * args.orders
+    print(f"{args.dashboards} dashboards x {args.orders} orders over HTTP: "
+          f"{delivered}/{expected} events delivered ({subscribers} subscribers seen by the server)")
+    print(f"  {stats['reconnects']} reconnects with Last-Event-ID (max age {args.max_age:g} s), "
+          f"{stats['resyncs']} resyncs")
+    print(f"  last dashboard has the order after the /chat reply: p50 {pct(lags, 0.5) * 1000:.1f} ms, "
+          f"p95 {pct(lags, 0.95) * 1000:.1f} ms, max {max(lags) * 1000:.1f} ms")
+    print(f"  bytes per dashboard: {per_order:.0f} per pushed order vs {refresh} per Refresh "
+          f"(page + stats + 50 orders)")
+    if delivered != expected or stats["resyncs"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Post-order work as background jobs: order-turn latency, retries, dead letters, drain.
+
+Records --orders orders through main.record_order() (in-process, no
+LLM) with a notification consumer that takes --notify-delay seconds and
+fails --fail-rate of the time, like a webhook to a slow, flaky service:
+
+  inline   what record_order would cost doing the post-order work itself
+           (dashboards, customer index, feed, then the notification)
+  jobs     record_order as it is: add() and publish(); the rest runs on
+           the job workers
+
+Then: every job dead-lettered by a consumer that always fails, all of
+them finished by retry_dead() once it works again, and drain() with
+jobs still in flight.
+
+    python bench/jobs_bench.py --orders 500 --notify-delay 0.05 --fail-rate 0.2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPLY = ('Confirmed! Shukriya Ali!\nORDER_COMPLETE:{{"name":"Ali","phone":"0300{:07d}",'
+         '"items":["2 Zinger Burger","1 Fries"],"total":0}}')
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] * 1000
+
+
+async def run(args):
+    import main
+    import order_capture
+
+    tenant = main.tenant_registry.default
+    rng = random.Random(1)
+    state = {"failing": False, "notified": 0}
+
+    async def notify(event):
+        await asyncio.sleep(args.notify_delay)
+        if state["failing"] or rng.random() < args.fail_rate:
+            raise ConnectionError("notification service unavailable")
+        state["notified"] += 1
+
+    async def orders(label, record, n, offset):
+        latency = []
+        for i in range(n):
+            parser = order_capture.parse(REPLY.format(offset + i))
+            start = time.perf_counter()
+            record(parser, tenant)
+            if label == "inline":
+                for attempt in range(main.order_jobs.max_retries + 1):
+                    try:
+                        await notify(None)
+                        break
+                    except ConnectionError:
+                        await asyncio.sleep(main.order_jobs.backoff * 2 ** attempt)
+            latency.append(time.perf_counter() - start)
+        return latency
+
+    queue = main.order_jobs
+    queue.subscribe("order", notify)
+
+    # Inline: every consumer runs before the reply goes back
+    handlers = queue._handlers["order"]
+    queue._handlers["order"] = []
+    consumers = [h for h in handlers if h is not notify]
+
+    def record_inline(parser, tenant):
+        main.stats_for(tenant.id)
+        main.customers_for(tenant.id)
+        order = main.order_capture.extract(parser, tenant.catalog)
+        order = main.orders.add(dict(order, tenant=tenant.id))
+        for consumer in consumers:
+            consumer({"tenant": tenant.id, "order": order})
+
+    inline = await orders("inline", record_inline, args.orders, 0)
+    queue._handlers["order"] = handlers
+    state["notified"] = 0
+    start = time.perf_counter()
+    queued = await orders("jobs", main.record_order, args.orders, args.orders)
+    published = time.perf_counter() - start
+    await wait_idle(queue)
+    settled = time.perf_counter() - start
+    print(f"{args.orders} orders, notification {args.notify_delay * 1000:.0f} ms failing "
+          f"{args.fail_rate:.0%} of the time:")
+    for label, latency in (("inline", inline), ("jobs", queued)):
+        print(f"  {label:<7} record_order p50 {pct(latency, 0.5):8.3f} ms  p99 {pct(latency, 0.99):8.3f} ms")
+    print(f"  jobs: published in {published:.2f} s, all done {settled:.2f} s after the first order; "
+          f"{queue.metrics['retried']} retries, {len(queue.dead)} dead letters, "
+          f"{state['notified']} notifications sent")
+
+    # A consumer that always fails: everything it gets ends up dead-lettered
+    dead_before = len(queue.dead)
+    state["failing"] = True
+    await orders("jobs", main.record_order, 50, 2 * args.orders)
+    await wait_idle(queue)
+    dead = len(queue.dead) - dead_before
+    state["failing"] = False
+    requeued = queue.retry_dead()
+    await wait_idle(queue)
+    print(f"outage: {dead} of 50 notifications dead-lettered after {queue.max_retries} retries; "
+          f"retry_dead() requeued {requeued}, {len(queue.dead)} left dead")
+
+    # Shutdown with work in flight
+    await orders("jobs", main.record_order, 100, 3 * args.orders)
+    dead_before, pending = queue.metrics["dead"], queue.pending
+    start = time.perf_counter()
+    finished = await queue.drain(args.drain_timeout)
+    print(f"drain({args.drain_timeout:g}s) with {pending} jobs pending: "
+          f"{'finished' if finished else 'timed out'} in {time.perf_counter() - start:.2f} s, "
+          f"{queue.metrics['dead'] - dead_before} dead-lettered")
+
+
+async def wait_idle(queue):
+    while queue.pending:
+        await asyncio.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--notify-delay", type=float, default=0.05)
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    parser.add_argument("--drain-timeout", type=float, default=0.5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ.setdefault("JOB_BACKOFF", "0.05")
+    logging.getLogger("jobs").setLevel(logging.CRITICAL)  # every failure is expected here
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Log-backed stores: startup time, bytes written per change, fsyncs, torn tails.
+
+Startup: fills an orders journal, then times opening it again, once
+with every order still in the log (snapshots off) and once from a
+snapshot plus --tail orders after it.
+
+Writes: the same orders through LoggedOrderStore and SQLiteOrderStore,
+and the same chat turns through LoggedSessionStore and
+SQLiteSessionStore, counting what the process wrote (wchar in
+/proc/self/io) against the logical size of the change (the order, or
+the turn's two messages, as JSON) and the fsyncs the journal made.
+
+Crash: cuts the orders log in the middle of its last record and checks
+that recovery keeps every record before it.
+
+Disk full: fails every fsync for a while and checks that flush() still
+returns and the snapshot that follows brings back the orders that
+could not be written.
+
+    python bench/journal_bench.py --orders 1000000 --tail 100000
+"""
+import argparse
+import errno
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import context  # noqa: E402
+import journal  # noqa: E402
+import order_store  # noqa: E402
+import sessions  # noqa: E402
+
+ORDER = {"name": "Ali", "phone": "03001234567", "items": ["Zinger Burger", "Fries"], "total": 500,
+         "tenant": "default"}
+REPLY = "Zaroor! Aik Zinger Burger add kar diya. Aur kuch chahiye?"
+
+
+def written():
+    with open("/proc/self/io") as f:
+        return int(dict(line.split(": ") for line in f.read().splitlines())["wchar"])
+
+
+def order(i):
+    return dict(ORDER, phone=f"0300{i % 100_000:07d}")
+
+
+def fill(directory, count, snapshot_every):
+    store = order_store.LoggedOrderStore(journal.Journal(directory, "orders", snapshot_every=snapshot_every))
+    for i in range(count):
+        store.add(order(i))
+    store.flush()
+    store.journal.close()  # no snapshot on the way out, like a crash
+
+
+def reopen(directory):
+    start = time.perf_counter()
+    store = order_store.LoggedOrderStore(journal.Journal(directory, "orders"))
+    elapsed = time.perf_counter() - start
+    count, stats = len(store), store.stats()
+    store.journal.close()
+    return elapsed, count, stats
+
+
+def startup(tmp, args):
+    print(f"startup with {args.orders:,} orders:")
+    for label, snapshot_every in (("log only", args.orders + 1), ("snapshot + tail", args.orders - args.tail)):
+        directory = os.path.join(tmp, label.replace(" ", ""))
+        fill(directory, args.orders, snapshot_every)
+        size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+        elapsed, count, stats = reopen(directory)
+        print(f"  {label:<16} {elapsed:6.2f} s  {count:,} orders, {stats['recovered']:,} replayed from the log, "
+              f"{size / 1e6:.0f} MB on disk")
+
+
+def order_writes(tmp, args):
+    logical = len(json.dumps(order(0)))
+    print(f"{args.writes:,} orders ({logical} bytes of JSON each):")
+    stores = {
+        "log": lambda: order_store.LoggedOrderStore(journal.Journal(os.path.join(tmp, "w"), "orders")),
+        "sqlite": lambda: order_store.SQLiteOrderStore(os.path.join(tmp, "w.db")),
+    }
+    for label, make in stores.items():
+        store = make()
+        before, start = written(), time.perf_counter()
+        for i in range(args.writes):
+            store.add(order(i))
+        store.flush()
+        elapsed, amount = time.perf_counter() - start, written() - before
+        fsyncs = store.stats()["fsyncs"] if label == "log" else None
+        store.close()
+        print(f"  {label:<7} {args.writes / elapsed:9,.0f}/s  {amount / args.writes:6.0f} bytes written/order "
+              f"({amount / args.writes / logical:4.1f}x)"
+              + (f", {fsyncs:,} fsyncs ({args.writes / max(fsyncs, 1):.0f} orders each)" if fsyncs else ""))
+
+
+def session_writes(tmp, args):
+    print(f"{args.sessions:,} sessions x {args.turns} turns:")
+    stores = {
+        "log": lambda: sessions.LoggedSessionStore(journal.Journal(os.path.join(tmp, "s"), "sessions")),
+        "sqlite": lambda: sessions.SQLiteSessionStore(os.path.join(tmp, "s.db")),
+    }
+    for label, make in stores.items():
+        store = make()
+        logical = amount = 0
+        start = time.perf_counter()
+        for turn in range(args.turns):
+            for n in range(args.sessions):
+                key = f"s{n}"
+                session = store.get(key) or context.new_session()
+                text = f"aik zinger aur do fries, turn {turn}"
+                context.observe_user(session, text)
+                context.append(session, "user", text)
+                context.append(session, "assistant", REPLY)
+                logical += len(json.dumps(session["history"][-2:]))
+                before = written()
+                store.save(key, session)
+                amount += written() - before
+        if label == "log":
+            before = written()
+            store.journal.flush()
+            amount += written() - before
+            fsyncs = store.journal.metrics["fsyncs"]
+        elapsed = time.perf_counter() - start
+        saves = args.sessions * args.turns
+        store.close()
+        print(f"  {label:<7} {saves / elapsed:9,.0f} turns/s  {amount / saves:7.0f} bytes written/turn "
+              f"({amount / logical:5.1f}x the new messages)"
+              + (f", {fsyncs:,} fsyncs" if label == "log" else ""))
+    started = time.perf_counter()
+    store = sessions.LoggedSessionStore(journal.Journal(os.path.join(tmp, "s"), "sessions"))
+    print(f"  reopened {len(store):,} sessions in {(time.perf_counter() - started) * 1000:.0f} ms")
+    store.close()
+
+
+def torn_tail(tmp):
+    directory = os.path.join(tmp, "torn")
+    fill(directory, 1000, 10_000)
+    path = os.path.join(directory, "orders-00000000.log")
+    os.truncate(path, os.path.getsize(path) - 7)
+    _, count, stats = reopen(directory)
+    ok = count == 999 and stats["truncated_bytes"] > 0
+    print(f"torn tail: {count} of 1000 orders recovered, {stats['truncated_bytes']} bytes cut "
+          f"({'ok' if ok else 'FAILED'})")
+
+
+def disk_full(tmp):
+    directory = os.path.join(tmp, "full")
+    store = order_store.LoggedOrderStore(journal.Journal(directory, "orders"))
+    for i in range(100):
+        store.add(order(i))
+    store.flush()
+
+    def full(fd):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    fdatasync, journal.os.fdatasync = journal.os.fdatasync, full
+    try:
+        for i in range(100, 150):
+            store.add(order(i))
+        start = time.perf_counter()
+        store.flush()
+        waited = time.perf_counter() - start
+    finally:
+        journal.os.fdatasync = fdatasync
+    for i in range(150, 200):
+        store.add(order(i))
+    store.flush()
+    failures = store.stats()["write_failures"]
+    store.journal.close()  # no snapshot on the way out, like a crash
+    _, count, stats = reopen(directory)
+    ok = count == 200 and failures == 50 and stats["truncated_bytes"] == 0
+    print(f"disk full: flush() returned after {waited:.1f} s, {failures} orders failed to write, "
+          f"{count} of 200 recovered ({'ok' if ok else 'FAILED'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--tail", type=int, default=100_000)
+    parser.add_argument("--writes", type=int, default=20_000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        startup(tmp, args)
+        order_writes(tmp, args)
+        session_writes(tmp, args)
+        torn_tail(tmp)
+        disk_full(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Concurrent /chat load test against the local stub Groq server.
+
+Opens N independent sessions at once and reports how many LLM calls were in
+flight simultaneously inside a single worker, plus wall time and latency:
+
+    python bench/load_chat.py --sessions 3000 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_groq  # noqa: E402
+
+
+async def run(sessions):
+    import httpx
+    import llm
+    import main
+
+    peak = 0
+    done = asyncio.Event()
+
+    async def watch():
+        nonlocal peak
+        while not done.is_set():
+            peak = max(peak, llm.in_flight())
+            await asyncio.sleep(0.01)
+
+    async def one(client, i):
+        start = time.perf_counter()
+        r = await client.post("/chat", json={"text": "1 zinger", "session_id": f"load-{i}"})
+        r.raise_for_status()
+        return time.perf_counter() - start
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        watcher = asyncio.create_task(watch())
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(client, i) for i in range(sessions)))
+        wall = time.perf_counter() - start
+        done.set()
+        await watcher
+    await llm.aclose()
+    return peak, wall, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=3000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--connections", type=int, default=32,
+                        help="size of the pooled Groq connection pool")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    os.environ.setdefault("GROQ_MAX_CONNECTIONS", str(args.connections))
+    os.environ.setdefault("GROQ_MAX_KEEPALIVE", str(args.connections))
+
+    with stub_groq.running(args.port, "--latency", args.latency):
+        peak, wall, lat = asyncio.run(run(args.sessions))
+
+    p = lambda q: lat[min(int(q * len(lat)), len(lat) - 1)] * 1000
+    print(f"sessions:           {args.sessions}")
+    print(f"stub latency:       {args.latency * 1000:.0f} ms")
+    print(f"pool connections:   {args.connections}")
+    print(f"peak in-flight:     {peak} sessions")
+    print(f"wall time:          {wall:.2f} s  ({args.sessions / wall:.0f} turns/s, "
+          f"pool ceiling {args.connections / args.latency:.0f} turns/s)")
+    print(f"latency p50/p99:    {p(0.5):.0f} / {p(0.99):.0f} ms  (mean {statistics.mean(lat) * 1000:.0f} ms)")
+    print(f"threads used:       {threading.active_count()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Cost of the /metrics instrumentation and what it shows for a stub run.
+
+Times the menu fast path of /chat in-process (the cheapest turn, so the
+relative overhead is the worst case) with and without the metrics
+middleware and stage timers, and with the sampling profiler running.
+Then sends LLM turns to the stub and prints the queue / first-token /
+total split and token counts the histograms report:
+
+    python bench/metrics_bench.py --requests 5000 --turns 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+
+
+def observe_cost(n=200_000):
+    import telemetry
+    h = telemetry.Histogram("bench_observe_seconds", "bench", labels=("x",))
+    start = time.perf_counter()
+    for i in range(n):
+        h.observe(0.003, "a")
+    per = (time.perf_counter() - start) / n
+    telemetry.REGISTRY.remove(h)
+    return per
+
+
+async def fast_path(client, n):
+    start = time.perf_counter()
+    for i in range(n):
+        r = await client.post("/chat", json={"text": "menu", "session_id": f"m{i % 100}"})
+        r.raise_for_status()
+    return (time.perf_counter() - start) / n
+
+
+async def run(args):
+    import httpx
+    import llm
+    import main
+    import profiler
+    import telemetry
+    from starlette.middleware import Middleware
+
+    def client():
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                 base_url="http://bench", timeout=None)
+
+    def rebuild(instrumented):
+        main.app.user_middleware = [m for m in main.app.user_middleware
+                                    if m.cls is not telemetry.MetricsMiddleware]
+        if instrumented:
+            main.app.user_middleware.insert(0, Middleware(telemetry.MetricsMiddleware))
+        main.app.middleware_stack = None
+        main.CHAT_STAGE.observe = real_observe if instrumented else (lambda *a: None)
+
+    real_observe = main.CHAT_STAGE.observe
+    results = {}
+    async with client() as c:
+        await fast_path(c, 200)  # warm up
+        # Alternate short rounds and keep each setting's best, to shed noise
+        per_round = max(args.requests // args.rounds, 1)
+        for _ in range(args.rounds):
+            for label in ("off", "on", "on + profiler 100 Hz"):
+                rebuild(label != "off")
+                sampler = None
+                if "profiler" in label:
+                    sampler = profiler.SamplingProfiler(threading.get_ident(), 100).start()
+                results.setdefault(label, []).append(await fast_path(c, per_round))
+                if sampler:
+                    sampler.stop()
+
+        await c.get("/metrics")
+        start = time.perf_counter()
+        for _ in range(100):
+            body = telemetry.render()
+        scrape = (time.perf_counter() - start) / 100
+
+        for i in range(args.turns):
+            url = "/chat?stream=1" if i % 2 else "/chat"
+            r = await c.post(url, json={"text": f"i want 1 zinger burger please, table {i}",
+                                        "session_id": f"t{i}"})
+            r.raise_for_status()
+    return results, scrape, len(body.splitlines()), sampler, llm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=6000)
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+
+    print(f"Histogram.observe: {observe_cost() * 1e9:.0f} ns")
+    with stub_groq.running(args.port, "--latency", args.latency, "--token-delay", args.token_delay):
+        results, scrape, lines, sampler, llm = asyncio.run(run(args))
+
+    base = min(results["off"])
+    print(f"/chat menu fast path, {args.requests} requests per setting in-process:")
+    for label, runs in results.items():
+        best = min(runs)
+        print(f"  metrics {label:<22} {best * 1e6:7.1f} µs/request  ({(best - base) / base:+.1%})")
+    print(f"profiler: {sampler.samples} samples, {len(sampler.stacks)} distinct stacks")
+    print(f"/metrics render: {scrape * 1000:.2f} ms for {lines} lines")
+    print(f"LLM turns ({args.turns}, stub {args.latency * 1000:.0f} ms + {args.token_delay * 1000:.0f} ms/token):")
+    print(f"  queue wait        {llm.QUEUE_WAIT.summary()}")
+    for labels in sorted(llm.FIRST_TOKEN.series()):
+        print(f"  first token {' '.join(labels):<40} {llm.FIRST_TOKEN.summary(*labels)}")
+        print(f"  call total  {' '.join(labels):<40} {llm.CALL_DURATION.summary(*labels)}")
+    for labels in sorted(llm.TOKENS.series()):
+        print(f"  tokens {' '.join(labels):<45} {llm.TOKENS.summary(*labels)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Order capture: old regex + json.loads vs the incremental parser.
+
+Generates confirmation replies in the shapes models actually produce
+(one-line JSON, pretty-printed JSON, trailing text, code fences, item
+objects, aliases and typos, wrong totals, off-menu items, cut-off output)
+and reports per shape how often each approach stores a correct order,
+stores a wrong one, drops it silently, or rejects it and tells the
+customer. Checks that replies ending in the start of the marker keep
+their last words, then times the parser fed token by token, and runs
+confirmations end to end through /chat with the stub's place_order tool
+calls:
+
+    python bench/order_capture_bench.py --replies 2000 --sessions 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import menu  # noqa: E402
+import order_capture  # noqa: E402
+import stub_groq  # noqa: E402
+
+SPELLINGS = {name: spellings for name, (_, spellings) in menu.MENU.items()}
+
+
+def order_block(items, total, indent=None, as_objects=False, names=None):
+    listed = ([{"item": n, "qty": q} for n, q in items] if as_objects
+              else [f"{q} {names[n] if names else n}" for n, q in items])
+    return json.dumps({"name": "Ali", "phone": "0300 1234567", "items": listed, "total": total},
+                      indent=indent)
+
+
+def make_reply(shape, rng):
+    """(reply text, expected (items, total) or None if it must be rejected)."""
+    items = [(n, rng.randint(1, 3)) for n in rng.sample(list(menu.PRICES), rng.randint(1, 3))]
+    total = menu.total(items)
+    head = "Confirmed! Shukriya Ali!"
+    expect = (sorted(items), total)
+    if shape == "one line":
+        return f"{head}\nORDER_COMPLETE:{order_block(items, total)}", expect
+    if shape == "pretty":
+        return f"{head}\nORDER_COMPLETE: {order_block(items, total, indent=2)}", expect
+    if shape == "trailing text":
+        return f"{head} ORDER_COMPLETE:{order_block(items, total)} Enjoy {{your}} meal :)", expect
+    if shape == "code fence":
+        return f"{head}\n```json\nORDER_COMPLETE:{order_block(items, total)}\n```", expect
+    if shape == "item objects":
+        return f"{head}\nORDER_COMPLETE:{order_block(items, total, as_objects=True)}", expect
+    if shape == "aliases":
+        names = {n: rng.choice(SPELLINGS[n]) for n, _ in items}
+        return f"{head}\nORDER_COMPLETE:{order_block(items, total, names=names)}", expect
+    if shape == "wrong total":
+        return f"{head}\nORDER_COMPLETE:{order_block(items, total + rng.choice((-100, 50, 200)))}", expect
+    if shape == "off menu":
+        return f"{head}\nORDER_COMPLETE:{order_block(items + [('Sushi Platter', 1)], total)}", None
+    if shape == "cut off":
+        block = order_block(items, total)
+        return f"{head}\nORDER_COMPLETE:{block[:len(block) // 2]}", None
+    raise ValueError(shape)
+
+
+SHAPES = ["one line", "pretty", "trailing text", "code fence", "item objects", "aliases",
+          "wrong total", "off menu", "cut off"]
+
+
+def old_capture(reply):
+    """What main.record_order did before: stored dict or None (silently)."""
+    if "ORDER_COMPLETE:" in reply:
+        try:
+            match = re.search(r'ORDER_COMPLETE:(\{.*\})', reply)
+            if match:
+                return json.loads(match.group(1))
+        except:  # noqa: E722 - reproducing the old behaviour
+            pass
+    return None
+
+
+def new_capture(reply):
+    """("stored", order) / ("rejected", reason) / ("none", None)."""
+    parser = order_capture.OrderParser()
+    for token in stub_groq.tokens(reply):
+        parser.feed(token)
+    try:
+        order = order_capture.extract(parser)
+    except order_capture.OrderError as exc:
+        return "rejected", str(exc)
+    return ("stored", order) if order else ("none", None)
+
+
+def units(order_items):
+    counts = {}
+    for item in order_items:
+        counts[item] = counts.get(item, 0) + 1
+    return sorted(counts.items())
+
+
+def classify_old(stored, expect):
+    if stored is None:
+        return "dropped"
+    if expect and stored.get("total") == expect[1]:
+        return "correct"
+    return "wrong"
+
+
+def classify_new(result, expect):
+    kind, value = result
+    if kind == "rejected":
+        return "rejected" if expect is None else "rejected (valid)"
+    if kind == "none":
+        return "dropped"
+    if expect and units(value["items"]) == expect[0] and value["total"] == expect[1]:
+        return "correct"
+    return "wrong"
+
+
+def compare(n, rng):
+    table = {shape: {"old": {}, "new": {}} for shape in SHAPES}
+    for i in range(n):
+        shape = SHAPES[i % len(SHAPES)]
+        reply, expect = make_reply(shape, rng)
+        for side, outcome in (("old", classify_old(old_capture(reply), expect)),
+                              ("new", classify_new(new_capture(reply), expect))):
+            table[shape][side][outcome] = table[shape][side].get(outcome, 0) + 1
+    return table
+
+
+# Replies whose last words could have been the start of the marker
+HELD_TAILS = ["Confirmed your ORDER", "Total Rs.1400 OR", "Kuch aur chahiye? O", "Shukriya! ORDER_"]
+
+
+def held_tails():
+    """Replies whose finish() dropped the held tail; [] when all are shown whole."""
+    wrong = []
+    for reply in HELD_TAILS:
+        for tokens in ([reply], stub_groq.tokens(reply)):
+            parser = order_capture.OrderParser()
+            for token in tokens:
+                parser.feed(token)
+            if parser.finish() != reply:
+                wrong.append((reply, parser.finish()))
+    return wrong
+
+
+def time_parser(n, rng):
+    replies = [make_reply(SHAPES[i % 7], rng)[0] for i in range(n)]
+    token_lists = [stub_groq.tokens(r) for r in replies]
+    start = time.perf_counter()
+    for tokens in token_lists:
+        parser = order_capture.OrderParser()
+        for token in tokens:
+            parser.feed(token)
+        order_capture.extract(parser)
+    elapsed = time.perf_counter() - start
+    return elapsed / n * 1e6, sum(map(len, token_lists)) / n
+
+
+async def end_to_end(sessions):
+    import httpx
+    import llm
+    import main
+
+    calls = [0]
+    complete, stream = llm.complete, llm.stream
+
+    async def counted_complete(*args, **kwargs):
+        calls[0] += 1
+        return await complete(*args, **kwargs)
+
+    def counted_stream(*args, **kwargs):
+        calls[0] += 1
+        return stream(*args, **kwargs)
+
+    llm.complete, llm.stream = counted_complete, counted_stream
+    before = len(main.orders)
+    confirmed = 0
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i):
+            nonlocal confirmed
+            url = "/chat?stream=1" if i % 2 else "/chat"
+            sid = f"capture-{i}"
+            await client.post(url, json={"text": f"i want 1 zinger burger please, table {i}",
+                                         "session_id": sid})
+            start = calls[0]
+            r = await client.post("/chat", json={"text": f"naam Ali number 0300 {i:07d}",
+                                                 "session_id": sid})
+            if "Rs.350" in r.json()["response"]:
+                confirmed += 1
+            return calls[0] - start
+
+        # One session at a time, so the call counter is per confirmation
+        per_confirm = [await one(i) for i in range(sessions)]
+    llm.complete, llm.stream = complete, stream
+    return confirmed, len(main.orders) - before, max(per_confirm)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replies", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    import logging
+    logging.getLogger("order_capture").setLevel(logging.ERROR)
+
+    table = compare(args.replies, rng)
+    print(f"{args.replies} confirmation replies, {len(SHAPES)} shapes (old -> new):")
+    for shape, sides in table.items():
+        fmt = lambda d: ", ".join(f"{k} {v}" for k, v in sorted(d.items()))
+        print(f"  {shape:<14} {fmt(sides['old']):<28} -> {fmt(sides['new'])}")
+    print(f"  metrics: {order_capture.stats()}")
+    wrong = held_tails()
+    print(f"{'OK  ' if not wrong else 'FAIL'} replies ending in part of the marker shown whole"
+          + "".join(f"\n  {reply!r} -> {shown!r}" for reply, shown in wrong))
+
+    us, tokens = time_parser(args.replies, rng)
+    print(f"parser: {us:.1f} µs per reply fed token by token ({tokens:.0f} tokens), incl. validation")
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    with stub_groq.running(args.port, "--latency", 0.05):
+        confirmed, stored, calls = asyncio.run(end_to_end(args.sessions))
+    print(f"end to end (place_order tool): {confirmed}/{args.sessions} confirmations showed the "
+          f"total, {stored} orders stored, max {calls} LLM call per confirmation")
+
+
+if __name__ == "__main__":
+    main()
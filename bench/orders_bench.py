@@ -0,0 +1,68 @@
+"""Order store write latency, group-commit throughput and id uniqueness.
+
+    python bench/orders_bench.py --orders 100000 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import order_store  # noqa: E402
+
+ORDER = {"name": "Ali", "phone": "03001234567", "items": ["Zinger Burger", "Fries"], "total": 500}
+
+
+def worker(path, count):
+    store = order_store.SQLiteOrderStore(path)
+    for i in range(count):
+        store.add(dict(ORDER, phone=f"0300{i:07d}"))
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "orders.db")
+        store = order_store.SQLiteOrderStore(path)
+        lat = []
+        start = time.perf_counter()
+        for i in range(args.orders):
+            t = time.perf_counter()
+            store.add(dict(ORDER, phone=f"0311{i % 5000:07d}"))
+            lat.append(time.perf_counter() - t)
+        enqueued = time.perf_counter() - start
+        store.flush()
+        durable = time.perf_counter() - start
+        lat.sort()
+        p = lambda q: lat[min(int(q * len(lat)), len(lat) - 1)] * 1e6
+        print(f"add() latency p50 {p(0.5):.1f} us  p99 {p(0.99):.1f} us  max {lat[-1] * 1e6:.0f} us")
+        print(f"{args.orders:,} orders committed in {durable:.2f} s "
+              f"({args.orders / durable:,.0f}/s, enqueue {enqueued:.2f} s)")
+        t = time.perf_counter()
+        hits = store.by_phone("03110000042")
+        print(f"by_phone: {len(hits)} orders in {(time.perf_counter() - t) * 1000:.2f} ms")
+        store.close()
+
+        per = args.orders // args.workers // 10
+        procs = [multiprocessing.Process(target=worker, args=(path, per)) for _ in range(args.workers)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        store = order_store.SQLiteOrderStore(path)
+        ids = [o["id"] for o in store.all()]
+        print(f"{args.workers} processes x {per:,} orders: {len(ids):,} rows, "
+              f"{len(set(ids)):,} unique ids")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Request building and prompt prefix reuse: old layout vs stable prefix.
+
+In-process, per turn: the request as it used to be built (message list
+with the state line second and a sliding history window, cache key over
+every message, body through the SDK's request validation and json.dumps)
+against context.turn_messages(), a cache key on top of the tenant's
+prefix key and llm.request_body() with the pre-serialized prefix.
+
+Then replays conversations from bench/conversations.jsonl through /chat
+against the stub Groq server with --prefix-cache, once with the old
+layout and once with the new one, and reports how much of each prompt
+the stub could serve from its prefix cache and the turn latency:
+
+    python bench/prefix_bench.py --sessions 20 --turns 30 --prefill 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+from context_bench import long_sessions  # noqa: E402
+
+
+def old_turn_messages(session, catalog):
+    """The layout before prefix reuse: state line first, sliding window."""
+    import context
+
+    history, tokens = session["history"], session["tokens"]
+    start = context._fit(tokens, context.CONTEXT_TOKENS, context.CONTEXT_MESSAGES)
+    summary = context.render_state(session["state"], catalog)
+    messages = [{"role": "system", "content": summary}] if summary else []
+    messages.extend(history[start:])
+    return messages, None
+
+
+def build_cost(sessions, n):
+    """Seconds per request build, old and new, over sessions' turns."""
+    import context
+    import llm
+    import main
+    from cache import cache_key
+    from groq._utils import maybe_transform
+    from groq.types.chat import completion_create_params
+
+    tenant = main.tenant_registry.default
+    params = {"model": llm.MODEL, "max_tokens": llm.MAX_TOKENS, "temperature": llm.TEMPERATURE}
+    states = []
+    for turns in sessions:
+        session = context.new_session()
+        for text in turns:
+            context.observe_user(session, text, tenant.catalog)
+            context.append(session, "user", text)
+            context.append(session, "assistant", stub_groq.REPLY)
+        states.append(session)
+
+    def old(session):
+        tail, _ = old_turn_messages(session, tenant.catalog)
+        messages = [tenant.prefix.message, *tail]
+        cache_key(messages, **params)
+        body = maybe_transform({"messages": messages, **params, **llm._tool_params(tenant.tools)},
+                               completion_create_params.CompletionCreateParams)
+        return json.dumps(body).encode()
+
+    def new(session):
+        messages, wire = context.turn_messages(session, tenant.catalog)
+        cache_key(messages, prefix=tenant.prefix.key, **params)
+        return llm.request_body([tenant.prefix.message, *messages], params, tenant.prefix, wire)
+
+    for session in states:  # same JSON either way, give or take key order
+        assert json.loads(old(session))["tools"] == json.loads(new(session))["tools"]
+    results = {}
+    for label, build in (("old", old), ("new", new)):
+        start = time.perf_counter()
+        for i in range(n):
+            build(states[i % len(states)])
+        results[label] = (time.perf_counter() - start) / n
+    return results
+
+
+async def replay(sessions, tag, url):
+    import main
+
+    latency = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                 base_url="http://bench", timeout=None) as client:
+        before = httpx.get(f"{url}/stub/stats").json()
+        for i, turns in enumerate(sessions):
+            for text in turns:
+                start = time.perf_counter()
+                r = await client.post("/chat", json={"text": text, "session_id": f"{tag}-{i}"})
+                r.raise_for_status()
+                latency.append(time.perf_counter() - start)
+    after = httpx.get(f"{url}/stub/stats").json()
+    counts = {k: after[k] - before[k] for k in ("served", "prompt_tokens", "cached_tokens")}
+    return counts, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(HERE, "conversations.jsonl"))
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--builds", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--prefill", type=float, default=0.5,
+                        help="stub seconds per 1000 uncached prompt tokens")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    sessions = long_sessions(args.corpus, args.sessions, args.turns)
+
+    with stub_groq.running(args.port, "--latency", args.latency, "--prefill", args.prefill,
+                           "--prefix-cache"):
+        import context
+
+        cost = build_cost(sessions, args.builds)
+        print(f"request build per turn (messages, cache key, JSON body), {args.builds} builds:")
+        print(f"  old: {cost['old'] * 1e6:8.1f} µs   new: {cost['new'] * 1e6:8.1f} µs "
+              f"({cost['old'] / cost['new']:.0f}x)")
+
+        url = os.environ["GROQ_BASE_URL"]
+        turn_messages = context.turn_messages
+        context.turn_messages = old_turn_messages
+        old = asyncio.run(replay(sessions, "old", url))
+        context.turn_messages = turn_messages
+        new = asyncio.run(replay(sessions, "new", url))
+
+    print(f"{args.sessions} sessions x {args.turns} turns, stub {args.latency * 1000:.0f} ms "
+          f"+ {args.prefill * 1000:.0f} ms per 1k uncached prompt tokens:")
+    for label, (counts, latency) in (("old layout", old), ("stable prefix", new)):
+        calls = max(counts["served"], 1)
+        share = counts["cached_tokens"] / max(counts["prompt_tokens"], 1)
+        uncached = (counts["prompt_tokens"] - counts["cached_tokens"]) / calls
+        latency = sorted(latency)
+        print(f"  {label:<14} {counts['prompt_tokens'] / calls:5.0f} prompt tokens/call, "
+              f"{share:4.0%} from the prefix cache ({uncached:.0f} prefilled); turn p50 {statistics.median(latency) * 1000:5.1f} ms, "
+              f"p95 {latency[int(0.95 * len(latency))] * 1000:5.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Lunch rush against a rate-limited stub: failures and latency by priority.
+
+Customers arrive at --arrival per second; each sends an order and then
+confirms it with a name and phone number. The stub allows --rpm requests
+and --tpm tokens per --window seconds. The run is made twice: with the
+scheduler's buckets off and no priority (the old behaviour: fire and
+retry on 429), then with buckets matching the stub's limits and
+confirmations first:
+
+    python bench/ratelimit_bench.py --customers 150 --arrival 20 --rpm 60 --window 6
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+
+# Distinct per customer so the response cache can't coalesce them
+ORDER = "i want 1 zinger burger please, table {}"
+CONFIRM = "naam Ali number 0300 {:07d}"
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] * 1000 if values else 0.0
+
+
+async def rush(client, args, tag):
+    latency = {"order": [], "confirm": []}
+    failed = {"order": 0, "confirm": 0}
+
+    async def customer(i):
+        await asyncio.sleep(i / args.arrival)
+        for kind, text in (("order", ORDER), ("confirm", CONFIRM)):
+            start = time.perf_counter()
+            r = await client.post("/chat", json={"text": text.format(i), "session_id": f"{tag}-{i}"})
+            if r.status_code != 200:
+                failed[kind] += 1
+                return
+            latency[kind].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(customer(i) for i in range(args.customers)))
+    return time.perf_counter() - start, latency, failed
+
+
+async def run(args):
+    import httpx
+    import llm
+    import main
+    import scheduler
+
+    transport = httpx.ASGITransport(app=main.app)
+    stub = httpx.AsyncClient(base_url=os.environ["GROQ_BASE_URL"])
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for label, limited in (("no buckets, no priority", False), ("scheduler", True)):
+            if limited:
+                main.URGENT = scheduler.URGENT
+                llm.scheduler = scheduler.Scheduler(
+                    llm.MAX_CONCURRENCY, rpm=args.rpm, tpm=args.tpm, period=args.window,
+                    queue_timeout=args.queue_timeout)
+            else:
+                main.URGENT = scheduler.NORMAL
+                llm.scheduler = scheduler.Scheduler(llm.MAX_CONCURRENCY,
+                                                    queue_timeout=args.queue_timeout)
+            await asyncio.sleep(args.window)  # let the stub's buckets refill
+            before = (await stub.get("/stub/stats")).json()
+            wall, latency, failed = await rush(client, args, label)
+            after = (await stub.get("/stub/stats")).json()
+            results.append((label, wall, latency, failed,
+                            after["rate_limited"] - before["rate_limited"], llm.scheduler.stats()))
+    await stub.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=150)
+    parser.add_argument("--arrival", type=float, default=20, help="new customers per second")
+    parser.add_argument("--rpm", type=int, default=60, help="stub requests per window")
+    parser.add_argument("--tpm", type=int, default=0, help="stub tokens per window")
+    parser.add_argument("--window", type=float, default=6.0)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--queue-timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+
+    with stub_groq.running(args.port, "--latency", args.latency, "--rpm", args.rpm,
+                           "--tpm", args.tpm, "--window", args.window):
+        results = asyncio.run(run(args))
+
+    print(f"{args.customers} customers at {args.arrival:g}/s, stub allows {args.rpm} requests"
+          + (f" and {args.tpm} tokens" if args.tpm else "") + f" per {args.window:g} s")
+    for label, wall, latency, failed, limited, stats in results:
+        print(f"{label}:")
+        print(f"  wall {wall:.1f} s, 429s from stub {limited}, retries {stats['retries']}, "
+              f"gave up {stats['gave_up']}, queue timeouts {stats['timed_out']}")
+        for kind in ("order", "confirm"):
+            lat = latency[kind]
+            print(f"  {kind:<8} ok {len(lat):>4}  failed {failed[kind]:>4}  "
+                  f"p50 {pct(lat, 0.5):6.0f} ms  p95 {pct(lat, 0.95):6.0f} ms")
+        print(f"  queue wait p50/p95/max {stats['wait_ms_p50']:.0f} / {stats['wait_ms_p95']:.0f} / "
+              f"{stats['wait_ms_max']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""Replay recorded conversations against the app over HTTP, offline.
+
+Starts the stub Groq server and `uvicorn main:app` (fresh temporary order
+and session stores) as subprocesses, then replays a JSONL corpus of
+{"turns": [...]} conversations through /chat while widget visitors load
+/widget.js and an admin polls /admin, /admin/stats and /orders.
+
+Load is either closed-loop (--users replaying back to back, with
+--think seconds between turns) or open-loop (--rate new conversations per
+second, Poisson arrivals). Reports requests/s, latency percentiles per
+endpoint, server RSS and the growth of sessions and orders, and compares
+against a stored baseline:
+
+    python bench/replay.py --users 20 --duration 20
+    python bench/replay.py --rate 20 --duration 30 --stream 0.5
+    python bench/replay.py --save-baseline bench/baseline.json
+    python bench/replay.py --baseline bench/baseline.json   # exit 1 on regression
+
+Numbers depend on the machine (the harness, stub and app share its cores),
+so record the baseline where it will be compared.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+
+# Baseline comparison: a regression is worse than this fraction (and, for
+# latency, also worse by at least LATENCY_SLACK seconds so 1 ms jitter on a
+# 2 ms endpoint doesn't count). Tail percentiles are only compared once an
+# endpoint has enough requests for them to be stable between runs.
+TOLERANCE = 0.25
+TAIL_TOLERANCE = 0.5
+MIN_REQUESTS = {"p50": 30, "p95": 200, "p99": 1000}
+LATENCY_SLACK = 0.005
+MEMORY_SLACK_MB = 10
+
+
+def load_corpus(path):
+    conversations = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                turns = record.get("turns") or [record["text"]]
+                conversations.append(turns)
+    return conversations
+
+
+@contextlib.contextmanager
+def serving(port, env):
+    """Run `uvicorn main:app` on port with env added; yields the process."""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env={**os.environ, **env})
+    try:
+        deadline = time.time() + 15
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=0.5).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise RuntimeError("app did not start")
+                time.sleep(0.1)
+        yield proc
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def gauges(client):
+    values = {}
+    for line in (await client.get("/metrics")).text.splitlines():
+        if line and not line.startswith("#") and "{" not in line:
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+
+class Recorder:
+    def __init__(self):
+        self.latency = {}  # endpoint -> [seconds]
+        self.errors = {}
+        self.first_token = []
+
+    def add(self, endpoint, seconds, ok):
+        self.latency.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+async def chat_turn(client, rec, session_id, text, stream):
+    start = time.perf_counter()
+    try:
+        if not stream:
+            r = await client.post("/chat", json={"text": text, "session_id": session_id})
+            rec.add("POST /chat", time.perf_counter() - start, r.status_code == 200)
+            return
+        ok = False
+        async with client.stream("POST", "/chat?stream=1",
+                                 json={"text": text, "session_id": session_id}) as r:
+            first = None
+            async for line in r.aiter_lines():
+                if first is None and line.startswith("data: ") and '"token"' in line:
+                    first = time.perf_counter() - start
+                    rec.first_token.append(first)
+                if line.startswith("event: done"):
+                    ok = r.status_code == 200
+        rec.add("POST /chat?stream=1", time.perf_counter() - start, ok)
+    except httpx.HTTPError:
+        rec.add("POST /chat?stream=1" if stream else "POST /chat", time.perf_counter() - start, False)
+
+
+async def get(client, rec, path, label=None):
+    start = time.perf_counter()
+    try:
+        r = await client.get(path)
+        ok = r.status_code in (200, 304)
+    except httpx.HTTPError:
+        ok = False
+    rec.add(label or f"GET {path}", time.perf_counter() - start, ok)
+
+
+async def conversation(client, rec, args, rng, turns, session_id):
+    if rng.random() < args.widget_loads:
+        await get(client, rec, "/widget.js")
+    for text in turns:
+        await chat_turn(client, rec, session_id, text, rng.random() < args.stream)
+        if args.think:
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+
+
+async def admin(client, rec, args, stop):
+    """An admin with the dashboard open: page load, then stats and order polls."""
+    await get(client, rec, "/admin")
+    while not stop.is_set():
+        await get(client, rec, "/admin/stats")
+        await get(client, rec, "/orders?limit=50", "GET /orders")
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop.wait(), args.admin_poll)
+
+
+async def drive(url, pid, corpus, args):
+    rng = random.Random(args.seed)
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        before = await gauges(client)
+        rss = [rss_mb(pid)]
+        stop = asyncio.Event()
+        ids = iter(range(10 ** 9))
+        tasks = [asyncio.create_task(admin(client, rec, args, stop)) for _ in range(args.admins)]
+
+        async def user():
+            while not stop.is_set():
+                await conversation(client, rec, args, rng, rng.choice(corpus), f"replay-{next(ids)}")
+
+        async def arrivals():
+            running = set()
+            while not stop.is_set():
+                task = asyncio.create_task(conversation(client, rec, args, rng, rng.choice(corpus),
+                                                        f"replay-{next(ids)}"))
+                running.add(task)
+                task.add_done_callback(running.discard)
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(stop.wait(), rng.expovariate(args.rate))
+            await asyncio.gather(*running)
+
+        async def sample_rss():
+            while not stop.is_set():
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(stop.wait(), 1.0)
+                rss.append(rss_mb(pid))
+
+        if args.rate:
+            tasks.append(asyncio.create_task(arrivals()))
+        else:
+            tasks += [asyncio.create_task(user()) for _ in range(args.users)]
+        tasks.append(asyncio.create_task(sample_rss()))
+        start = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)  # users finish their current conversation
+        elapsed = time.perf_counter() - start
+        after = await gauges(client)
+        rss.append(rss_mb(pid))
+    return rec, elapsed, before, after, rss
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+def summarize(rec, elapsed, before, after, rss):
+    endpoints = {}
+    for name, lat in sorted(rec.latency.items()):
+        endpoints[name] = {
+            "requests": len(lat),
+            "rps": round(len(lat) / elapsed, 2),
+            "errors": rec.errors.get(name, 0),
+            "p50": round(pct(lat, 0.5), 4),
+            "p95": round(pct(lat, 0.95), 4),
+            "p99": round(pct(lat, 0.99), 4),
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "elapsed": round(elapsed, 1),
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "error_rate": round(sum(rec.errors.values()) / max(total, 1), 4),
+        "first_token_p50": round(pct(rec.first_token, 0.5), 4),
+        "first_token_p95": round(pct(rec.first_token, 0.95), 4),
+        "endpoints": endpoints,
+        "memory": {
+            "rss_start_mb": round(rss[0], 1),
+            "rss_peak_mb": round(max(rss), 1),
+            "rss_end_mb": round(rss[-1], 1),
+            "rss_growth_mb": round(rss[-1] - rss[0], 1),
+            "sessions": int(after.get("chat_sessions_active", 0) - before.get("chat_sessions_active", 0)),
+            "session_mb": round((after.get("chat_sessions_bytes", 0)
+                                 - before.get("chat_sessions_bytes", 0)) / 2 ** 20, 2),
+            "orders": int(after.get("orders_stored", 0) - before.get("orders_stored", 0)),
+        },
+    }
+
+
+def regressions(result, baseline):
+    found = []
+
+    def worse(label, new, old, higher_is_worse=True, slack=0.0, tolerance=TOLERANCE):
+        if old is None:
+            return
+        if higher_is_worse and new > old * (1 + tolerance) and new - old > slack:
+            found.append(f"{label}: {old} -> {new}")
+        if not higher_is_worse and new < old * (1 - tolerance):
+            found.append(f"{label}: {old} -> {new}")
+
+    worse("rps", result["rps"], baseline.get("rps"), higher_is_worse=False)
+    worse("error_rate", result["error_rate"], baseline.get("error_rate"), slack=0.001)
+    worse("first_token_p50", result["first_token_p50"], baseline.get("first_token_p50"),
+          slack=LATENCY_SLACK)
+    for name, e in result["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if old:
+            for q, needed in MIN_REQUESTS.items():
+                if min(e["requests"], old["requests"]) >= needed:
+                    worse(f"{name} {q}", e[q], old[q], slack=LATENCY_SLACK,
+                          tolerance=TOLERANCE if q == "p50" else TAIL_TOLERANCE)
+    worse("rss_growth_mb", result["memory"]["rss_growth_mb"],
+          baseline.get("memory", {}).get("rss_growth_mb"), slack=MEMORY_SLACK_MB)
+    return found
+
+
+def report(result, args):
+    mode = f"open loop, {args.rate:g} conversations/s" if args.rate else f"closed loop, {args.users} users"
+    print(f"{mode}, {args.duration:g} s, stub {args.latency * 1000:.0f} ms + "
+          f"{args.token_delay * 1000:.0f} ms/token, {args.stream:.0%} streamed")
+    print(f"{result['requests']} requests in {result['elapsed']} s: {result['rps']} req/s, "
+          f"error rate {result['error_rate']:.2%}")
+    print(f"{'endpoint':<22} {'req':>6} {'req/s':>7} {'err':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, e in result["endpoints"].items():
+        print(f"{name:<22} {e['requests']:>6} {e['rps']:>7.1f} {e['errors']:>5} "
+              f"{e['p50'] * 1000:>8.1f} {e['p95'] * 1000:>8.1f} {e['p99'] * 1000:>8.1f}")
+    if result["first_token_p50"]:
+        print(f"stream first token p50/p95: {result['first_token_p50'] * 1000:.0f} / "
+              f"{result['first_token_p95'] * 1000:.0f} ms")
+    m = result["memory"]
+    print(f"server RSS {m['rss_start_mb']} -> {m['rss_end_mb']} MB (peak {m['rss_peak_mb']}), "
+          f"+{m['sessions']} sessions (~{m['session_mb']} MB), +{m['orders']} orders")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(HERE, "conversations.jsonl"))
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--users", type=int, default=20, help="closed loop: concurrent users")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="open loop: new conversations per second (overrides --users)")
+    parser.add_argument("--think", type=float, default=0.5, help="mean seconds between a user's turns")
+    parser.add_argument("--stream", type=float, default=0.5, help="fraction of turns using ?stream=1")
+    parser.add_argument("--widget-loads", type=float, default=0.3,
+                        help="fraction of conversations that first load /widget.js")
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--admin-poll", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds to first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="stub seconds per token")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--app-port", type=int, default=8901)
+    parser.add_argument("--baseline", help="compare with this JSON result; exit 1 on regression")
+    parser.add_argument("--save-baseline", help="write this run's result as JSON")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    with tempfile.TemporaryDirectory() as tmp, \
+            stub_groq.running(args.port, "--latency", args.latency, "--token-delay", args.token_delay):
+        env = {"ORDER_DB": os.path.join(tmp, "orders.db"), "SESSION_DB": os.path.join(tmp, "sessions.db"),
+               "GROQ_BASE_URL": os.environ["GROQ_BASE_URL"], "GROQ_API_KEY": "stub",
+               "ADMISSION_CONTROL": "0"}
+        with serving(args.app_port, env) as app:
+            rec, elapsed, before, after, rss = asyncio.run(
+                drive(f"http://127.0.0.1:{args.app_port}", app.pid, corpus, args))
+
+    result = summarize(rec, elapsed, before, after, rss)
+    result["settings"] = {k: v for k, v in vars(args).items()
+                          if k not in ("baseline", "save_baseline", "port", "app_port", "corpus")}
+    report(result, args)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != result["settings"]:
+            print("warning: baseline was recorded with different settings")
+        found = regressions(result, baseline)
+        if found:
+            print(f"REGRESSION vs {args.baseline} (>{TOLERANCE:.0%} worse):")
+            for line in found:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
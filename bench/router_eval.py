@@ -0,0 +1,179 @@
+"""Offline evaluation of model routing on the replay corpus.
+
+Replays every conversation in bench/conversations.jsonl through /chat
+(in-process) three ways and compares them:
+
+  large     every turn on the large model (MODEL_ROUTING=0)
+  small     every LLM turn on the small model, no escalation
+  routed    router.route() with escalation on a fumbled order
+
+Accuracy is per conversation that gives a phone number: exactly one order
+stored, with the items the customer asked for (the cart context.py
+tracked from their messages). Each conversation gets its own phone
+number so orders can be told apart. Latency is per LLM turn (menu fast
+path turns excluded); cost is llm_cost_dollars_total at llm.PRICES.
+
+By default the models are the stub's: the small one answers in
+--small-speed of the time and fumbles --small-errors of its order calls,
+so the numbers show what routing and escalation do with a model that
+makes mistakes at that rate. With --live the real API is used
+(GROQ_API_KEY) and the accuracy is the models' own:
+
+    python bench/router_eval.py --small-errors 0.15
+    python bench/router_eval.py --live --concurrency 2
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import re
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+from replay import load_corpus  # noqa: E402
+
+PHONE = re.compile(r"(?:\+92|0092|0)[\s-]?3\d{2}[\s-]?\d{7}\b|\+92\s?\d{3}\s?\d{7}\b")
+
+
+def expected_orders(conversations):
+    """Per conversation: (its turns with a unique phone, expected items or None)."""
+    import context
+    import menu
+
+    cases = []
+    for n, turns in enumerate(conversations):
+        phone = f"0300{n:07d}"
+        turns = [PHONE.sub(phone, t) for t in turns]
+        session = context.new_session()
+        expected = None
+        for text in turns:
+            if menu.DEFAULT.answer(text) is not None:
+                continue
+            context.observe_user(session, text)
+            if phone in text and expected is None and session["state"]["cart"]:
+                expected = sorted(item for item, qty in session["state"]["cart"].items()
+                                  for _ in range(qty))
+        cases.append((phone, turns, expected))
+    return cases
+
+
+async def evaluate(cases, tag, concurrency):
+    import httpx
+    import llm
+    import main
+    import menu
+    import router
+
+    latencies = []
+    costs_before = dict(llm.COST._values)
+    routes_before = dict(router.metrics)
+    escalations_before = sum(router.escalations.values())
+    limit = asyncio.Semaphore(concurrency)
+
+    async def conversation(client, n, turns):
+        async with limit:
+            for text in turns:
+                start = time.perf_counter()
+                r = await client.post("/chat", json={"text": text, "session_id": f"{tag}-{n}"})
+                r.raise_for_status()
+                if menu.DEFAULT.answer(text) is None:
+                    latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                 base_url="http://bench", timeout=None) as client:
+        await asyncio.gather(*(conversation(client, n, turns) for n, (_, turns, _) in enumerate(cases)))
+
+    correct = wrong = missed = 0
+    for phone, _, expected in cases:
+        if expected is None:
+            continue
+        placed = main.orders.page(phone=phone, limit=10)
+        if not placed:
+            missed += 1
+        elif len(placed) == 1 and sorted(placed[0]["items"]) == expected:
+            correct += 1
+        else:
+            wrong += 1
+    cost = sum(v - costs_before.get(k, 0) for k, v in llm.COST._values.items())
+    routes = {}
+    for (kind, model), count in router.metrics.items():
+        count -= routes_before.get((kind, model), 0)
+        if count:
+            routes[model] = routes.get(model, 0) + count
+    return {"correct": correct, "wrong": wrong, "missed": missed, "latencies": sorted(latencies),
+            "cost": cost, "routes": routes,
+            "escalations": sum(router.escalations.values()) - escalations_before}
+
+
+async def run_all(cases, args):
+    import main
+    import router
+
+    modes = {
+        "large": {"ENABLED": False},
+        "small": {"SMALL_KINDS": {"greeting", "adding", "details", "complaint", "question", "other"},
+                  "MIN_CONFIDENCE": 0.0, "failure": lambda *a: None},
+        "routed": {},
+    }
+    results = {}
+    for tag, patch in modes.items():
+        saved = {name: getattr(router, name) for name in patch}
+        for name, value in patch.items():
+            setattr(router, name, value)
+        main.orders = main.order_store.MemoryOrderStore()
+        try:
+            results[tag] = await evaluate(cases, tag, args.concurrency)
+        finally:
+            for name, value in saved.items():
+                setattr(router, name, value)
+    return results
+
+
+def pct(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(HERE, "conversations.jsonl"))
+    parser.add_argument("--live", action="store_true", help="use the real API instead of the stub")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--small-speed", type=float, default=0.3)
+    parser.add_argument("--small-errors", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    stub = contextlib.nullcontext() if args.live else stub_groq.running(
+        args.port, "--latency", args.latency, "--token-delay", args.token_delay,
+        "--small-speed", args.small_speed, "--small-errors", args.small_errors)
+    with stub:
+        cases = expected_orders(load_corpus(args.corpus))
+        results = asyncio.run(run_all(cases, args))
+
+    orders = sum(1 for _, _, expected in cases if expected is not None)
+    source = "live API" if args.live else (
+        f"stub: {args.latency * 1000:.0f} ms + {args.token_delay * 1000:.0f} ms/token, small model "
+        f"x{args.small_speed:g} time, {args.small_errors:.0%} fumbled order calls")
+    print(f"{len(cases)} conversations, {orders} with an order ({source})")
+    print(f"{'':<8} {'correct':>8} {'wrong':>6} {'missed':>7} {'p50 ms':>7} {'p95 ms':>7} {'mean ms':>8} "
+          f"{'$/1k conv':>10}  turns by model, escalations")
+    for tag, r in results.items():
+        lat = r["latencies"]
+        print(f"{tag:<8} {r['correct'] / orders:8.1%} {r['wrong']:>6} {r['missed']:>7} "
+              f"{pct(lat, 0.5) * 1000:7.0f} {pct(lat, 0.95) * 1000:7.0f} {statistics.mean(lat) * 1000:8.0f} "
+              f"{r['cost'] / len(cases) * 1000:10.4f}  {r['routes']}, {r['escalations']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Stress /chat with overlapping requests on shared and separate sessions.
+
+Fires --clients concurrent messages (half streamed) at one session and
+checks the saved history still alternates user/assistant with every turn
+accounted for, and that each order reply was recorded exactly once. Then
+runs --sessions sessions at once, --per-session clients each, to show
+unrelated sessions don't queue behind each other. --no-lock repeats the
+run with the per-session lock disabled, for comparison:
+
+    python bench/session_stress.py --clients 50 --sessions 200 --per-session 3
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+
+ORDER_REPLY = ('Confirmed! Shukriya Ali! ORDER_COMPLETE:{"name":"Ali","phone":"03001234567",'
+               '"items":["Zinger Burger"],"total":350}')
+
+
+class NoLock:
+    """Stand-in for sessions.KeyedLock that lets every turn through."""
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        yield
+
+    def __len__(self):
+        return 0
+
+
+async def post(client, session_id, text, stream):
+    if not stream:
+        r = await client.post("/chat", json={"text": text, "session_id": session_id})
+        r.raise_for_status()
+        return r.json()["response"]
+    async with client.stream("POST", "/chat?stream=1",
+                             json={"text": text, "session_id": session_id}) as r:
+        r.raise_for_status()
+        event = None
+        async for line in r.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: ") and event == "done":
+                return json.loads(line[6:])["response"]
+            elif line.startswith("data: ") and event == "error":
+                raise RuntimeError(line[6:])
+    raise RuntimeError("stream ended without a reply")
+
+
+def check(history, texts):
+    """Problems with a session history written by one turn per text."""
+    problems = []
+    roles = [m["role"] for m in history]
+    if any(a == b for a, b in zip(roles, roles[1:])):
+        problems.append("history does not alternate user/assistant")
+    sent = {m["content"] for m in history if m["role"] == "user"}
+    if not sent <= set(texts):
+        problems.append("unknown user message in history")
+    if len(sent) != sum(1 for r in roles if r == "user"):
+        problems.append("user message saved twice")
+    return problems
+
+
+async def run(args, lock):
+    import httpx
+    import context
+    import main
+
+    def saved_history(session_id):
+        return main.conversations.get(main.tenants.session_key(main.tenants.DEFAULT, session_id))["history"]
+
+    if not lock:
+        main.session_locks = NoLock()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        # Many clients on one shared session (tabs, retries, a shared demo id)
+        texts = [f"client {i} wants a burger please" for i in range(args.clients)]
+        before = len(main.orders)
+        start = time.perf_counter()
+        replies = await asyncio.gather(*(post(client, "shared", t, i % 2 == 1)
+                                         for i, t in enumerate(texts)))
+        shared_wall = time.perf_counter() - start
+        history = saved_history("shared")
+        problems = check(history, texts)
+        recorded = len(main.orders) - before
+        if recorded != args.clients:
+            problems.append(f"{recorded} orders recorded for {args.clients} order replies")
+        if any("ORDER_COMPLETE" in r for r in replies):
+            problems.append("order block leaked into a reply")
+        expected = min(2 * args.clients, context.HISTORY_KEEP)
+        if len(history) != expected:
+            problems.append(f"history has {len(history)} messages, expected {expected}")
+
+        # Many sessions at once, a few overlapping clients each
+        start = time.perf_counter()
+        await asyncio.gather(*(post(client, f"many-{s}", f"client {c} wants a burger please", c % 2 == 1)
+                               for s in range(args.sessions) for c in range(args.per_session)))
+        many_wall = time.perf_counter() - start
+        for s in range(args.sessions):
+            texts = [f"client {c} wants a burger please" for c in range(args.per_session)]
+            for p in check(saved_history(f"many-{s}"), texts):
+                problems.append(f"many-{s}: {p}")
+    return shared_wall, many_wall, problems, len(main.session_locks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--per-session", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--no-lock", action="store_true")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+
+    with stub_groq.running(args.port, "--latency", args.latency, "--reply", ORDER_REPLY):
+        shared, many, problems, locks_left = asyncio.run(run(args, not args.no_lock))
+
+    print(f"per-session lock:  {'off' if args.no_lock else 'on'}  (stub {args.latency * 1000:.0f} ms)")
+    print(f"1 session x {args.clients} clients:  {shared:.2f} s  "
+          f"(serial floor {args.clients * args.latency:.2f} s)")
+    print(f"{args.sessions} sessions x {args.per_session} clients:  {many:.2f} s  "
+          f"(per-session floor {args.per_session * args.latency:.2f} s, "
+          f"fully serial {args.sessions * args.per_session * args.latency:.1f} s)")
+    print(f"locks left idle:   {locks_left}")
+    if problems:
+        print(f"FAILED ({len(problems)} problems):")
+        for p in problems[:10]:
+            print(f"  {p}")
+        sys.exit(1)
+    print("OK: histories consistent, one order per order reply")
+
+
+if __name__ == "__main__":
+    main()
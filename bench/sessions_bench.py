@@ -0,0 +1,76 @@
+"""Session store throughput, memory and eviction counts.
+
+Writes --sessions distinct sessions (a user + assistant turn each) through
+the memory store under its caps, then a smaller run through SQLite:
+
+    python bench/sessions_bench.py --sessions 1000000 --sqlite-sessions 100000
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import context  # noqa: E402
+import sessions  # noqa: E402
+
+TURN = [
+    ("user", "2 zinger burger aur 1 fries"),
+    ("assistant", "Got it! 2 Zinger Burger, 1 Fries total Rs.850. Aapka naam aur number?"),
+]
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def drive(store, n):
+    start = time.perf_counter()
+    for i in range(n):
+        sid = f"s{i}"
+        session = store.get(sid) or context.new_session()
+        for role, content in TURN:
+            context.append(session, role, content)
+        store.save(sid, session)
+    writes = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(n - 1, max(n - 10_000, 0) - 1, -1):
+        store.get(f"s{i}")
+    reads = time.perf_counter() - start
+    return n / writes, min(n, 10_000) / reads
+
+
+def report(name, store, n, rates, rss_before):
+    w, r = rates
+    print(f"{name}: {n:,} sessions  {w:,.0f} turns/s  {r:,.0f} reads/s  "
+          f"peak RSS +{rss_mb() - rss_before:.0f} MB")
+    print(f"  {store.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument("--max-sessions", type=int, default=100_000)
+    parser.add_argument("--max-mb", type=int, default=64)
+    parser.add_argument("--sqlite-sessions", type=int, default=100_000)
+    args = parser.parse_args()
+
+    before = rss_mb()
+    store = sessions.MemorySessionStore(max_sessions=args.max_sessions,
+                                        max_bytes=args.max_mb * 1024 * 1024)
+    report(f"memory (cap {args.max_sessions:,} / {args.max_mb} MB)", store,
+           args.sessions, drive(store, args.sessions), before)
+
+    if args.sqlite_sessions:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = sessions.SQLiteSessionStore(os.path.join(tmp, "sessions.db"))
+            before = rss_mb()
+            report("sqlite (WAL)", store, args.sqlite_sessions,
+                   drive(store, args.sqlite_sessions), before)
+
+
+if __name__ == "__main__":
+    main()
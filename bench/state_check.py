@@ -0,0 +1,89 @@
+"""Cart and name extraction (context.observe_user) on messages that went wrong before.
+
+Each case is a conversation's customer messages and the cart and name the
+state line should end up with; then one conversation is run through /chat
+against the stub Groq server (which confirms whatever cart the state line
+shows) to check the order that gets placed:
+
+    python bench/state_check.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import context  # noqa: E402
+import stub_groq  # noqa: E402
+
+CASES = [
+    (["price of biryani"], {}, ""),
+    (["biryani kitne ki hai?"], {}, ""),
+    (["biryani spicy hai?"], {}, ""),
+    (["2 zinger 1 fries total?"], {}, ""),
+    (["menu please"], {}, ""),
+    (["2 zinger chahiye", "haan 2 zinger confirm"], {"Zinger Burger": 2}, ""),
+    (["2 zinger", "zinger"], {"Zinger Burger": 2}, ""),
+    (["2 zinger", "3 zinger kar do"], {"Zinger Burger": 3}, ""),
+    (["no biryani, only fries"], {"Fries": 1}, ""),
+    (["1 biryani 1 fries", "biryani hatao"], {"Fries": 1}, ""),
+    (["2 zinger burger 1 fries", "Ali 03001234567"], {"Zinger Burger": 2, "Fries": 1}, "Ali"),
+    (["main biryani lunga"], {"Biryani": 1}, ""),
+    (["i am hungry"], {}, ""),
+    (["remain order 1 zinger"], {"Zinger Burger": 1}, ""),
+    (["2 zinger 03001234567"], {"Zinger Burger": 2}, ""),
+    (["mera naam Sara hai"], {}, "Sara"),
+    (["main Ali hoon, number 03001234567"], {}, "Ali"),
+]
+
+SESSION = ["hi", "menu", "price of biryani", "2 zinger 1 fries", "Ali 03001234567"]
+
+
+def check_cases():
+    failed = 0
+    for turns, cart, name in CASES:
+        session = context.new_session()
+        for text in turns:
+            context.observe_user(session, text)
+        state = session["state"]
+        if state["cart"] != cart or state["name"] != name:
+            failed += 1
+            print(f"FAIL {turns}: cart {state['cart']} name {state['name']!r}, expected {cart} {name!r}")
+    print(f"{len(CASES) - failed}/{len(CASES)} extraction cases OK")
+    return failed
+
+
+async def placed_order():
+    import httpx
+    import main
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://check") as client:
+        for text in SESSION:
+            r = await client.post("/chat", json={"text": text, "session_id": "state-check"})
+            r.raise_for_status()
+    await main.order_jobs.drain(5)
+    return main.orders.all()[-1]["items"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    failed = check_cases()
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ["ADMISSION_CONTROL"] = "0"
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    with stub_groq.running(args.port, "--latency", 0.01):
+        items = asyncio.run(placed_order())
+    ok = sorted(items) == ["Fries", "Zinger Burger", "Zinger Burger"]  # one entry per unit
+    print(f"{'OK  ' if ok else 'FAIL'} {' -> '.join(SESSION)}: ordered {items}")
+    sys.exit(1 if failed or not ok else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""Local stand-in for the Groq chat completions API.
+
+Serves POST /openai/v1/chat/completions with a canned reply, so main.py can
+be load tested offline. --latency is the time to first token and
+--token-delay the gap between tokens; non-streaming calls wait for both.
+--prefill adds that many seconds per 1000 prompt tokens before the first
+token, so longer prompts cost more, like on the real API; with
+--prefix-cache, prompt tokens in messages that begin a recently seen
+prompt are free and reported as cached_tokens, like a provider's prompt
+prefix cache. --rpm/--tpm
+enforce request and token limits per --window seconds (a refilling bucket,
+as the real API does) and answer 429 with Retry-After when exceeded; counts
+are at GET /stub/stats. When the request offers tools and the last user
+message has a phone number, the reply also calls place_order (streamed
+as argument fragments, like the real API) for the items in the request's
+state line, or one Zinger Burger if it has none. Requests for
+--small-model run --small-speed times as long and fumble that call
+(leave it out, or order an off-menu item) with probability --small-errors.
+
+    python bench/stub_groq.py --port 8900 --latency 0.5 --token-delay 0.02
+    GROQ_BASE_URL=http://127.0.0.1:8900 GROQ_API_KEY=stub uvicorn main:app
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = "Got it! 1 Zinger Burger total Rs.350. Aapka naam aur number?"
+
+app = FastAPI()
+app.state.latency = 0.5
+app.state.token_delay = 0.0
+app.state.prefill = 0.0
+app.state.reply = REPLY
+app.state.limits = None
+app.state.prefixes = None
+app.state.small_model = "llama-3.1-8b-instant"
+app.state.small_speed = 0.3
+app.state.small_errors = 0.0
+app.state.rng = random.Random(0)
+app.state.counts = {"served": 0, "rate_limited": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                    "fumbled": 0}
+
+_ids = itertools.count(1)
+
+PHONE = re.compile(r"(?:0|\+92\s?)\s?3\d{2}[\s-]?\d{7}")
+CART = re.compile(r"items so far: (.+?) \(Rs\.")
+CONFIRM_TEXT = "Confirmed! Shukriya Ali!"
+
+
+def cart(messages):
+    """Items from the state line the app sends, as place_order items."""
+    for m in reversed(messages):
+        found = CART.search(str(m.get("content", ""))) if m.get("role") == "system" else None
+        if found:
+            items = []
+            for part in found.group(1).split(", "):
+                qty, _, name = part.partition(" ")
+                items.append({"item": name, "qty": int(qty)})
+            return items
+    return [{"item": "Zinger Burger", "qty": 1}]
+
+
+def order_call(messages, tools, small=False):
+    """The place_order call a real model would make for this turn, if any."""
+    if not any(t.get("function", {}).get("name") == "place_order" for t in tools or ()):
+        return None
+    users = [m for m in messages if m.get("role") == "user"]
+    phone = PHONE.search(str(users[-1].get("content", ""))) if users else None
+    if not phone:
+        return None
+    items = cart(messages)
+    if small and app.state.rng.random() < app.state.small_errors:
+        app.state.counts["fumbled"] += 1
+        if app.state.rng.random() < 0.5:
+            return None
+        items = [{"item": "Chicken Tikka", "qty": 1}]
+    return {
+        "id": f"call_stub_{next(_ids)}",
+        "type": "function",
+        "function": {"name": "place_order", "arguments": json.dumps({
+            "name": "Ali", "phone": phone.group(0), "items": items})},
+    }
+
+
+def completion_body(model, content, prompt_tokens=0, call=None, cached=None):
+    completion_tokens = max(len(content.split()), 1)
+    message = {"role": "assistant", "content": content}
+    if call:
+        message["tool_calls"] = [call]
+    return {
+        "id": f"chatcmpl-stub-{next(_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": message,
+            "finish_reason": "tool_calls" if call else "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            **({"prompt_tokens_details": {"cached_tokens": cached}} if cached is not None else {}),
+        },
+    }
+
+
+def prompt_tokens(messages):
+    # Rough whitespace count; good enough for relative comparisons
+    return sum(len(str(m.get("content", "")).split()) for m in messages)
+
+
+def tokens(content):
+    words = content.split(" ")
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+class PrefixCache:
+    """Message-level prompt prefix cache: the longest run of leading messages
+    (and tools) seen in a recent request is not prefilled again."""
+
+    def __init__(self, size=100_000):
+        self.size = size
+        self.seen = collections.OrderedDict()
+
+    def cached_tokens(self, messages, tools):
+        digest = hashlib.sha256(json.dumps(tools, sort_keys=True).encode())
+        cached = 0
+        hit = True
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True).encode())
+            key = digest.digest()
+            if hit and key in self.seen:
+                cached += prompt_tokens([message])
+                self.seen.move_to_end(key)
+            else:
+                hit = False
+                self.seen[key] = True
+        while len(self.seen) > self.size:
+            self.seen.popitem(last=False)
+        return cached
+
+
+def prompt_usage(body):
+    """(prompt tokens, cached prompt tokens or None without --prefix-cache)."""
+    messages = body.get("messages", [])
+    total = prompt_tokens(messages)
+    cached = None
+    if app.state.prefixes is not None:
+        cached = app.state.prefixes.cached_tokens(messages, body.get("tools"))
+        app.state.counts["cached_tokens"] += cached
+    app.state.counts["prompt_tokens"] += total
+    return total, cached
+
+
+def speed(model):
+    return app.state.small_speed if model == app.state.small_model else 1.0
+
+
+def first_token_delay(model, prompt, cached):
+    return speed(model) * (app.state.latency + app.state.prefill * (prompt - (cached or 0)) / 1000)
+
+
+async def stream_body(model, content, prompt, cached, call=None):
+    chunk_id = f"chatcmpl-stub-{next(_ids)}"
+
+    def chunk(delta, finish_reason=None, **extra):
+        return "data: " + json.dumps({
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }) + "\n\n"
+
+    await asyncio.sleep(first_token_delay(model, prompt, cached))
+    for i, token in enumerate(tokens(content)):
+        if i and app.state.token_delay:
+            await asyncio.sleep(app.state.token_delay * speed(model))
+        yield chunk({"content": token})
+    if call:
+        args = call["function"]["arguments"]
+        yield chunk({"tool_calls": [{"index": 0, "id": call["id"], "type": "function",
+                                     "function": {"name": "place_order", "arguments": ""}}]})
+        for i in range(0, len(args), 12):
+            yield chunk({"tool_calls": [{"index": 0, "function": {"arguments": args[i:i + 12]}}]})
+    # Like Groq, the last chunk carries the usage under x_groq
+    usage = completion_body(model, content, prompt, call, cached)["usage"]
+    yield chunk({}, "tool_calls" if call else "stop", x_groq={"id": chunk_id, "usage": usage})
+    yield "data: [DONE]\n\n"
+
+
+class Limits:
+    """Requests and tokens allowed per window, refilling continuously."""
+
+    def __init__(self, rpm, tpm, window):
+        self.caps = {"requests": rpm, "tokens": tpm}
+        self.levels = dict(self.caps)
+        self.window = window
+        self.stamp = time.monotonic()
+
+    def admit(self, tokens):
+        """Charge one request of `tokens` tokens; return seconds to wait if over."""
+        now = time.monotonic()
+        for kind, cap in self.caps.items():
+            if cap:
+                self.levels[kind] = min(cap, self.levels[kind] + (now - self.stamp) * cap / self.window)
+        self.stamp = now
+        need = {"requests": 1, "tokens": tokens}
+        wait = max((need[k] - self.levels[k]) * self.window / cap
+                   for k, cap in self.caps.items() if cap) if any(self.caps.values()) else 0
+        if wait > 0:
+            return wait
+        for kind, cap in self.caps.items():
+            if cap:
+                self.levels[kind] -= need[kind]
+        return 0
+
+
+def rate_limited(wait):
+    app.state.counts["rate_limited"] += 1
+    return JSONResponse(
+        {"error": {"message": "Rate limit reached, please try again later",
+                   "type": "tokens", "code": "rate_limit_exceeded"}},
+        status_code=429, headers={"retry-after": f"{max(wait, 0.01):.2f}"})
+
+
+@app.get("/stub/stats")
+def stub_stats():
+    return app.state.counts
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    if app.state.limits:
+        wait = app.state.limits.admit(prompt_tokens(body.get("messages", []))
+                                      + len(tokens(app.state.reply)))
+        if wait:
+            return rate_limited(wait)
+    app.state.counts["served"] += 1
+    messages = body.get("messages", [])
+    call = order_call(messages, body.get("tools"), model == app.state.small_model)
+    reply = CONFIRM_TEXT if call else app.state.reply
+    prompt, cached = prompt_usage(body)
+    if body.get("stream"):
+        return StreamingResponse(stream_body(model, reply, prompt, cached, call),
+                                 media_type="text/event-stream")
+    n = len(tokens(reply))
+    await asyncio.sleep(first_token_delay(model, prompt, cached)
+                        + app.state.token_delay * speed(model) * (n - 1))
+    return completion_body(model, reply, prompt, call, cached)
+
+
+@contextlib.contextmanager
+def running(port=8900, *args):
+    """Run the stub in a subprocess and point llm.py at it via the environment."""
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--port", str(port), *map(str, args)])
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError("stub Groq server did not start")
+                time.sleep(0.05)
+        os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{port}"
+        os.environ.setdefault("GROQ_API_KEY", "stub")
+        yield proc
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0,
+                        help="seconds between tokens")
+    parser.add_argument("--prefill", type=float, default=0.0,
+                        help="extra seconds per 1000 prompt tokens")
+    parser.add_argument("--prefix-cache", action="store_true",
+                        help="don't charge --prefill for a prompt prefix seen recently")
+    parser.add_argument("--small-model", default=app.state.small_model)
+    parser.add_argument("--small-speed", type=float, default=app.state.small_speed,
+                        help="--small-model's latencies as a share of the others'")
+    parser.add_argument("--small-errors", type=float, default=0.0,
+                        help="share of --small-model's order calls that are wrong or missing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reply", default=REPLY)
+    parser.add_argument("--rpm", type=int, default=0, help="requests per window (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="tokens per window (0 = unlimited)")
+    parser.add_argument("--window", type=float, default=60.0, help="rate limit window in seconds")
+    args = parser.parse_args()
+    app.state.latency = args.latency
+    app.state.token_delay = args.token_delay
+    app.state.prefill = args.prefill
+    app.state.reply = args.reply
+    app.state.small_model = args.small_model
+    app.state.small_speed = args.small_speed
+    app.state.small_errors = args.small_errors
+    app.state.rng = random.Random(args.seed)
+    if args.prefix_cache:
+        app.state.prefixes = PrefixCache()
+    if args.rpm or args.tpm:
+        app.state.limits = Limits(args.rpm, args.tpm, args.window)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning",
+                backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
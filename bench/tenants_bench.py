@@ -0,0 +1,165 @@
+"""Per-request cost of serving many restaurants from one process.
+
+Writes --tenants tenant configs (random menus) to a temporary TENANTS_DIR
+and drives the app in-process:
+
+  * /chat menu fast path for the default tenant, then the first and the
+    second request for every tenant (cold = file read + menu, prompt and
+    tool schema built; warm = cached), then the default tenant again with
+    every tenant loaded
+  * /widget.js per tenant, cold (generated + compressed) and warm
+  * memory held per cached tenant
+  * isolation: the same session id and order sent to two tenants whose
+    menus price the item differently, against the stub Groq server
+
+    python bench/tenants_bench.py --tenants 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+
+DISHES = ["Seekh Kebab", "Chicken Tikka", "Nihari", "Haleem", "Naan", "Roti", "Daal", "Chana",
+          "Paratha", "Lassi", "Chai", "Samosa", "Pakora", "Kheer", "Gulab Jamun", "Shawarma",
+          "Club Sandwich", "Pasta", "Fish Fry", "Raita", "Salad", "Broast", "Wings", "Karahi",
+          "Pulao", "Korma", "Qeema", "Aloo Gosht", "Halwa Puri", "Mango Shake"]
+
+
+def write_tenants(directory, count, rng):
+    for i in range(count):
+        dishes = rng.sample(DISHES, rng.randint(5, 12))
+        config = {
+            "name": f"Restaurant {i}",
+            "greeting": f"Salam! Welcome to Restaurant {i}.",
+            "menu": {d: {"price": rng.randrange(50, 1500, 10), "aliases": [d.split()[0].lower()]}
+                     for d in dishes},
+        }
+        with open(os.path.join(directory, f"r{i}.json"), "w") as f:
+            json.dump(config, f)
+    for tenant_id, price in (("iso-a", 500), ("iso-b", 300)):
+        with open(os.path.join(directory, f"{tenant_id}.json"), "w") as f:
+            json.dump({"name": tenant_id, "menu": {"Zinger Burger": {"price": price, "aliases": ["zinger"]},
+                                                   "Fries": 150}}, f)
+
+
+async def per_request(client, requests):
+    start = time.perf_counter()
+    for method, url, body in requests:
+        r = await client.request(method, url, json=body)
+        r.raise_for_status()
+    return (time.perf_counter() - start) / len(requests)
+
+
+async def run(args):
+    import httpx
+    import main
+
+    results = {}
+    ids = [f"r{i}" for i in range(args.tenants)]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                 base_url="http://bench", timeout=None) as client:
+        chat = [("POST", "/chat", {"text": "menu", "session_id": f"s{i % 100}"}) for i in range(2000)]
+        await per_request(client, chat[:200])  # warm up
+        results["chat default tenant"] = await per_request(client, chat)
+
+        def spread(tenant_ids):
+            return [("POST", "/chat", {"text": "menu", "session_id": "s1", "tenant": t}) for t in tenant_ids]
+
+        results["chat cold (first per tenant)"] = await per_request(client, spread(ids))
+        results["chat warm (all tenants)"] = await per_request(client, spread(ids))
+        results["chat default tenant, again"] = await per_request(client, chat)
+
+        widget_ids = ids[:min(args.tenants, main.tenant_registry.max_widgets)]
+        widgets = [("GET", f"/widget.js?tenant={t}", None) for t in widget_ids]
+        results["widget.js default tenant"] = await per_request(
+            client, [("GET", "/widget.js", None)] * len(widget_ids))
+        results["widget.js cold"] = await per_request(client, widgets)
+        results["widget.js warm"] = await per_request(client, widgets)
+        sizes = [len(a[1].variants["identity"][0]) for a in list(main.tenant_registry._widgets.values())[:1]]
+
+        # Same session id at two restaurants pricing the same item differently
+        replies = {}
+        for tenant_id in ("iso-a", "iso-b"):
+            for text in ("ek zinger", "Ali 03001234567"):
+                r = await client.post("/chat", json={"text": text, "session_id": "same", "tenant": tenant_id})
+                r.raise_for_status()
+            page = (await client.get(f"/orders?tenant={tenant_id}")).json()
+            replies[tenant_id] = page
+        sessions = {t: len(main.conversations.get(main.tenants.session_key(t, "same"))["history"])
+                    for t in ("iso-a", "iso-b")}
+        default_orders = (await client.get("/orders")).json()["total_orders"]
+
+    # Building a tenant on its own: file read, menu index, prompt, tool schema
+    registry = main.tenants.TenantRegistry(main.tenant_registry.directory, main.system_prompt,
+                                           main.order_tools, max_cached=args.tenants)
+    tracemalloc.start()
+    for t in ids:
+        registry.get(t)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    registry = main.tenants.TenantRegistry(main.tenant_registry.directory, main.system_prompt,
+                                           main.order_tools, max_cached=args.tenants)
+    start = time.perf_counter()
+    for t in ids:
+        registry.get(t)
+    results["registry.get() cold"] = (time.perf_counter() - start) / len(ids)
+    start = time.perf_counter()
+    for t in ids:
+        registry.get(t)
+    results["registry.get() warm"] = (time.perf_counter() - start) / len(ids)
+    return results, held, sizes, replies, sessions, default_orders, main
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_tenants(tmp, args.tenants, rng)
+        os.environ["TENANTS_DIR"] = tmp
+        os.environ.setdefault("ORDER_STORE", "memory")
+        os.environ.setdefault("ADMISSION_CONTROL", "0")
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+        with stub_groq.running(args.port, "--latency", 0.02):
+            results, held, sizes, replies, sessions, default_orders, app = asyncio.run(run(args))
+
+    print(f"{args.tenants} tenants")
+    for label, per in results.items():
+        print(f"  {label:<30} {per * 1e6:8.1f} µs/request")
+    print(f"  memory per cached tenant: {held / args.tenants / 1024:.1f} KiB "
+          "(menu, prompt, tool schema, request prefix)")
+    print(f"  widget script: {sizes[0]} bytes per tenant before compression")
+    print(f"  registry: {app.tenant_registry.metrics}")
+    problems = []
+    for tenant_id, price in (("iso-a", 500), ("iso-b", 300)):
+        page = replies[tenant_id]
+        totals = [o["total"] for o in page["orders"]]
+        print(f"  {tenant_id}: orders {totals}, session history {sessions[tenant_id]} messages")
+        if totals != [price] or any(o["tenant"] != tenant_id for o in page["orders"]):
+            problems.append(f"{tenant_id} sees {page['orders']}")
+        if sessions[tenant_id] != 4:
+            problems.append(f"{tenant_id} session has {sessions[tenant_id]} messages, expected 4")
+    if default_orders:
+        problems.append(f"default tenant sees {default_orders} orders")
+    if problems:
+        print("FAILED: " + "; ".join(problems))
+        sys.exit(1)
+    print("OK: orders, prices and sessions isolated per tenant")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Time to first token: /chat vs /chat?stream=1 against the local stub.
+
+Starts the stub Groq server and `uvicorn main:app` as subprocesses and times
+sequential turns over real HTTP, so streaming is measured end to end:
+
+    python bench/ttft.py --turns 50 --latency 0.3 --token-delay 0.03
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_groq  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORDER_REPLY = ('Confirmed! Shukriya Ali! Aapka order 30 minute mein aa jayega. '
+               'ORDER_COMPLETE:{"name":"Ali","phone":"03001234567","items":["Biryani"],"total":450}')
+
+
+def wait_for_app(url):
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            httpx.get(url + "/orders", timeout=0.5)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("app did not start")
+
+
+def plain_turn(client, i):
+    start = time.perf_counter()
+    r = client.post("/chat", json={"text": "order", "session_id": f"plain-{i}"})
+    r.raise_for_status()
+    total = time.perf_counter() - start
+    return total, total, r.json()["response"]
+
+
+def stream_turn(client, i):
+    start = time.perf_counter()
+    first = None
+    final = None
+    with client.stream("POST", "/chat", params={"stream": 1},
+                       json={"text": "order", "session_id": f"stream-{i}"}) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = json.loads(line[6:])
+            if "token" in data and first is None:
+                first = time.perf_counter() - start
+            if "response" in data:
+                final = data["response"]
+    return first, time.perf_counter() - start, final
+
+
+def summarize(name, results):
+    first = sorted(r[0] for r in results)
+    total = sorted(r[1] for r in results)
+    p95 = lambda xs: xs[min(int(0.95 * len(xs)), len(xs) - 1)] * 1000
+    print(f"{name:<10} first byte p50 {statistics.median(first) * 1000:6.0f} ms  p95 {p95(first):6.0f} ms"
+          f"   full reply p50 {statistics.median(total) * 1000:6.0f} ms")
+    return statistics.median(first)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.03)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--app-port", type=int, default=8901)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    with stub_groq.running(args.port, "--latency", args.latency,
+                           "--token-delay", args.token_delay, "--reply", ORDER_REPLY):
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.app_port),
+             "--log-level", "warning"], cwd=ROOT)
+        try:
+            url = f"http://127.0.0.1:{args.app_port}"
+            wait_for_app(url)
+            with httpx.Client(base_url=url, timeout=30) as client:
+                plain = [plain_turn(client, i) for i in range(args.turns)]
+                streamed = [stream_turn(client, i) for i in range(args.turns)]
+                orders = client.get("/orders").json()["total_orders"]
+        finally:
+            app.terminate()
+            app.wait()
+
+    a = summarize("/chat", plain)
+    b = summarize("stream=1", streamed)
+    print(f"time-to-first-token improvement: {a / b:.1f}x ({(a - b) * 1000:.0f} ms)")
+    clean = all("ORDER_COMPLETE" not in r[2] for r in plain + streamed)
+    print(f"orders recorded: {orders} of {2 * args.turns}, order block hidden from replies: {clean}")
+
+
+if __name__ == "__main__":
+    main()
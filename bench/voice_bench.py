@@ -0,0 +1,238 @@
+"""Voice calls from recorded audio: end of speech to first reply audio, and barge-in.
+
+Each call is a set of WAV files (16 kHz mono 16-bit) named
+<call>-<turn>.wav, each with a <call>-<turn>.txt transcript next to it:
+
+    python bench/voice_bench.py --audio recordings/ --latency 0.3 --token-delay 0.03
+
+Without --audio, --calls conversations from conversations.jsonl are
+rendered as tone-burst "speech" (one burst per word) into a temporary
+directory first. The caller streams each file into /voice in real time
+through an in-process client, then waits for the reply before the next
+one; every --barge-every'th reply it talks over instead, half a second
+into the reply's audio.
+
+The transcripts are played back by voice.ScriptedSTT (the audio's
+timing drives it: speech detection, partials, the endpoint) and replies
+are spoken by voice.ToneTTS, against the stub Groq server. Runs twice:
+replies spoken sentence by sentence as they stream (as served), and
+spoken in one piece once the LLM has finished.
+"""
+import argparse
+import array
+import glob
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import stub_groq  # noqa: E402
+import voice  # noqa: E402
+
+
+def render(text, path, rng):
+    """Write text as tone bursts, 250-400 ms per word, with silence around it."""
+    samples = array.array("h", bytes(voice.SAMPLE_RATE * 2 * 3 // 10))  # 300 ms lead-in
+    for word in text.split():
+        n = voice.SAMPLE_RATE * rng.randint(250, 400) // 1000
+        pitch = rng.uniform(120, 240)
+        samples.extend(int(6000 * math.sin(math.pi * i / n) * math.sin(2 * math.pi * pitch * i / voice.SAMPLE_RATE))
+                       for i in range(n))
+        samples.extend(array.array("h", bytes(2 * voice.SAMPLE_RATE * rng.randint(60, 120) // 1000)))
+    samples.extend(array.array("h", bytes(voice.SAMPLE_RATE * 2)))  # 1 s: past the endpoint
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(voice.SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+
+
+def synthesize(directory, calls):
+    rng = random.Random(7)
+    with open(os.path.join(HERE, "conversations.jsonl"), encoding="utf-8") as f:
+        conversations = [json.loads(line) for line in f][:calls]
+    for conv in conversations:
+        for i, text in enumerate(conv["turns"]):
+            stem = os.path.join(directory, f"{conv['session']}-{i:02d}")
+            render(text, stem + ".wav", rng)
+            with open(stem + ".txt", "w", encoding="utf-8") as f:
+                f.write(text)
+
+
+def load(directory):
+    """{call: [(pcm, transcript, (speech start, end) in seconds)]} from <call>-<turn>.wav files."""
+    calls = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        with wave.open(path, "rb") as f:
+            if (f.getnchannels(), f.getsampwidth(), f.getframerate()) != (1, 2, voice.SAMPLE_RATE):
+                raise SystemExit(f"{path}: need 16 kHz mono 16-bit PCM")
+            pcm = f.readframes(f.getnframes())
+        with open(path[:-4] + ".txt", encoding="utf-8") as f:
+            text = f.read().strip()
+        speech = [i for i, voiced in enumerate(voice.Vad().feed(pcm)) if voiced] or [0]
+        call = os.path.basename(path)[:-4].rsplit("-", 1)[0]
+        calls.setdefault(call, []).append(
+            (pcm, text, (speech[0] * voice.FRAME_MS / 1000, (speech[-1] + 1) * voice.FRAME_MS / 1000)))
+    return calls
+
+
+class Caller:
+    """Plays one call's audio into the socket while a thread collects what comes back."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.events = []  # (monotonic, kind, data)
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        while True:
+            try:
+                message = self.ws.receive()
+            except Exception:
+                return
+            now = time.monotonic()
+            if message["type"] == "websocket.close":
+                return
+            if message.get("bytes"):
+                self.events.append((now, "audio", len(message["bytes"])))
+            elif message.get("text"):
+                data = json.loads(message["text"])
+                self.events.append((now, data["type"], data))
+
+    def wait(self, predicate, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            found = predicate()
+            if found:
+                return found
+            time.sleep(0.005)
+        raise RuntimeError("timed out waiting for the server")
+
+    def count(self, kind):
+        return sum(1 for e in self.events if e[1] == kind)
+
+    def first_audio_after(self, kind, n):
+        """Time of the first audio after the n-th (1-based) event of kind."""
+        seen = 0
+        for when, k, _ in self.events:
+            if k == kind:
+                seen += 1
+            elif k == "audio" and seen >= n:
+                return when
+        return None
+
+    def say(self, pcm):
+        """Stream pcm in 20 ms frames at real time; returns when it started."""
+        start = time.monotonic()
+        for i, offset in enumerate(range(0, len(pcm), voice.FRAME_BYTES)):
+            delay = start + i * voice.FRAME_MS / 1000 - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.ws.send_bytes(pcm[offset:offset + voice.FRAME_BYTES])
+        return start
+
+
+def run_call(client, name, turns, barge_every, results):
+    voice.STT_ENGINES["scripted"] = lambda: voice.ScriptedSTT([text for _, text, _ in turns])
+    with client.websocket_connect(f"/voice?session_id=voice-{name}-{voice.CHUNK_SENTENCES}") as ws:
+        caller = Caller(ws)
+        caller.wait(lambda: caller.count("ready"))
+        for i, (pcm, text, (speech_start, speech_end)) in enumerate(turns):
+            barging = i and barge_every and i % barge_every == 0
+            if barging:
+                # Talk over the previous reply a little way into its audio
+                first = caller.wait(lambda: caller.first_audio_after("final", i))
+                time.sleep(max(first + 0.3 - speech_start - time.monotonic(), 0))
+            elif i:
+                caller.wait(lambda: caller.count("done") >= i)
+            start = caller.say(pcm)
+            if barging:
+                caller.wait(lambda: caller.count("done") >= i)
+                events = [e for e in caller.events if e[0] > start]
+                cut = next((n for n, e in enumerate(events) if e[1] == "barge_in"), None)
+                if cut is not None:  # else the reply had ended before the caller spoke
+                    # Audio of the cut reply sent after the barge-in: what the client must flush
+                    late = 0
+                    for when, kind, data in events[cut + 1:]:
+                        if kind == "done":
+                            break
+                        late += data if kind == "audio" else 0
+                    results["barge_in"].append((events[cut][0] - start - speech_start, late))
+            first = caller.wait(lambda: caller.first_audio_after("final", i + 1))
+            results["first_audio"].append(first - start - speech_end)
+        caller.wait(lambda: caller.count("done") >= len(turns))
+        ws.send_text(json.dumps({"type": "stop"}))
+        caller.reader.join(5)
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--audio", help="directory of <call>-<turn>.wav files with .txt transcripts")
+    parser.add_argument("--calls", type=int, default=3, help="conversations to render without --audio")
+    parser.add_argument("--barge-every", type=int, default=3, help="talk over every n-th reply (0: never)")
+    parser.add_argument("--target-ms", type=float, default=1200,
+                        help="end of speech to first reply audio")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.03)
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    os.environ.setdefault("ORDER_STORE", "memory")
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+    os.environ["ADMISSION_CONTROL"] = "0"
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"  # every call says the same things
+    with tempfile.TemporaryDirectory() as scratch:
+        if not args.audio:
+            synthesize(scratch, args.calls)
+        calls = load(args.audio or scratch)
+        with stub_groq.running(args.port, "--latency", args.latency, "--token-delay", args.token_delay):
+            from starlette.testclient import TestClient
+
+            import main as app_main
+
+            voice.STT_ENGINE, voice.TTS_ENGINE = "scripted", "tone"
+            runs = []
+            with TestClient(app_main.app) as client:  # one event loop for every call
+                for chunked in (True, False):
+                    voice.CHUNK_SENTENCES = chunked
+                    results = {"first_audio": [], "barge_in": []}
+                    for name, turns in calls.items():
+                        run_call(client, name, turns, args.barge_every, results)
+                    runs.append((chunked, results))
+
+    turns = sum(len(t) for t in calls.values())
+    print(f"{len(calls)} calls, {turns} turns; stub {args.latency * 1000:.0f} ms + "
+          f"{args.token_delay * 1000:.0f} ms/token, endpoint {voice.ENDPOINT_MS} ms; "
+          f"end of speech to first reply audio (target {args.target_ms:.0f} ms):")
+    for chunked, results in runs:
+        latency = results["first_audio"]
+        within = sum(1 for s in latency if s * 1000 <= args.target_ms)
+        print(f"  {'sentence chunks' if chunked else 'whole reply    '}  p50 {pct(latency, 0.5):6.0f} ms  "
+              f"p95 {pct(latency, 0.95):6.0f} ms  max {pct(latency, 1):6.0f} ms  "
+              f"({within}/{len(latency)} within target)")
+    barges = runs[0][1]["barge_in"]
+    if barges:
+        stop = [s for s, _ in barges]
+        late = [b / 2 / voice.SAMPLE_RATE for _, b in barges]
+        print(f"barge-in: {len(barges)} replies cut short, stopped p50 {pct(stop, 0.5):.0f} ms max "
+              f"{pct(stop, 1):.0f} ms after the caller started talking (BARGE_IN_MS {voice.BARGE_IN_MS}); "
+              f"at most {max(late) * 1000:.0f} ms of reply audio sent after the barge_in message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+
+_SPACE = re.compile(r"\s+")
+
+
+def cache_key(messages, prefix="", **params):
+    """Hash of the model parameters and the normalized message list.
+
+    Case and whitespace are folded so "Hi " and "hi" share an entry. prefix
+    is the key of the messages that come before these (e.g. a system
+    prompt keyed once up front), so they aren't normalized on every call.
+    """
+    normalized = [[m["role"], _SPACE.sub(" ", m["content"]).strip().lower()] for m in messages]
+    payload = json.dumps([prefix, sorted(params.items()), normalized], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of LLM reply text with a byte budget.
+
+    fetch() coalesces concurrent misses for the same key into one call
+    (single-flight). Replies for which skip(reply) is true are returned but
+    never stored, e.g. ones that complete an order.
+    """
+
+    def __init__(self, max_entries=10_000, max_bytes=32 * 1024 * 1024, ttl=600, skip=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.skip = skip or (lambda reply: False)
+        self.bytes = 0
+        self._data = OrderedDict()  # key -> (stored_at, reply)
+        self._inflight = {}
+        self.metrics = {"hits": 0, "misses": 0, "coalesced": 0, "stored": 0, "skipped": 0,
+                        "evicted": 0}
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            self._drop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, reply):
+        if self.skip(reply):
+            self.metrics["skipped"] += 1
+            return
+        if key in self._data:
+            self._drop(key)
+        self._data[key] = (time.monotonic(), reply)
+        self.bytes += len(reply)
+        self.metrics["stored"] += 1
+        while self._data and (len(self._data) > self.max_entries or self.bytes > self.max_bytes):
+            self._drop(next(iter(self._data)))
+            self.metrics["evicted"] += 1
+
+    def discard(self, key):
+        """Forget key's reply, e.g. one that turned out to be unusable."""
+        if key in self._data:
+            self._drop(key)
+
+    def _drop(self, key):
+        self.bytes -= len(self._data.pop(key)[1])
+
+    async def fetch(self, key, call):
+        """Cached reply for key, or the result of awaiting call()."""
+        reply = self.get(key)
+        if reply is not None:
+            self.metrics["hits"] += 1
+            return reply
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.metrics["coalesced"] += 1
+            return await asyncio.shield(pending)
+        self.metrics["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            reply = await call()
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            future.set_result(reply)
+            self.put(key, reply)
+            return reply
+        finally:
+            del self._inflight[key]
+
+    def stats(self):
+        lookups = self.metrics["hits"] + self.metrics["misses"] + self.metrics["coalesced"]
+        served = self.metrics["hits"] + self.metrics["coalesced"]
+        return {**self.metrics, "entries": len(self._data), "bytes": self.bytes,
+                "hit_rate": round(served / lookups, 3) if lookups else 0.0}
@@ -0,0 +1,201 @@
+"""Per-session prompt context: recent turns under a token budget plus a
+compact cart/customer state extracted as the conversation goes.
+
+A session is a plain dict so every SessionStore backend can keep it:
+
+    {"history": [{"role", "content"}, ...],   # trimmed to HISTORY_KEEP
+     "tokens": [int, ...],                     # estimate per history entry
+     "wire": [str, ...],                       # JSON of each history entry
+     "window": int,                            # where the sent history starts
+     "state": {"cart": {item: qty}, "name": str, "phone": str,
+               "customer": str}}                # past orders, for repeat customers
+
+Requests are laid out so that each one starts with the previous one: the
+system prompt, then a window of history that only grows at the end until
+it is over budget, then the state line, which changes from turn to turn.
+"""
+import json
+import os
+import re
+
+import menu
+
+HISTORY_KEEP = 20
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "400"))
+CONTEXT_MESSAGES = int(os.getenv("CONTEXT_MESSAGES", "6"))
+# Share of the budget the window is cut back to when it overflows; the
+# lower, the more turns in a row reuse the same prefix
+CONTEXT_REFILL = float(os.getenv("CONTEXT_REFILL", "0.5"))
+
+PHONE = re.compile(r"(?:\+92|0092|0)[\s-]?3\d{2}[\s-]?\d{7}\b|\+92\s?\d{3}\s?\d{7}\b")
+NAME = re.compile(r"\b(?:naam|name is|name|i am|i'm|main)\s*(?:hai|is|:)?\s+([A-Za-z][A-Za-z]+)\b", re.I)
+REMOVE_WORDS = {"hata", "hatao", "remove", "cancel", "nikal", "nikalo", "minus", "without",
+                "no", "not", "nahi", "nahin", "mat", "bina", "dont", "don"}
+NOT_NAMES = {"hai", "is", "mera", "meri", "number", "phone", "aur", "and", "hungry", "ready",
+             "here", "fine", "done", "busy", "back", "sorry", "sure", "just", "also", "not",
+             "looking", "waiting", "interested", "new", "ok", "okay", "going", "order", "lunga",
+             "lungi", "chahta", "chahti"}
+# Clauses are read on their own, so "no biryani, only fries" drops the one
+# and keeps the other
+CLAUSE = re.compile(r"[,.;!\n]+|\b(?:but|lekin|magar|only|sirf|bas)\b", re.I)
+QUESTION_WORDS = menu.MENU_WORDS | menu.PRICE_WORDS | menu.TOTAL_WORDS
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English/Roman Urdu with llama tokenizers
+    return (len(text) + 3) // 4 + 4
+
+
+def new_session():
+    return {"history": [], "tokens": [], "wire": [], "window": 0,
+            "state": {"cart": {}, "name": "", "phone": ""}}
+
+
+def encode(message):
+    return json.dumps(message, separators=(",", ":"))
+
+
+def _wire(session):
+    # Sessions saved before "wire" existed get it on their next turn
+    wire = session.get("wire")
+    if wire is None or len(wire) != len(session["history"]):
+        wire = session["wire"] = [encode(m) for m in session["history"]]
+    return wire
+
+
+def append(session, role, content):
+    wire = _wire(session)
+    message = {"role": role, "content": content}
+    session["history"].append(message)
+    session["tokens"].append(estimate_tokens(content))
+    wire.append(encode(message))
+    extra = len(session["history"]) - HISTORY_KEEP
+    if extra > 0:
+        del session["history"][:extra]
+        del session["tokens"][:extra]
+        del wire[:extra]
+        session["window"] = max(session.get("window", 0) - extra, 0)
+
+
+def observe_user(session, text, catalog=menu.DEFAULT):
+    """Update the cart/customer state from a customer message.
+
+    Only orders change the cart: menu, price and total questions, and
+    other questions without a quantity ("biryani spicy hai?"), leave it
+    alone. An item named with a quantity is set to it, so repeating an
+    order doesn't double it; items after no/nahi/remove are taken out.
+    """
+    state = session["state"]
+    if not asking(text, catalog):
+        cart = state["cart"]
+        for clause in CLAUSE.split(text):
+            items, other = catalog.scan(clause or "")
+            if not items:
+                continue
+            if REMOVE_WORDS & set(other):
+                for name, _ in items:
+                    cart.pop(name, None)
+                continue
+            said = {}
+            for name, qty in items:
+                said[name] = said.get(name, 0) + (qty or 0)
+            for name, qty in said.items():
+                cart[name] = qty or cart.get(name) or 1
+    phone = PHONE.search(text)
+    if phone:
+        state["phone"] = phone.group(0)
+        before = text[:phone.start()].split()
+        if not state["name"] and before and is_name(before[-1], catalog):
+            state["name"] = before[-1].capitalize()
+    name = NAME.search(text)
+    if name and is_name(name.group(1), catalog):
+        state["name"] = name.group(1).capitalize()
+
+
+def asking(text, catalog=menu.DEFAULT):
+    """True for a question about the menu rather than an order."""
+    items, other = catalog.scan(text)
+    if QUESTION_WORDS & set(other):
+        return True
+    return text.rstrip().endswith("?") and not any(qty for _, qty in items)
+
+
+def is_name(word, catalog=menu.DEFAULT):
+    word = word.lower()
+    return (word.isalpha() and word not in NOT_NAMES and word not in menu.FILLER
+            and word not in menu.NUMBERS and word not in QUESTION_WORDS and not catalog.scan(word)[0])
+
+
+def confirming(session):
+    """True once the customer has items in the cart and has given a phone number."""
+    state = session["state"]
+    return bool(state["cart"]) and bool(state["phone"])
+
+
+def order_placed(session):
+    session["state"] = new_session()["state"]
+
+
+def render_state(state, catalog=menu.DEFAULT):
+    parts = []
+    # Items a reloaded menu no longer has are left out rather than priced
+    items = [(name, qty) for name, qty in state["cart"].items() if name in catalog.prices]
+    if items:
+        parts.append(f"items so far: {menu.describe(items)} (Rs.{catalog.total(items)})")
+    if state["name"]:
+        parts.append(f"name: {state['name']}")
+    if state["phone"]:
+        parts.append(f"phone: {state['phone']}")
+    if state.get("customer"):
+        parts.append(state["customer"])
+    if not parts:
+        return ""
+    return ("Earlier in this conversation (auto-extracted; the latest messages win): "
+            + "; ".join(parts))
+
+
+def _fit(tokens, max_tokens, max_messages):
+    """Start of the newest entries within both limits (at least one entry)."""
+    start = len(tokens)
+    used = 0
+    while start > 0 and len(tokens) - start < max_messages:
+        if used + tokens[start - 1] > max_tokens and start < len(tokens):
+            break
+        used += tokens[start - 1]
+        start -= 1
+    return start
+
+
+def window(session):
+    """Index of the first history entry to send.
+
+    The window keeps its start while what it holds fits CONTEXT_TOKENS and
+    CONTEXT_MESSAGES; once it doesn't, it is cut back to the newest
+    entries within CONTEXT_REFILL of the budget. The latest message is
+    always included.
+    """
+    tokens = session["tokens"]
+    start = min(session.get("window", 0), max(len(tokens) - 1, 0))
+    if len(tokens) - start > CONTEXT_MESSAGES or sum(tokens[start:]) > CONTEXT_TOKENS:
+        start = _fit(tokens, int(CONTEXT_TOKENS * CONTEXT_REFILL),
+                     max(int(CONTEXT_MESSAGES * CONTEXT_REFILL), 1))
+    session["window"] = start
+    return start
+
+
+def turn_messages(session, catalog=menu.DEFAULT):
+    """(messages, wire): what goes after the system prompt, and its JSON.
+
+    The history window comes first and the state line last, so the
+    request shares everything up to the previous turn's state line with
+    the one before it.
+    """
+    start = window(session)
+    messages = session["history"][start:]
+    wire = _wire(session)[start:]
+    summary = render_state(session["state"], catalog)
+    if summary:
+        message = {"role": "system", "content": summary}
+        messages.append(message)
+        wire.append(encode(message))
+    return messages, wire
@@ -0,0 +1,127 @@
+"""Customers by phone number, for repeat-customer lookups.
+
+Phone numbers are normalized so one customer is one key however they
+typed it: Pakistani mobiles (0300 1234567, 0300-1234567, +92 300 1234567,
+00923001234567, 3001234567) all become "+923001234567"; anything else
+keeps its digits (and a leading +).
+"""
+import re
+import threading
+from collections import Counter
+
+import menu
+
+_NOT_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone):
+    phone = str(phone or "").strip()
+    digits = _NOT_DIGITS.sub("", phone)
+    if digits.startswith("0092"):
+        digits = digits[2:]
+    elif digits.startswith("03") and len(digits) == 11:
+        digits = "92" + digits[1:]
+    elif digits.startswith("3") and len(digits) == 10:
+        digits = "92" + digits
+    if digits.startswith("92") and len(digits) == 12:
+        return "+" + digits
+    return ("+" if phone.startswith("+") else "") + digits
+
+
+class Customer:
+    __slots__ = ("phone", "name", "order_ids", "spent", "first", "last", "last_items", "items")
+
+    def __init__(self, phone):
+        self.phone = phone
+        self.name = ""
+        self.order_ids = []
+        self.spent = 0
+        self.first = ""
+        self.last = ""
+        self.last_items = []
+        self.items = {}  # item -> units ever ordered
+
+    def to_dict(self, top=3):
+        return {
+            "phone": self.phone,
+            "name": self.name,
+            "orders": len(self.order_ids),
+            "order_ids": self.order_ids[::-1],
+            "total_spent": self.spent,
+            "first_order": self.first,
+            "last_order": self.last,
+            "last_items": self.last_items,
+            "favourite_items": Counter(self.items).most_common(top),
+        }
+
+
+class CustomerIndex:
+    """Customers keyed by normalized phone, updated as each order is recorded.
+
+    record() is O(items in the order) and get() is one dict lookup; order
+    ids are kept oldest first, so the newest are at the end.
+    """
+
+    def __init__(self, orders=()):
+        self._lock = threading.Lock()
+        self._customers = {}
+        # Phone as written in an order -> normalized; customers keep writing
+        # it the same way. Lookups don't add to it, so it only grows with orders
+        self._keys = {}
+        self.repeat = 0  # customers with more than one order
+        for order in sorted(orders, key=lambda o: o.get("id") or 0):
+            self.record(order)
+
+    def key(self, phone):
+        key = self._keys.get(phone)
+        return normalize_phone(phone) if key is None else key
+
+    def record(self, order):
+        phone = self._keys.get(order.get("phone"))
+        if phone is None:
+            phone = self._keys[order.get("phone")] = normalize_phone(order.get("phone"))
+        if not phone:
+            return
+        with self._lock:
+            customer = self._customers.get(phone)
+            if customer is None:
+                customer = self._customers[phone] = Customer(phone)
+            elif len(customer.order_ids) == 1:
+                self.repeat += 1
+            customer.order_ids.append(order.get("id"))
+            customer.spent += order.get("total") or 0
+            customer.name = order.get("name") or customer.name
+            customer.first = customer.first or order.get("time", "")
+            customer.last = order.get("time", "")
+            customer.last_items = items = list(order.get("items", []))
+            counts = customer.items
+            for item in items:
+                counts[item] = counts.get(item, 0) + 1
+
+    def get(self, phone):
+        """The customer's summary dict, or None if they have never ordered."""
+        customer = self._customers.get(self.key(phone))
+        if customer is None:
+            return None
+        with self._lock:
+            return customer.to_dict()
+
+    def describe(self, phone, catalog=menu.DEFAULT):
+        """A line for the bot's context about a returning customer, or ""."""
+        customer = self._customers.get(self.key(phone))
+        if customer is None:
+            return ""
+        with self._lock:
+            count, items, last = len(customer.order_ids), list(customer.last_items), customer.last
+        counts = Counter(items)
+        last_order = menu.describe(list(counts.items()))
+        known = [(item, qty) for item, qty in counts.items() if item in catalog.prices]
+        total = f" (Rs.{catalog.total(known)} at today's prices)" if len(known) == len(counts) else ""
+        return (f"returning customer, {count} past order{'s' if count > 1 else ''}; "
+                f"last on {last[:10]}: {last_order}{total}")
+
+    def __len__(self):
+        return len(self._customers)
+
+    def stats(self):
+        return {"customers": len(self._customers), "repeat_customers": self.repeat}
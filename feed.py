@@ -0,0 +1,99 @@
+import asyncio
+import collections
+import json
+import uuid
+
+# Sent instead of the events a subscriber missed when its queue overflowed
+# or it reconnected after they left the replay buffer
+RESYNC = "resync"
+
+
+class Subscriber:
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize)
+        self.lagged = 0  # times this subscriber fell behind and was resynced
+
+    async def next(self):
+        return await self.queue.get()
+
+    def resync(self, event_id):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait((event_id, RESYNC, "{}"))
+        self.lagged += 1
+
+
+class Broadcaster:
+    """In-process fan-out of events to many subscribers.
+
+    publish() serializes an event once and hands the same string to every
+    subscriber's bounded queue without awaiting, so a recorded order is
+    never held up by a dashboard. A subscriber whose queue is full (a slow
+    or stalled client) has its backlog dropped and replaced by a single
+    RESYNC event; it then refetches the current state over HTTP. Memory per
+    subscriber is therefore capped at queue_size events however far behind
+    it gets.
+
+    The last queue_size events are kept so a client reconnecting with the
+    id of the last event it saw (SSE Last-Event-ID) gets what it missed.
+    Ids carry a per-process epoch, so ids from before a restart resync.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, queue_size=100, max_subscribers=1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.recent = collections.deque(maxlen=queue_size)
+        self.metrics = {"published": 0, "delivered": 0, "replayed": 0, "resynced": 0, "rejected": 0}
+
+    def event_id(self, seq):
+        return f"{self.epoch}-{seq}"
+
+    def full(self):
+        return len(self.subscribers) >= self.max_subscribers
+
+    def subscribe(self, last_event_id=None):
+        """A new Subscriber, or None when max_subscribers are connected.
+
+        With last_event_id, events published after it are queued first, or
+        a RESYNC if they are no longer all buffered.
+        """
+        if self.full():
+            return None
+        subscriber = Subscriber(self.queue_size)
+        if last_event_id:
+            epoch, _, seq = last_event_id.partition("-")
+            missed = self.seq - int(seq) if epoch == self.epoch and seq.isdigit() else -1
+            if 0 <= missed <= len(self.recent):
+                for message in list(self.recent)[len(self.recent) - missed:]:
+                    subscriber.queue.put_nowait(message)
+                self.metrics["replayed"] += missed
+            else:
+                subscriber.resync(self.event_id(self.seq))
+                self.metrics["resynced"] += 1
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        """Queue (event id, event, JSON data) for every subscriber; returns the id."""
+        self.seq += 1
+        message = (self.event_id(self.seq), event, json.dumps(data, ensure_ascii=False))
+        self.recent.append(message)
+        self.metrics["published"] += 1
+        for subscriber in self.subscribers:
+            if subscriber.queue.full():
+                subscriber.resync(message[0])
+                self.metrics["resynced"] += 1
+                continue
+            subscriber.queue.put_nowait(message)
+            self.metrics["delivered"] += 1
+        return message[0]
+
+    def __len__(self):
+        return len(self.subscribers)
@@ -0,0 +1,217 @@
+"""In-process background jobs for work that follows an event, off the request path.
+
+Handlers subscribe to an event kind; publish() queues one job per
+handler without awaiting, and a pool of worker tasks runs them. A
+handler that raises is retried with exponential backoff; one that keeps
+failing (or a job that can't be queued, or is still pending when drain()
+gives up at shutdown) goes to the dead-letter list, which retry_dead()
+queues again. Each handler retries on its own, so a failing webhook
+never re-runs the dashboard update that already succeeded.
+
+Handlers may be plain functions (run on the event loop, so keep them
+short) or coroutine functions.
+"""
+import asyncio
+import collections
+import json
+import logging
+import time
+
+import telemetry
+
+log = logging.getLogger(__name__)
+
+LAG = telemetry.Histogram("jobs_lag_seconds", "Time from publish (or retry) to a worker starting the job.",
+                          labels=("handler",))
+RUN = telemetry.Histogram("jobs_run_seconds", "Time spent running a job.", labels=("handler",))
+
+
+class Job:
+    __slots__ = ("kind", "handler", "payload", "attempts", "queued", "error")
+
+    def __init__(self, kind, handler, payload):
+        self.kind = kind
+        self.handler = handler
+        self.payload = payload
+        self.attempts = 0
+        self.queued = time.monotonic()
+        self.error = None
+
+    def describe(self):
+        return {"kind": self.kind, "handler": self.handler.__name__, "attempts": self.attempts,
+                "error": self.error, "payload": self.payload}
+
+
+class JobQueue:
+    def __init__(self, workers=4, max_retries=3, backoff=0.5, maxsize=10_000, dead_max=1000,
+                 dead_letter_path=None):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.maxsize = maxsize
+        self.dead_letter_path = dead_letter_path
+        self.dead = collections.deque(maxlen=dead_max)
+        self.pending = 0  # queued, running or waiting to retry
+        self._handlers = {}  # kind -> [handler]
+        self._queue = None
+        self._loop = None
+        self._tasks = []
+        self._retrying = {}  # timer handle -> job waiting to retry
+        self._running = set()
+        self._idle = None
+        self.metrics = {"published": 0, "done": 0, "retried": 0, "dead": 0}
+
+    def subscribe(self, kind, handler):
+        self._handlers.setdefault(kind, []).append(handler)
+        return handler
+
+    def publish(self, kind, payload):
+        """Queue payload for every handler of kind; call from the event loop."""
+        for handler in self._handlers.get(kind, ()):
+            self.metrics["published"] += 1
+            self._put(Job(kind, handler, payload))
+
+    def _put(self, job):
+        self._start()
+        if self._queue.qsize() >= self.maxsize:
+            job.error = "queue full"
+            self._bury(job)
+            return
+        self.pending += 1
+        self._idle.clear()
+        job.queued = time.monotonic()
+        self._queue.put_nowait(job)
+
+    def _start(self):
+        # Workers belong to the running loop; a new loop (tests, benches
+        # calling asyncio.run again) gets new ones and the jobs left queued
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        left = self._take_all()
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+        for job in left:
+            self._queue.put_nowait(job)
+        # Whatever was running on the old loop died with it
+        self._running.clear()
+        self.pending = len(left)
+        if not self.pending:
+            self._idle.set()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            self._running.add(job)
+            name = job.handler.__name__
+            start = time.monotonic()
+            LAG.observe(start - job.queued, name)
+            job.attempts += 1
+            try:
+                result = job.handler(job.payload)
+                if asyncio.iscoroutine(result):
+                    await result
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                job.error = f"{type(exc).__name__}: {exc}"
+                if job.attempts <= self.max_retries:
+                    self.metrics["retried"] += 1
+                    delay = self.backoff * 2 ** (job.attempts - 1)
+                    log.warning("job %s failed (%s), retry %d in %.1fs", name, job.error, job.attempts, delay)
+                    self._retry_in(job, delay)
+                    continue
+                log.error("job %s failed %d times, dead-lettered: %s", name, job.attempts, job.error)
+                self._bury(job)
+            else:
+                self.metrics["done"] += 1
+            finally:
+                self._running.discard(job)
+                RUN.observe(time.monotonic() - start, name)
+            self._finished()
+
+    def _retry_in(self, job, delay):
+        def retry():
+            del self._retrying[timer]
+            job.queued = time.monotonic()
+            self._queue.put_nowait(job)
+
+        timer = self._loop.call_later(delay, retry)
+        self._retrying[timer] = job
+
+    def _take_all(self):
+        """Remove and return every job queued or waiting to retry."""
+        jobs = []
+        while self._queue is not None and not self._queue.empty():
+            jobs.append(self._queue.get_nowait())
+        for timer, job in self._retrying.items():
+            timer.cancel()
+            jobs.append(job)
+        self._retrying.clear()
+        return jobs
+
+    def _finished(self):
+        self.pending -= 1
+        if not self.pending:
+            self._idle.set()
+
+    def _bury(self, job):
+        self.metrics["dead"] += 1
+        self.dead.append(job)
+        if self.dead_letter_path:
+            try:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(job.describe(), ensure_ascii=False, default=str) + "\n")
+            except OSError:
+                log.exception("could not write dead letter to %s", self.dead_letter_path)
+
+    def retry_dead(self):
+        """Queue every dead-lettered job again; returns how many."""
+        jobs = list(self.dead)
+        self.dead.clear()
+        for job in jobs:
+            job.attempts = 0
+            self._put(job)
+        return len(jobs)
+
+    async def drain(self, timeout=10.0):
+        """Wait up to timeout for every pending job, then stop the workers.
+
+        Jobs still queued, running or waiting to retry are dead-lettered
+        (and so written to dead_letter_path) rather than lost without a
+        trace.
+        """
+        if self._loop is None:
+            return True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            finished = True
+        except asyncio.TimeoutError:
+            finished = False
+        running = list(self._running)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for job in running + self._take_all():
+            job.error = job.error or "not run before shutdown"
+            self._bury(job)
+        if not finished:
+            log.warning("job queue drained with %d jobs unfinished", self.pending)
+        self.pending = 0
+        self._loop = None
+        self._queue = None
+        return finished
+
+    def lag(self):
+        """Seconds the oldest queued job has been waiting."""
+        try:  # may be read from another thread (/admin/stats runs in the threadpool)
+            return time.monotonic() - self._queue._queue[0].queued
+        except (AttributeError, IndexError):
+            return 0.0
+
+    def stats(self):
+        return {"queued": self._queue.qsize() if self._queue else 0, "pending": self.pending,
+                "lag_seconds": round(self.lag(), 3), **self.metrics,
+                "dead_letters": [job.describe() for job in list(self.dead)[-20:]]}
@@ -0,0 +1,300 @@
+"""Append-only record log with group-committed fsyncs and snapshots.
+
+One Journal holds one in-memory store's changes (see order_store's and
+sessions' "log" backends) in a directory:
+
+    <name>-<seq>.snap   the whole state as of the start of log <seq>
+    <name>-<seq>.log    records appended after that snapshot
+
+Records are marshal'd and framed as [length][crc32][payload]. append()
+only encodes and queues; a writer thread writes whatever has queued up
+within fsync_interval in one write and one fsync, so a crash loses at
+most that much. Every snapshot_every records the store hands over a copy
+of its state: the writer writes it to a temporary file, renames it into
+place, starts the next log and deletes the older files.
+
+recover() loads the newest snapshot through mmap and replays the logs
+after it, stopping at a torn or corrupt tail (which is cut off), so
+startup costs one snapshot load plus at most snapshot_every records.
+marshal is used because it is the fastest way to turn bytes back into
+dicts, lists, strings and numbers, which is all that is ever stored.
+
+A write that fails (a full disk) is cut back off the log and retried
+write_retries times; records that still can't be written are counted in
+write_failures and the store is asked for a snapshot on its next
+append(), which puts them on disk once it can be written again. A
+failed snapshot is logged and the log carries on as before.
+
+A journal directory belongs to one process; a second one opening it
+fails instead of interleaving writes.
+"""
+import contextlib
+import fcntl
+import glob
+import logging
+import marshal
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+
+log = logging.getLogger(__name__)
+
+FRAME = struct.Struct("<II")  # payload length, crc32
+
+
+class Journal:
+    def __init__(self, directory, name, fsync_interval=0.05, batch_size=4096, snapshot_every=100_000,
+                 write_retries=3):
+        self.directory = directory
+        self.name = name
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self.snapshot_every = snapshot_every
+        self.write_retries = write_retries
+        self.seq = 0
+        self.since_snapshot = 0
+        self._file = None
+        self._size = 0  # of the log up to its last complete write
+        self._lost = False  # records failed to be written since the last snapshot
+        self._resnapshot = False  # ask the store for a snapshot to cover them
+        self._queue = queue.Queue()
+        self._writer = None
+        self.metrics = {"records": 0, "bytes": 0, "fsyncs": 0, "snapshots": 0, "snapshot_bytes": 0,
+                        "recovered": 0, "truncated_bytes": 0, "write_failures": 0, "snapshot_failures": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, f"{name}.lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            raise RuntimeError(f"journal {directory}/{name} is in use by another process")
+
+    def _path(self, seq, kind):
+        return os.path.join(self.directory, f"{self.name}-{seq:08d}.{kind}")
+
+    def _existing(self, kind):
+        pattern = re.compile(re.escape(self.name) + r"-(\d{8})\." + kind + "$")
+        found = []
+        for path in glob.glob(os.path.join(glob.escape(self.directory), f"{self.name}-*.{kind}")):
+            match = pattern.search(path)
+            if match:
+                found.append(int(match.group(1)))
+        return sorted(found)
+
+    def recover(self):
+        """(snapshot state or None, list of records after it); then opens the log.
+
+        Call once, before the first append().
+        """
+        for leftover in glob.glob(os.path.join(glob.escape(self.directory), f"{self.name}-*.snap.tmp")):
+            os.remove(leftover)  # a snapshot that was still being written
+        snapshots = self._existing("snap")
+        state = None
+        if snapshots:
+            self.seq = snapshots[-1]
+            with open(self._path(self.seq, "snap"), "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    state = marshal.loads(data)
+        records = []
+        for seq in self._existing("log"):
+            if seq >= self.seq:
+                records.extend(self._read(seq))
+                self.seq = seq
+        self.metrics["recovered"] = len(records)
+        self.since_snapshot = len(records)
+        self._file = open(self._path(self.seq, "log"), "ab")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._writer = threading.Thread(target=self._write_loop, name=f"{self.name}-journal", daemon=True)
+        self._writer.start()
+        return state, records
+
+    def _read(self, seq):
+        path = self._path(seq, "log")
+        records = []
+        with open(path, "rb") as f:
+            data = f.read()
+        pos = 0
+        while pos + FRAME.size <= len(data):
+            length, crc = FRAME.unpack_from(data, pos)
+            payload = data[pos + FRAME.size:pos + FRAME.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            records.append(marshal.loads(payload))
+            pos += FRAME.size + length
+        if pos < len(data):
+            # A write cut short by a crash; everything before it is intact
+            log.warning("journal %s: dropping %d bytes of torn tail", path, len(data) - pos)
+            self.metrics["truncated_bytes"] += len(data) - pos
+            with open(path, "r+b") as f:
+                f.truncate(pos)
+        return records
+
+    def append(self, record):
+        """Queue a record; returns True when the store should snapshot().
+
+        Call with the store's lock held so records and snapshots keep the
+        order the changes were made in.
+        """
+        payload = marshal.dumps(record)
+        self._queue.put(FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.since_snapshot += 1
+        return self.since_snapshot >= self.snapshot_every or self._resnapshot
+
+    def snapshot(self, state):
+        """Write state (a copy nobody modifies any more) and start a new log.
+
+        Call with the store's lock held, like append().
+        """
+        self.since_snapshot = 0
+        self._resnapshot = False
+        self._queue.put(("snapshot", state))
+
+    def _write_loop(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            taken = 1
+            frames = []
+            deadline = time.monotonic() + self.fsync_interval
+            try:
+                while True:
+                    if item is None:
+                        stop = True
+                        break
+                    if isinstance(item, tuple):
+                        if frames:
+                            self._write(frames)
+                            frames = []
+                        self._snapshot(item[1])
+                    else:
+                        frames.append(item)
+                    if len(frames) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    taken += 1
+                if frames:
+                    self._write(frames)
+            except Exception:
+                # Never let the writer die: append() would queue forever
+                # and flush() and close() would wait on nothing
+                log.exception("journal %s: writer error", self.name)
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+    def _write(self, frames):
+        data = b"".join(frames)
+        for attempt in range(self.write_retries + 1):
+            try:
+                if attempt:
+                    time.sleep(0.1 * 2 ** (attempt - 1))
+                    self._reopen()
+                self._file.write(data)
+                self._file.flush()
+                os.fdatasync(self._file.fileno())
+                break
+            except (OSError, ValueError) as exc:  # ValueError: the file was left closed
+                error = exc
+        else:
+            self.metrics["write_failures"] += len(frames)
+            self._lost = self._resnapshot = True
+            log.error("journal %s: could not write %d records, asking for a snapshot: %s",
+                      self.name, len(frames), error)
+            with contextlib.suppress(OSError):
+                self._reopen()
+            return
+        self._size += len(data)
+        self.metrics["records"] += len(frames)
+        self.metrics["bytes"] += len(data)
+        self.metrics["fsyncs"] += 1
+
+    def _reopen(self):
+        """Cut the log back to its last complete write and open it again."""
+        with contextlib.suppress(OSError):
+            self._file.close()  # drops whatever the failed write left buffered
+        os.truncate(self._file.name, self._size)
+        self._file = open(self._file.name, "ab")
+
+    def _snapshot(self, state):
+        try:
+            self._rotate(state)
+        except Exception:
+            # The log is still the one after the last snapshot, so only
+            # records that failed to be written need another try
+            self.metrics["snapshot_failures"] += 1
+            self._resnapshot = self._lost
+            log.exception("journal %s: snapshot failed", self.name)
+
+    def _rotate(self, state):
+        seq = self.seq + 1
+        path = self._path(seq, "snap")
+        data = marshal.dumps(state)
+        new_log = None
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # Opened before the rename: once the snapshot is in place, the
+            # records after it must be able to go to its log
+            new_log = open(self._path(seq, "log"), "ab")
+            os.replace(path + ".tmp", path)
+        except BaseException:
+            if new_log is not None:
+                new_log.close()
+                with contextlib.suppress(OSError):
+                    os.remove(new_log.name)
+            with contextlib.suppress(OSError):
+                os.remove(path + ".tmp")
+            raise
+        with contextlib.suppress(OSError):
+            self._file.close()
+        self._file, self._size = new_log, 0
+        self.seq = seq
+        self._lost = False
+        self.metrics["snapshots"] += 1
+        self.metrics["snapshot_bytes"] += len(data)
+        self.metrics["bytes"] += len(data)
+        self._sync_directory()
+        for old in self._existing("snap") + self._existing("log"):
+            if old < seq:
+                for kind in ("snap", "log"):
+                    if os.path.exists(self._path(old, kind)):
+                        os.remove(self._path(old, kind))
+
+    def _sync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def flush(self):
+        """Wait until everything appended so far is on disk (or failed to be)."""
+        # Not queue.join(): that would wait forever if the writer had died
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks and self._writer.is_alive():
+                done.wait(0.1)
+
+    def close(self):
+        if self._writer is not None:
+            self._queue.put(None)
+            if self._writer.is_alive():
+                self._writer.join()
+            else:
+                self._write_loop()  # what a dead writer left, the final snapshot too
+        if self._file is not None:
+            self._file.close()
+        self._lock_file.close()
+
+    def stats(self):
+        return {**self.metrics, "seq": self.seq, "since_snapshot": self.since_snapshot}
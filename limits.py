@@ -0,0 +1,87 @@
+"""Admission control for /chat: per-key rate limits and a cap on turns in flight.
+
+RateLimiter is a token bucket per key (client IP, session) kept as a
+single float: the time the bucket will be full again (GCRA). A request
+is allowed if that time, pushed one interval later, is no more than
+`burst` intervals ahead of now. A key whose bucket has refilled holds no
+information, so those entries are the ones swept when the table grows
+past max_keys; only if every key is busy are the oldest dropped (which
+hands them a fresh bucket, never a wrongful 429).
+
+ConcurrencyLimit counts turns in flight and turns new ones away at the
+cap instead of queueing them, so overload is a fast 429 rather than
+growing latency for everyone.
+"""
+import itertools
+import time
+
+
+class RateLimiter:
+    def __init__(self, rate, per=60.0, burst=1, max_keys=100_000):
+        """rate requests per `per` seconds on average, up to burst at once; rate 0 is unlimited."""
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.interval = per / rate if rate else 0.0
+        self.window = self.interval * self.burst
+        self.max_keys = max_keys
+        self._full_at = {}  # key -> monotonic time the key's bucket is full again
+        self.metrics = {"allowed": 0, "limited": 0, "evicted": 0}
+
+    def hit(self, key, now=None):
+        """Take one token for key: 0.0 if allowed, else seconds until it would be."""
+        if not self.rate:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        full_at = self._full_at.get(key, now)
+        if full_at < now:
+            full_at = now
+        wait = full_at + self.interval - now - self.window
+        if wait > 0:
+            self.metrics["limited"] += 1
+            return wait
+        if len(self._full_at) >= self.max_keys and key not in self._full_at:
+            self._sweep(now)
+        self._full_at[key] = full_at + self.interval
+        self.metrics["allowed"] += 1
+        return 0.0
+
+    def _sweep(self, now):
+        table = self._full_at
+        evict = [key for key, full_at in table.items() if full_at <= now]
+        if len(table) - len(evict) >= self.max_keys:
+            # Everyone is mid-burst: drop the longest-held keys, a tenth at a time
+            evict.extend(itertools.islice(table, max(self.max_keys // 10, 1)))
+        for key in evict:
+            table.pop(key, None)
+        self.metrics["evicted"] += len(evict)
+
+    def __len__(self):
+        return len(self._full_at)
+
+    def stats(self):
+        return {"keys": len(self._full_at), **self.metrics}
+
+
+class ConcurrencyLimit:
+    def __init__(self, limit):
+        """At most limit holders at once; 0 is unlimited."""
+        self.limit = limit
+        self.active = 0
+        self.peak = 0
+        self.metrics = {"admitted": 0, "shed": 0}
+
+    def try_acquire(self):
+        if self.limit and self.active >= self.limit:
+            self.metrics["shed"] += 1
+            return False
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.metrics["admitted"] += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+
+    def stats(self):
+        return {"limit": self.limit, "active": self.active, "peak": self.peak, **self.metrics}
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+import groq
+import httpx
+from dotenv import load_dotenv
+from groq import AsyncGroq, AsyncStream
+from groq.types.chat import ChatCompletion, ChatCompletionChunk
+
+from cache import cache_key
+from scheduler import NORMAL, Scheduler
+from telemetry import TOKEN_BUCKETS, Counter, Histogram
+
+load_dotenv()
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Point at a local stub (see bench/stub_groq.py) for load testing
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+MAX_TOKENS = 500
+TEMPERATURE = 0.7
+
+# USD per million (prompt, completion) tokens, for llm_cost_dollars_total
+PRICES = {
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "openai/gpt-oss-20b": (0.075, 0.30),
+    "openai/gpt-oss-120b": (0.15, 0.60),
+}
+
+# Connection pool shared by every chat turn in this worker. httpcore's pool
+# scheduling is O(connections) per request, so keep this in the tens and let
+# the scheduler below queue the rest.
+MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE = int(os.getenv("GROQ_MAX_KEEPALIVE", str(MAX_CONNECTIONS)))
+KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "30"))
+
+# Per-request timeout (seconds) and max number of concurrent LLM calls per
+# worker. Extra turns wait in the scheduler's queue instead of a thread.
+REQUEST_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", str(MAX_CONNECTIONS)))
+
+# Provider rate limits for this worker's share of the API key (0 = off),
+# the longest a turn may queue for them, and the retry backoff (seconds)
+RATE_RPM = int(os.getenv("GROQ_RPM", "0"))
+RATE_TPM = int(os.getenv("GROQ_TPM", "0"))
+QUEUE_TIMEOUT = float(os.getenv("GROQ_QUEUE_TIMEOUT", "30"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    ),
+    # Waiting for a free pooled connection is bounded by the scheduler below,
+    # so only connect/read get their own limits here.
+    timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=5.0, pool=None),
+)
+
+client = AsyncGroq(
+    api_key=GROQ_API_KEY,
+    base_url=GROQ_BASE_URL,
+    http_client=http_client,
+    timeout=REQUEST_TIMEOUT,
+    # Retries go back through the scheduler so they respect the rate limits
+    max_retries=0,
+)
+
+scheduler = Scheduler(MAX_CONCURRENCY, rpm=RATE_RPM, tpm=RATE_TPM, queue_timeout=QUEUE_TIMEOUT)
+_pending = 0
+
+QUEUE_WAIT = Histogram("llm_queue_wait_seconds",
+                       "Time a call waited in the scheduler before being sent (per attempt).")
+FIRST_TOKEN = Histogram("llm_time_to_first_token_seconds",
+                        "From sending the request to the first reply text (whole reply if not streamed).",
+                        labels=("mode", "model"))
+CALL_DURATION = Histogram("llm_call_duration_seconds",
+                          "From sending the request to the end of the reply.", labels=("mode", "model"))
+TOKENS = Histogram("llm_tokens", "Tokens per call as reported by the provider.",
+                   labels=("kind", "model"), buckets=TOKEN_BUCKETS)
+COST = Counter("llm_cost_dollars_total", "Provider cost of the tokens used, at PRICES.",
+               labels=("model",))
+
+RETRYABLE = (groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError)
+
+
+class Prefix:
+    """The start of every request for one system prompt and set of tools.
+
+    Serialized once, so a turn only serializes its own messages, and always
+    sent first and unchanged, so the provider can reuse its cached prompt
+    prefix from one turn to the next. `key` stands in for the system
+    message in reply cache keys (see cache.cache_key).
+    """
+
+    def __init__(self, system_prompt, tools=None):
+        self.message = {"role": "system", "content": system_prompt}
+        self.tools = tools
+        head = json.dumps(_tool_params(tools), separators=(",", ":"))[1:-1]
+        self.json = (head + "," if head else "") + '"messages":[' + json.dumps(self.message)
+        self.key = cache_key([self.message])
+
+
+def request_body(messages, params, prefix=None, wire=None):
+    """The JSON request body as bytes.
+
+    With prefix, messages[0] is prefix.message and its serialized form is
+    reused; wire, if given, is the JSON of each message after it.
+    """
+    head = json.dumps(params, separators=(",", ":"))[:-1]
+    if prefix is None:
+        return (head + ',"messages":[' + ",".join(map(json.dumps, messages)) + "]}").encode()
+    if wire is None:
+        wire = [json.dumps(m) for m in messages[1:]]
+    return "".join((head, ",", prefix.json, *("," + w for w in wire), "]}")).encode()
+
+
+class Busy(Exception):
+    """The provider kept rate limiting us after every retry."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"rate limited, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(messages, max_tokens):
+    # Charged against the TPM bucket up front and corrected after the call
+    return sum((len(m["content"]) + 3) // 4 + 4 for m in messages) + max_tokens
+
+
+def backoff(attempt, exc):
+    """Seconds to wait before retry `attempt` (full jitter, at least Retry-After)."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if isinstance(exc, groq.RateLimitError):
+        try:
+            retry_after = float(exc.response.headers.get("retry-after", 0))
+        except ValueError:
+            retry_after = 0.0
+        scheduler.pause(retry_after or delay)
+        delay = max(delay, retry_after)
+    return delay
+
+
+async def _create(messages, session, priority, prefix, wire, **params):
+    """Start a completion through the scheduler, retrying transient errors.
+
+    Returns (response, cost, sent_at); the caller must
+    scheduler.release(cost, used).
+    """
+    cost = estimate_tokens(messages, params["max_tokens"])
+    # Posted as ready-made JSON: the SDK's own request validation costs
+    # more per call than the rest of the turn's preparation together
+    body = request_body(messages, params, prefix, wire)
+    stream = params.get("stream", False)
+    for attempt in range(MAX_RETRIES + 1):
+        queued_at = time.perf_counter()
+        await scheduler.acquire(cost, session, priority)
+        sent_at = time.perf_counter()
+        QUEUE_WAIT.observe(sent_at - queued_at)
+        try:
+            response = await asyncio.wait_for(
+                client.post("/openai/v1/chat/completions", content=body, cast_to=ChatCompletion,
+                            options={"headers": {"Content-Type": "application/json"}},
+                            stream=stream, stream_cls=AsyncStream[ChatCompletionChunk]),
+                timeout=REQUEST_TIMEOUT,
+            )
+            return response, cost, sent_at
+        except RETRYABLE as exc:
+            scheduler.release(cost)
+            delay = backoff(attempt, exc)
+            if attempt == MAX_RETRIES:
+                scheduler.metrics["gave_up"] += 1
+                if isinstance(exc, groq.RateLimitError):
+                    raise Busy(delay) from exc
+                raise
+        except BaseException:
+            scheduler.release(cost)
+            raise
+        scheduler.metrics["retries"] += 1
+        await asyncio.sleep(delay)
+
+
+async def complete(messages, model=MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE,
+                   session=None, priority=NORMAL, tools=None, prefix=None, wire=None):
+    """Run one chat completion through the scheduler and the shared pool.
+
+    tools (OpenAI-style function definitions) are offered with
+    tool_choice="auto"; calls come back on the response message. With a
+    Prefix, messages[0] is its system message, its tools are offered and
+    wire may carry the JSON of the remaining messages (see request_body).
+
+    Each attempt is capped at REQUEST_TIMEOUT and raises asyncio.TimeoutError,
+    as does waiting longer than QUEUE_TIMEOUT for a slot. Raises Busy when
+    the provider is still rate limiting after MAX_RETRIES retries.
+    """
+    global _pending
+    _pending += 1
+    try:
+        response, cost, sent_at = await _create(messages, session, priority, prefix, wire, model=model,
+                                                max_tokens=max_tokens, temperature=temperature,
+                                                **_tool_params(None if prefix else tools))
+        elapsed = time.perf_counter() - sent_at
+        FIRST_TOKEN.observe(elapsed, "complete", model)
+        CALL_DURATION.observe(elapsed, "complete", model)
+        usage = getattr(response, "usage", None)
+        _record_usage(usage, model)
+        scheduler.release(cost, usage.total_tokens if usage else None)
+        return response
+    finally:
+        _pending -= 1
+
+
+async def stream(messages, model=MODEL, max_tokens=MAX_TOKENS, temperature=TEMPERATURE,
+                 session=None, priority=NORMAL, tools=None, tool_calls=None, prefix=None, wire=None):
+    """Yield reply text as it is generated.
+
+    Holds a scheduler slot until the stream is exhausted or closed; only
+    the wait for the response headers is retried and bounded by
+    REQUEST_TIMEOUT. Tool calls streamed back are assembled into the
+    tool_calls list as {"name", "arguments"} dicts. prefix and wire are as
+    for complete().
+    """
+    global _pending
+    _pending += 1
+    try:
+        response, cost, sent_at = await _create(messages, session, priority, prefix, wire, model=model,
+                                                max_tokens=max_tokens, temperature=temperature,
+                                                stream=True, **_tool_params(None if prefix else tools))
+        text = 0
+        first = None
+        usage = None
+        try:
+            async with response:
+                async for chunk in response:
+                    usage = chunk.usage or getattr(chunk.x_groq, "usage", None) or usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    for call in delta.tool_calls or ():
+                        if tool_calls is not None:
+                            _add_tool_delta(tool_calls, call)
+                        text += len(call.function.arguments or "") if call.function else 0
+                    if delta.content:
+                        if first is None:
+                            first = time.perf_counter()
+                            FIRST_TOKEN.observe(first - sent_at, "stream", model)
+                        text += len(delta.content)
+                        yield delta.content
+        finally:
+            CALL_DURATION.observe(time.perf_counter() - sent_at, "stream", model)
+            _record_usage(usage, model)
+            used = usage.total_tokens if usage else cost - max_tokens + (text + 3) // 4
+            scheduler.release(cost, used)
+    finally:
+        _pending -= 1
+
+
+def _record_usage(usage, model):
+    if usage:
+        TOKENS.observe(usage.prompt_tokens, "prompt", model)
+        TOKENS.observe(usage.completion_tokens, "completion", model)
+        details = getattr(usage, "prompt_tokens_details", None)
+        if details is not None:
+            TOKENS.observe(details.cached_tokens, "cached", model)
+        prices = PRICES.get(model)
+        if prices:
+            COST.inc(model, value=(usage.prompt_tokens * prices[0]
+                                   + usage.completion_tokens * prices[1]) / 1e6)
+
+
+def _tool_params(tools):
+    return {"tools": tools, "tool_choice": "auto"} if tools else {}
+
+
+def _add_tool_delta(calls, delta):
+    while len(calls) <= delta.index:
+        calls.append({"name": "", "arguments": ""})
+    if delta.function:
+        calls[delta.index]["name"] += delta.function.name or ""
+        calls[delta.index]["arguments"] += delta.function.arguments or ""
+
+
+def in_flight():
+    """Turns currently waiting on or talking to the LLM in this worker."""
+    return _pending
+
+
+async def aclose():
+    await client.close()
@@ -1,20 +1,52 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse, Response
-from pydantic import BaseModel
-from groq import Groq
-from dotenv import load_dotenv
-import os
-import datetime
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional
+import asyncio
+import csv
+import httpx
+import io
 import json
-import re
-
-load_dotenv()
-
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY)
-
-app = FastAPI()
+import math
+import os
+import threading
+import time
+
+from aggregates import OrderAggregates
+from assets import Asset
+from cache import ResponseCache, cache_key
+import context
+import customers
+import feed
+import jobs
+import limits
+import llm
+import order_capture
+import order_store
+import profiler
+import router
+import sessions
+import telemetry
+import tenants
+import voice
+from scheduler import NORMAL, URGENT
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Post-order jobs finish (or are dead-lettered) before the stores close
+    await order_jobs.drain(JOB_DRAIN_TIMEOUT)
+    await llm.aclose()
+    if webhook_client is not None:
+        await webhook_client.aclose()
+    orders.close()
+    conversations.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,600 +54,749 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(telemetry.MetricsMiddleware)
+
+# Store orders and conversation history. Every tenant's orders share the
+# store (tagged with the tenant); sessions share it under tenant-prefixed keys
+orders = order_store.open_store()
+conversations = sessions.open_store()
+
+# Orders are reported through the place_order tool (ORDER_CAPTURE=tools) or
+# as an ORDER_COMPLETE line in the reply text (ORDER_CAPTURE=text)
+ORDER_CAPTURE = os.getenv("ORDER_CAPTURE", "tools")
 
-# Paste your Groq API key here
-from dotenv import load_dotenv
-load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-client = Groq(api_key=GROQ_API_KEY)
+def order_tools(catalog):
+    return [order_capture.order_tool(catalog)] if ORDER_CAPTURE == "tools" else None
 
-# Store orders and conversation history
-orders = []
-conversations = {}
 
-SYSTEM_PROMPT = """You are an order-taking bot. You have ONE job: take food orders.
+def order_step(catalog):
+    if ORDER_CAPTURE == "tools":
+        return ('2. Customer gives name+phone → call place_order with their name, phone and items, '
+                'and say "Confirmed! Shukriya [name]!"')
+    example = next(iter(catalog.prices))
+    return ('2. Customer gives name+phone → say "Confirmed! Shukriya [name]!" then add ORDER_COMPLETE line\n\n'
+            'ORDER_COMPLETE:{"name":"X","phone":"Y","items":["2 ' + example + '"],"total":000}')
 
-MENU: Zinger Burger Rs.350, Chicken Karahi Rs.850, Biryani Rs.450, Fries Rs.150, Cold Drink Rs.100, Pizza Rs.700
+
+def system_prompt(tenant):
+    """The system prompt for a tenant's menu and rules; rendered once per tenant."""
+    if tenant.id == tenants.DEFAULT:
+        intro = "You are an order-taking bot."
+    else:
+        intro = f"You are the order-taking bot for {tenant.name}."
+    rules = "\n" + tenant.rules.strip() if tenant.rules else ""
+    return intro + """ You have ONE job: take food orders.
+
+MENU: """ + tenant.catalog.line + """
 
 VERY IMPORTANT RULES:
 - You MUST remember everything said earlier in this conversation
 - If customer already ordered food, DO NOT ask them to order again
 - If customer gives name and phone, IMMEDIATELY confirm and finish
+- If they are a returning customer and want the same as last time, use their last order""" + rules + """
 
 FLOW:
 1. Customer orders food → say "Got it! [items] total Rs.X. Aapka naam aur number?"
-2. Customer gives name+phone → say "Confirmed! Shukriya [name]!" then add ORDER_COMPLETE line
-
-ORDER_COMPLETE:{"name":"X","phone":"Y","items":["item"],"total":000}
+""" + order_step(tenant.catalog) + """
 
 NEVER say "aapne kuch order nahi kiya" if they already ordered.
 NEVER forget previous messages.
 Keep replies SHORT — max 2-3 lines."""
 
+
+# Restaurants: "default" is the built-in menu, others are TENANTS_DIR/<id>.json
+with open("static/widget.js", encoding="utf-8") as f:
+    WIDGET_TEMPLATE = f.read()
+tenant_registry = tenants.TenantRegistry(
+    os.getenv("TENANTS_DIR", "tenants"), system_prompt, order_tools, WIDGET_TEMPLATE,
+    max_cached=int(os.getenv("TENANT_CACHE", "10000")),
+    max_widgets=int(os.getenv("TENANT_WIDGET_CACHE", "1000")),
+    ttl=float(os.getenv("TENANT_TTL", "300")),
+)
+
+
+def tenant_for(tenant_id):
+    tenant = tenant_registry.get(tenant_id)
+    if tenant is None:
+        raise HTTPException(status_code=404, detail="Unknown restaurant")
+    return tenant
+
+
+# Dashboard numbers, customers and the live order feed, per tenant, created
+# on first use
+tenant_stats = {}
+tenant_customers = {}
+tenant_stats_lock = threading.Lock()  # /admin/stats runs in the threadpool
+order_feeds = {}
+
+
+def stats_for(tenant_id):
+    stats = tenant_stats.get(tenant_id)
+    if stats is None:
+        with tenant_stats_lock:
+            stats = tenant_stats.get(tenant_id)
+            if stats is None:
+                stats = tenant_stats[tenant_id] = OrderAggregates(orders.iter(tenant=tenant_id))
+    return stats
+
+
+def customers_for(tenant_id):
+    index = tenant_customers.get(tenant_id)
+    if index is None:
+        with tenant_stats_lock:
+            index = tenant_customers.get(tenant_id)
+            if index is None:
+                index = tenant_customers[tenant_id] = customers.CustomerIndex(orders.iter(tenant=tenant_id))
+    return index
+
+
+async def load_indexes(tenant_id):
+    """Build tenant's stats and customer index off the event loop if they aren't yet.
+
+    Building them flushes the order store and scans the tenant's orders,
+    and may wait on tenant_stats_lock behind /admin/stats.
+    """
+    if tenant_id not in tenant_stats or tenant_id not in tenant_customers:
+        await asyncio.to_thread(lambda: (stats_for(tenant_id), customers_for(tenant_id)))
+
+
+def feed_for(tenant_id):
+    # New orders are pushed to open admin dashboards (GET /admin/feed)
+    order_feed = order_feeds.get(tenant_id)
+    if order_feed is None:
+        order_feed = order_feeds[tenant_id] = feed.Broadcaster(
+            queue_size=int(os.getenv("FEED_QUEUE", "100")),
+            max_subscribers=int(os.getenv("FEED_MAX_SUBSCRIBERS", "1000")))
+    return order_feed
+
+
+stats = stats_for(tenants.DEFAULT)
+customers_for(tenants.DEFAULT)
+
+# Everything that follows a stored order runs as a background job, so /chat
+# only waits for the store's add(); see jobs.py
+order_jobs = jobs.JobQueue(
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    max_retries=int(os.getenv("JOB_RETRIES", "3")),
+    backoff=float(os.getenv("JOB_BACKOFF", "0.5")),
+    dead_letter_path=os.getenv("JOB_DEAD_LETTERS") or None,
+)
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "10"))
+# Each new order is POSTed as JSON ({"tenant", "order"}) to ORDER_WEBHOOK_URL if set
+ORDER_WEBHOOK_URL = os.getenv("ORDER_WEBHOOK_URL")
+webhook_client = httpx.AsyncClient(timeout=httpx.Timeout(5.0)) if ORDER_WEBHOOK_URL else None
+
+
+def update_dashboard(event):
+    order, order_stats = event["order"], stats_for(event["tenant"])
+    order_stats.record(order)
+    feed_for(event["tenant"]).publish("order", {"order": order, "stats": order_stats.changes(order)})
+
+
+def update_customers(event):
+    customers_for(event["tenant"]).record(event["order"])
+
+
+async def notify_webhook(event):
+    r = await webhook_client.post(ORDER_WEBHOOK_URL, json=event)
+    r.raise_for_status()
+
+
+order_jobs.subscribe("order", update_dashboard)
+order_jobs.subscribe("order", update_customers)
+if ORDER_WEBHOOK_URL:
+    order_jobs.subscribe("order", notify_webhook)
+
+# Pages are read and compressed once at startup
+LANDING_PAGE = Asset.from_file("landing.html", "text/html; charset=utf-8")
+APP_PAGE = Asset.from_file("index.html", "text/html; charset=utf-8")
+ADMIN_PAGE = Asset.from_file("static/admin.html", "text/html; charset=utf-8")
+
+# Longer messages are refused (422) before they reach the LLM
+CHAT_MAX_CHARS = int(os.getenv("CHAT_MAX_CHARS", "1000"))
+
 class Message(BaseModel):
-    text: str
-    session_id: str = "default"
+    text: str = Field(max_length=CHAT_MAX_CHARS)
+    session_id: str = Field("default", max_length=128)
+    tenant: str = tenants.DEFAULT
 
 @app.get("/")
-def home():
-    return FileResponse("landing.html")
+def home(request: Request):
+    return LANDING_PAGE.response(request)
+
+# Identical conversations (shared demo/widget sessions, "hi", "menu") reuse
+# an earlier reply; replies that complete an order are never cached
+reply_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "10000")),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MB", "32")) * 1024 * 1024,
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "600")),
+    skip=(lambda reply: order_capture.ORDER_MARKER in reply) if os.getenv("RESPONSE_CACHE_SKIP_ORDERS", "1") != "0" else None,
+)
+
+
+def record_order(parser, tenant):
+    """Store the order in a parsed reply, if any, as one of tenant's orders.
+
+    Returns (text to show, True if an order was placed, False if one was
+    rejected, None if the reply had none). The order is rebuilt from the
+    menu, so the confirmation shows the real total; a rejected order is
+    reported to the customer instead of confirmed. The tenant's indexes
+    must already be built (load_indexes).
+    """
+    shown = parser.finish()
+    try:
+        order = order_capture.extract(parser, tenant.catalog)
+    except order_capture.OrderError as exc:
+        return f"Maaf kijiye, order confirm nahi ho saka: {exc}. Please dobara batayein.", False
+    if order is None:
+        return shown, None
+    order = orders.add(dict(order, tenant=tenant.id))
+    order_jobs.publish("order", {"tenant": tenant.id, "order": order})
+    if not shown:
+        shown = f"Confirmed! Shukriya {order['name']}!"
+    if f"Rs.{order['total']}" not in shown:
+        shown += f"\n{order_capture.summary(order)}"
+    return shown, True
+
+
+async def load_session(key):
+    if conversations.blocking:
+        return await asyncio.to_thread(conversations.get, key)
+    return conversations.get(key)
+
+
+async def save_session(key, session):
+    if conversations.blocking:
+        await asyncio.to_thread(conversations.save, key, session)
+    else:
+        conversations.save(key, session)
+
+
+async def finish_turn(session_key, session, parser, tenant):
+    """Save the reply to the session, record any order, return the reply to show."""
+    shown, placed = record_order(parser, tenant)
+    # A rejected order is saved as the apology the customer saw, not the
+    # confirmation and order block the model wrote, or the next turn would
+    # take the order as placed
+    context.append(session, "assistant", shown if placed is False else parser.text)
+    if placed:
+        context.order_placed(session)
+    await save_session(session_key, session)
+    return shown
+
+
+def sse(data, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+async def ask_llm(prefix, messages, wire, **schedule):
+    response = await llm.complete([prefix.message, *messages], prefix=prefix, wire=wire, **schedule)
+    message = response.choices[0].message
+    calls = [{"name": c.function.name, "arguments": c.function.arguments}
+             for c in message.tool_calls or ()]
+    return (message.content or "") + order_capture.from_tool_calls(calls)
+
+
+async def stream_llm(prefix, messages, wire, emit, **schedule):
+    """Stream a reply to emit (order block withheld); returns its OrderParser."""
+    parser = order_capture.OrderParser()
+    calls = []
+    async for token in llm.stream([prefix.message, *messages], tool_calls=calls, prefix=prefix,
+                                  wire=wire, **schedule):
+        out = parser.feed(token)
+        if out:
+            emit(out)
+    if not parser.found:
+        parser.feed(order_capture.from_tool_calls(calls))
+    return parser
+
+
+# A session's turns run one at a time: the next message waits until the
+# previous reply is saved, so overlapping requests (several tabs, retries)
+# can't interleave history or record an order twice
+session_locks = sessions.KeyedLock()
+
+
+CHAT_STAGE = telemetry.Histogram(
+    "chat_stage_seconds",
+    "Where /chat time goes: lock_wait (behind the same session), menu (local answer), "
+    "prepare (context + cache key), llm (cache, queue and provider), finish (order capture, saving).",
+    labels=("stage",))
+
+
+def stage(name, since):
+    now = time.perf_counter()
+    CHAT_STAGE.observe(now - since, name)
+    return now
+
+
+async def take_turn(message, tenant, emit=None):
+    """Run one chat turn for tenant's restaurant and return the reply to show.
+
+    With emit, reply text is passed to it as it arrives (order block
+    withheld). The caller must hold the session's lock.
+    """
+    mark = time.perf_counter()
+    key = tenants.session_key(tenant.id, message.session_id)
+    session = await load_session(key) or context.new_session()
+    # Built before any order is added, so they can't count it twice
+    await load_indexes(tenant.id)
+
+    # Menu, price and total questions are answered locally from the menu;
+    # the items in "2 zinger 1 fries total?" still go in the cart
+    quick = tenant.catalog.answer(message.text)
+    if quick is not None:
+        context.observe_user(session, message.text, tenant.catalog)
+        context.append(session, "user", message.text)
+        quick = await finish_turn(key, session, order_capture.parse(quick), tenant)
+        stage("menu", mark)
+        if emit:
+            emit(quick)
+        return quick
+
+    # Only the cart/customer state and the newest turns are sent, so the
+    # prompt stays about the same size however long the session runs
+    context.observe_user(session, message.text, tenant.catalog)
+    context.append(session, "user", message.text)
+    # A repeat customer's last order goes in the state line, so "same as
+    # last time" works
+    if session["state"]["phone"]:
+        session["state"]["customer"] = customers_for(tenant.id).describe(
+            session["state"]["phone"], tenant.catalog)
+    # Simple turns go to the small model; see router
+    route = router.route(session, message.text, tenant.catalog)
+    # The request starts with the tenant's pre-serialized system prompt and
+    # tools; only this session's window and state line are added. The
+    # prompt's key is part of the cache key, so tenants never share replies
+    messages, wire = context.turn_messages(session, tenant.catalog)
+
+    def reply_key(route):
+        return cache_key(messages, prefix=tenant.prefix.key, **route.params())
+
+    # Under rate limiting, customers confirming an order go to the front
+    schedule = {"session": key,
+                "priority": URGENT if context.confirming(session) else NORMAL}
+    mark = stage("prepare", mark)
+
+    if emit is None:
+        parser = order_capture.parse(await reply_cache.fetch(
+            reply_key(route), lambda: ask_llm(tenant.prefix, messages, wire, **route.params(), **schedule)))
+    else:
+        # The first of concurrent identical turns streams; the others wait
+        # for its reply (single-flight) and get it in one piece, as on a hit
+        streamed = []
+
+        async def stream():
+            streamed.append(await stream_llm(tenant.prefix, messages, wire, emit, **route.params(), **schedule))
+            return streamed[0].text
+
+        reply = await reply_cache.fetch(reply_key(route), stream)
+        if streamed:
+            parser = streamed[0]
+        else:
+            parser = order_capture.parse(reply)
+            if parser.shown:
+                emit(parser.shown)
+
+    # A small-model reply that fumbled the order is asked of the large model;
+    # a streamed turn's text is replaced by the "done" event's reply
+    reason = route.small and router.failure(parser, route, session, tenant.catalog)
+    if reason:
+        reply_cache.discard(reply_key(route))
+        route = router.escalate(route, reason)
+        parser = order_capture.parse(await reply_cache.fetch(
+            reply_key(route), lambda: ask_llm(tenant.prefix, messages, wire, **route.params(), **schedule)))
+
+    mark = stage("llm", mark)
+
+    # Save the turn and record a completed order
+    shown = await finish_turn(key, session, parser, tenant)
+    stage("finish", mark)
+    return shown
+
+
+BUSY_DETAIL = "We're very busy right now, please try again in a moment"
+
+
+async def streamed_turn(message, tenant, queue):
+    # Runs as its own task so the turn completes (and the lock and chat
+    # slot are released) even if the client goes away mid-stream
+    try:
+        queued = time.perf_counter()
+        async with session_locks.hold(tenants.session_key(tenant.id, message.session_id)):
+            stage("lock_wait", queued)
+            reply = await take_turn(message, tenant, lambda token: queue.put_nowait(("token", token)))
+        queue.put_nowait(("done", reply))
+    except asyncio.TimeoutError:
+        queue.put_nowait(("error", "LLM request timed out"))
+    except llm.Busy:
+        queue.put_nowait(("error", BUSY_DETAIL))
+    except Exception:
+        queue.put_nowait(("error", "Internal error"))
+        raise
+    finally:
+        chat_slots.release()
+
+
+async def relay(queue):
+    while True:
+        kind, data = await queue.get()
+        if kind == "token":
+            yield sse({"token": data})
+        elif kind == "done":
+            yield sse({"response": data}, event="done")
+            return
+        else:
+            yield sse({"detail": data}, event="error")
+            return
+
+
+turn_tasks = set()
+
+# Admission control (see limits.py): token buckets per client IP and per
+# session from that IP, and a cap on turns in flight. Over any of them,
+# /chat answers 429 with Retry-After at once instead of spending LLM quota
+# or queueing. Sessions are limited per IP so a shared demo session isn't
+# throttled across visitors. ADMISSION_CONTROL=0 turns it all off (benches)
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") != "0"
+ip_limiter = limits.RateLimiter(int(os.getenv("CHAT_IP_RPM", "60")) if ADMISSION_CONTROL else 0,
+                                burst=int(os.getenv("CHAT_IP_BURST", "20")))
+session_limiter = limits.RateLimiter(int(os.getenv("CHAT_SESSION_RPM", "20")) if ADMISSION_CONTROL else 0,
+                                     burst=int(os.getenv("CHAT_SESSION_BURST", "6")))
+chat_slots = limits.ConcurrencyLimit(int(os.getenv("CHAT_MAX_IN_FLIGHT", "500")) if ADMISSION_CONTROL else 0)
+# Proxies in front of the app (the Procfile's platform router is one); the
+# client is the address that many entries from the end of X-Forwarded-For,
+# which the nearest proxy appended and the client can't forge. 0 when
+# clients connect directly
+PROXY_HOPS = int(os.getenv("PROXY_HOPS", "1"))
+RATE_LIMITED_DETAIL = "Too many messages, please slow down"
+
+
+def client_ip(request):
+    if PROXY_HOPS:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            hops = forwarded.split(",")
+            return hops[max(len(hops) - PROXY_HOPS, 0)].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def too_many(detail, wait):
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(math.ceil(wait) or 1)})
+
+
+def admit(request, message, tenant):
+    """Take a chat slot for this turn or raise 429; the turn must release it."""
+    ip = client_ip(request)
+    wait = ip_limiter.hit(ip) or session_limiter.hit((ip, tenant.id, message.session_id))
+    if wait:
+        raise too_many(RATE_LIMITED_DETAIL, wait)
+    if not chat_slots.try_acquire():
+        raise too_many(BUSY_DETAIL, 1)
+
 
 @app.post("/chat")
-def chat(message: Message):
-    if message.session_id not in conversations:
-        conversations[message.session_id] = []
-    
-    history = conversations[message.session_id]
-    history.append({"role": "user", "content": message.text})
-    
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            *history
-        ],
-        max_tokens=500,
-        temperature=0.7
-    )
-    
-    bot_reply = response.choices[0].message.content
-    history.append({"role": "assistant", "content": bot_reply})
-    
-    if len(history) > 20:
-        conversations[message.session_id] = history[-20:]
-    
-    # Detect completed order
-    if "ORDER_COMPLETE:" in bot_reply:
-        try:
-            match = re.search(r'ORDER_COMPLETE:(\{.*\})', bot_reply)
-            if match:
-                order_data = json.loads(match.group(1))
-                order_data["id"] = len(orders) + 1
-                order_data["time"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                orders.append(order_data)
-                bot_reply = bot_reply.replace(match.group(0), "").strip()
-        except:
-            pass
-    
+async def chat(message: Message, request: Request, stream: bool = False):
+    # ?stream=1 sends tokens as server-sent events, then a final "done"
+    # event carrying the full reply with the order block removed
+    tenant = tenant_for(message.tenant)
+    admit(request, message, tenant)
+    if stream:
+        queue = asyncio.Queue()
+        task = asyncio.create_task(streamed_turn(message, tenant, queue))
+        turn_tasks.add(task)
+        task.add_done_callback(turn_tasks.discard)
+        return StreamingResponse(
+            relay(queue),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        queued = time.perf_counter()
+        async with session_locks.hold(tenants.session_key(tenant.id, message.session_id)):
+            stage("lock_wait", queued)
+            bot_reply = await take_turn(message, tenant)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="LLM request timed out")
+    except llm.Busy as exc:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL,
+                            headers={"Retry-After": str(math.ceil(exc.retry_after) or 1)})
+    finally:
+        chat_slots.release()
+
     return {"response": bot_reply}
 
+
+@app.websocket("/voice")
+async def voice_call(websocket: WebSocket, session_id: str = "default", tenant: str = tenants.DEFAULT):
+    # A phone call: caller audio in, spoken replies out (see voice.py).
+    # Each final transcript is a /chat turn on session_id, admitted and
+    # locked the same way; a refused or failed turn is spoken as its error
+    try:
+        tenant = tenant_for(tenant)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    session_id = session_id[:128]
+
+    async def locked_turn(message, emit):
+        try:
+            queued = time.perf_counter()
+            async with session_locks.hold(tenants.session_key(tenant.id, session_id)):
+                stage("lock_wait", queued)
+                return await take_turn(message, tenant, emit)
+        except asyncio.TimeoutError:
+            return "Sorry, that took too long. Could you say it again?"
+        except llm.Busy:
+            return BUSY_DETAIL
+        finally:
+            chat_slots.release()
+
+    async def turn(text, emit):
+        message = Message(text=text[:CHAT_MAX_CHARS], session_id=session_id, tenant=tenant.id)
+        try:
+            admit(websocket, message, tenant)
+        except HTTPException as exc:
+            return exc.detail
+        # Its own task, like streamed_turn: a caller hanging up mid-turn
+        # doesn't cut the turn (or an order) short
+        task = asyncio.create_task(locked_turn(message, emit))
+        turn_tasks.add(task)
+        task.add_done_callback(turn_tasks.discard)
+        return await asyncio.shield(task)
+
+    try:
+        stt, tts = voice.open_stt(), voice.open_tts()
+    except (ImportError, OSError) as exc:
+        await websocket.accept()
+        await websocket.send_json({"type": "error", "detail": f"voice engines unavailable: {exc}"})
+        await websocket.close(code=1011)
+        return
+    await websocket.accept()
+    try:
+        await voice.Call(websocket, turn, stt, tts).run()
+    except WebSocketDisconnect:
+        pass
+
+def order_filters(tenant: str = tenants.DEFAULT, since: Optional[str] = None,
+                  until: Optional[str] = None, phone: Optional[str] = None,
+                  item: Optional[str] = None, min_total: Optional[int] = None):
+    """Query filters shared by /orders and /orders/export; one tenant's orders only."""
+    return {"tenant": tenant_for(tenant).id, "since": since, "until": until, "phone": phone,
+            "item": item, "min_total": min_total}
+
 @app.get("/orders")
-def get_orders():
-    
-    return {"total_orders": len(orders), "orders": orders}
+def get_orders(limit: int = Query(100, ge=1, le=500), cursor: Optional[int] = None,
+               filters: dict = Depends(order_filters)):
+    # Newest first; pass next_cursor back as ?cursor= for the following page
+    page = orders.page(before=cursor, limit=limit, **filters)
+    next_cursor = page[-1]["id"] if len(page) == limit else None
+    return {"total_orders": orders.count(filters["tenant"]), "orders": page, "next_cursor": next_cursor}
+
+CSV_FIELDS = ["id", "time", "name", "phone", "items", "total", "rating"]
+
+def csv_rows(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_FIELDS)
+    for o in rows:
+        writer.writerow([o.get("id"), o.get("time"), o.get("name"), o.get("phone"),
+                         "; ".join(o.get("items", [])), o.get("total"), o.get("rating", "")])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+@app.get("/orders/export")
+def export_orders(format: str = "ndjson", filters: dict = Depends(order_filters)):
+    rows = orders.iter(**filters)
+    if format == "csv":
+        return StreamingResponse(csv_rows(rows), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=orders.csv"})
+    if format == "ndjson":
+        return StreamingResponse((json.dumps(o, ensure_ascii=False) + "\n" for o in rows),
+                                 media_type="application/x-ndjson")
+    raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+@app.get("/customers/{phone}")
+def get_customer(phone: str, tenant: str = tenants.DEFAULT, limit: int = Query(10, ge=0, le=100)):
+    # Any way of writing the number finds the customer; their newest orders come along
+    tenant_id = tenant_for(tenant).id
+    customer = customers_for(tenant_id).get(phone)
+    if customer is None:
+        raise HTTPException(status_code=404, detail="No orders from this number")
+    recent = (orders.get(order_id) for order_id in customer["order_ids"][:limit])
+    return {**customer, "recent_orders": [o for o in recent if o is not None]}
+
 @app.get("/app")
-def serve_frontend():
-    return FileResponse("index.html")
+def serve_frontend(request: Request):
+    return APP_PAGE.response(request)
 
 @app.get("/admin")
-def admin_dashboard():
-    total_revenue = sum(o.get('total', 0) for o in orders)
-    total_orders = len(orders)
-    unique_customers = len(set(o.get('phone','') for o in orders))
-    avg_rating = round(sum(o.get('rating', 0) for o in orders if o.get('rating')) / max(len([o for o in orders if o.get('rating')]), 1), 1)
-
-    # Build chart data
-    from collections import Counter
-    item_counts = Counter()
-    for o in orders:
-        for item in o.get('items', []):
-            item_counts[item] += 1
-    top_items = item_counts.most_common(5)
-    chart_labels = str([i[0] for i in top_items])
-    chart_values = str([i[1] for i in top_items])
-
-    html = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Admin Dashboard</title>
-    <meta charset="UTF-8">
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/Chart.js/4.4.0/chart.umd.min.js"></script>
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{ font-family: 'Inter', sans-serif; background: #0f0f1a; color: #e2e8f0; padding: 24px; }}
-        
-        .header {{
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            padding: 24px 28px;
-            border-radius: 16px;
-            margin-bottom: 24px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }}
-        .header h1 {{ font-size: 22px; font-weight: 700; }}
-        .header p {{ opacity: 0.85; font-size: 13px; margin-top: 4px; }}
-        .live-badge {{
-            background: rgba(255,255,255,0.2);
-            padding: 6px 14px;
-            border-radius: 20px;
-            font-size: 12px;
-            display: flex;
-            align-items: center;
-            gap: 6px;
-        }}
-        .live-dot {{
-            width: 7px; height: 7px;
-            background: #22c55e;
-            border-radius: 50%;
-            animation: blink 2s infinite;
-        }}
-        @keyframes blink {{
-            0%, 100% {{ opacity: 1; }}
-            50% {{ opacity: 0.3; }}
-        }}
-
-        .stats-grid {{
-            display: grid;
-            grid-template-columns: repeat(4, 1fr);
-            gap: 16px;
-            margin-bottom: 24px;
-        }}
-        .stat-card {{
-            background: #1e1e32;
-            border: 1px solid rgba(255,255,255,0.06);
-            padding: 20px;
-            border-radius: 14px;
-        }}
-        .stat-card .icon {{
-            font-size: 24px;
-            margin-bottom: 12px;
-        }}
-        .stat-card .value {{
-            font-size: 28px;
-            font-weight: 700;
-            color: #a78bfa;
-        }}
-        .stat-card .label {{
-            font-size: 13px;
-            color: #64748b;
-            margin-top: 4px;
-        }}
-
-        .charts-grid {{
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 16px;
-            margin-bottom: 24px;
-        }}
-        .chart-card {{
-            background: #1e1e32;
-            border: 1px solid rgba(255,255,255,0.06);
-            padding: 20px;
-            border-radius: 14px;
-        }}
-        .chart-card h3 {{
-            font-size: 14px;
-            font-weight: 600;
-            margin-bottom: 16px;
-            color: #94a3b8;
-        }}
-
-        .orders-card {{
-            background: #1e1e32;
-            border: 1px solid rgba(255,255,255,0.06);
-            border-radius: 14px;
-            overflow: hidden;
-        }}
-        .orders-card-header {{
-            padding: 20px 24px;
-            border-bottom: 1px solid rgba(255,255,255,0.06);
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }}
-        .orders-card-header h3 {{ font-size: 15px; font-weight: 600; }}
-        .orders-count {{
-            background: rgba(167,139,250,0.15);
-            color: #a78bfa;
-            padding: 4px 12px;
-            border-radius: 20px;
-            font-size: 12px;
-        }}
-
-        table {{ width: 100%; border-collapse: collapse; }}
-        th {{
-            padding: 12px 24px;
-            text-align: left;
-            font-size: 12px;
-            color: #475569;
-            font-weight: 500;
-            text-transform: uppercase;
-            letter-spacing: 0.5px;
-            background: #16162a;
-        }}
-        td {{
-            padding: 16px 24px;
-            border-bottom: 1px solid rgba(255,255,255,0.04);
-            font-size: 14px;
-        }}
-        tr:last-child td {{ border-bottom: none; }}
-        tr:hover td {{ background: rgba(255,255,255,0.02); }}
-
-        .badge {{
-            background: rgba(34,197,94,0.15);
-            color: #22c55e;
-            padding: 4px 12px;
-            border-radius: 20px;
-            font-size: 12px;
-            font-weight: 600;
-        }}
-        .rating-stars {{ color: #fbbf24; font-size: 13px; }}
-        .no-orders {{
-            text-align: center;
-            padding: 48px;
-            color: #475569;
-        }}
-        .refresh-btn {{
-            background: rgba(255,255,255,0.1);
-            border: none;
-            color: white;
-            padding: 8px 16px;
-            border-radius: 8px;
-            cursor: pointer;
-            font-size: 13px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <div>
-            <h1>🍽️ AI Restaurant — Admin Dashboard</h1>
-            <p>Real-time order management and analytics</p>
-        </div>
-        <div style="display:flex;gap:12px;align-items:center;">
-            <button class="refresh-btn" onclick="location.reload()">🔄 Refresh</button>
-            <div class="live-badge">
-                <div class="live-dot"></div>
-                Live
-            </div>
-        </div>
-    </div>
-
-    <div class="stats-grid">
-        <div class="stat-card">
-            <div class="icon">📦</div>
-            <div class="value">{total_orders}</div>
-            <div class="label">Total Orders</div>
-        </div>
-        <div class="stat-card">
-            <div class="icon">💰</div>
-            <div class="value">Rs.{total_revenue}</div>
-            <div class="label">Total Revenue</div>
-        </div>
-        <div class="stat-card">
-            <div class="icon">👥</div>
-            <div class="value">{unique_customers}</div>
-            <div class="label">Unique Customers</div>
-        </div>
-        <div class="stat-card">
-            <div class="icon">⭐</div>
-            <div class="value">{avg_rating}/5</div>
-            <div class="label">Avg Rating</div>
-        </div>
-    </div>
-
-    <div class="charts-grid">
-        <div class="chart-card">
-            <h3>📊 Top Ordered Items</h3>
-            <canvas id="itemsChart" height="200"></canvas>
-        </div>
-        <div class="chart-card">
-            <h3>💰 Revenue Overview</h3>
-            <canvas id="revenueChart" height="200"></canvas>
-        </div>
-    </div>
-
-    <div class="orders-card">
-        <div class="orders-card-header">
-            <h3>📋 All Orders</h3>
-            <span class="orders-count">{total_orders} orders</span>
-        </div>
-        {"<table><tr><th>#</th><th>Customer</th><th>Phone</th><th>Items</th><th>Total</th><th>Rating</th><th>Time</th></tr>" + 
-        "".join([f"<tr><td>{o.get('id','')}</td><td><b>{o.get('name','')}</b></td><td>{o.get('phone','')}</td><td>{', '.join(o.get('items',[]))}</td><td><span class='badge'>Rs.{o.get('total','')}</span></td><td><span class='rating-stars'>{'⭐' * o.get('rating',0)}</span></td><td>{o.get('time','')}</td></tr>" for o in reversed(orders)]) +
-        "</table>" if orders else "<div class='no-orders'>No orders yet 🤖</div>"}
-    </div>
-
-    <script>
-        const labels = {chart_labels};
-        const values = {chart_values};
-
-        if (labels.length > 0) {{
-            new Chart(document.getElementById('itemsChart'), {{
-                type: 'bar',
-                data: {{
-                    labels: labels,
-                    datasets: [{{
-                        label: 'Orders',
-                        data: values,
-                        backgroundColor: ['#667eea','#764ba2','#f093fb','#f5576c','#4facfe'],
-                        borderRadius: 8,
-                    }}]
-                }},
-                options: {{
-                    plugins: {{ legend: {{ display: false }} }},
-                    scales: {{
-                        x: {{ ticks: {{ color: '#64748b' }}, grid: {{ color: 'rgba(255,255,255,0.05)' }} }},
-                        y: {{ ticks: {{ color: '#64748b' }}, grid: {{ color: 'rgba(255,255,255,0.05)' }} }}
-                    }}
-                }}
-            }});
-
-            new Chart(document.getElementById('revenueChart'), {{
-                type: 'doughnut',
-                data: {{
-                    labels: labels,
-                    datasets: [{{
-                        data: values,
-                        backgroundColor: ['#667eea','#764ba2','#f093fb','#f5576c','#4facfe'],
-                        borderWidth: 0,
-                    }}]
-                }},
-                options: {{
-                    plugins: {{
-                        legend: {{
-                            position: 'bottom',
-                            labels: {{ color: '#94a3b8', padding: 16, font: {{ size: 12 }} }}
-                        }}
-                    }}
-                }}
-            }});
-        }}
-    </script>
-</body>
-</html>
-"""
-    return HTMLResponse(content=html)
+def admin_dashboard(request: Request):
+    return ADMIN_PAGE.response(request)
+
+@app.get("/admin/stats")
+def admin_stats(tenant: str = tenants.DEFAULT):
+    tenant = tenant_for(tenant)
+    stats = stats_for(tenant.id)
+    order_feed = order_feeds.get(tenant.id)
+    feed_stats = {"subscribers": 0}
+    if order_feed is not None:
+        feed_stats = {"subscribers": len(order_feed), **order_feed.metrics}
+    return {**stats.snapshot(), **stats.rollups(), "response_cache": reply_cache.stats(),
+            "llm_queue": llm.scheduler.stats(), "order_capture": order_capture.stats(),
+            "router": router.stats(),
+            "customers": customers_for(tenant.id).stats(),
+            "jobs": order_jobs.stats(),
+            "order_store": orders.stats(),
+            "voice": voice.stats(),
+            "admission": {"in_flight": chat_slots.stats(), "per_ip": ip_limiter.stats(),
+                          "per_session": session_limiter.stats()},
+            "chat_stages": {s[0]: CHAT_STAGE.summary(*s) for s in CHAT_STAGE.series()},
+            "feed": feed_stats,
+            "tenants": {"cached": len(tenant_registry), **tenant_registry.metrics}}
+
+@app.post("/admin/jobs/retry")
+async def retry_dead_jobs():
+    # Queues every dead-lettered background job again, e.g. once a webhook is back up
+    return {"requeued": order_jobs.retry_dead()}
+
+FEED_HEARTBEAT = 15  # seconds; keeps proxies from closing an idle feed
+# An open stream would hold up uvicorn's graceful shutdown, so each one ends
+# after this long; the browser reconnects with Last-Event-ID and the events
+# published in between are replayed
+FEED_MAX_AGE = float(os.getenv("FEED_MAX_AGE", "60"))
+
+
+async def feed_events(order_feed, last_event_id):
+    # Subscribed here rather than in the endpoint so a client that goes away
+    # before the body starts never leaves a subscriber behind
+    subscriber = order_feed.subscribe(last_event_id)
+    if subscriber is None:
+        return
+    try:
+        yield "retry: 1000\n\n"
+        deadline = time.monotonic() + FEED_MAX_AGE
+        while (left := deadline - time.monotonic()) > 0:
+            try:
+                event_id, event, data = await asyncio.wait_for(subscriber.next(),
+                                                               min(left, FEED_HEARTBEAT))
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+    finally:
+        order_feed.unsubscribe(subscriber)
+
+
+@app.get("/admin/feed")
+async def admin_feed(request: Request, tenant: str = tenants.DEFAULT):
+    # Server-sent events: "order" with the stored order and the aggregate
+    # values it changed, or "resync" when this client missed events and
+    # should refetch /admin/stats and /orders
+    order_feed = feed_for(tenant_for(tenant).id)
+    if order_feed.full():
+        order_feed.metrics["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Too many dashboards connected",
+                            headers={"Retry-After": "30"})
+    return StreamingResponse(
+        feed_events(order_feed, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def feed_totals():
+    totals = {}
+    for order_feed in list(order_feeds.values()):
+        for event, count in order_feed.metrics.items():
+            totals[event] = totals.get(event, 0) + count
+    return totals
+
+
+def journal_totals():
+    totals = {}
+    for store in (orders, conversations):
+        store_journal = getattr(store, "journal", None)
+        if store_journal is not None:
+            totals.update(((store_journal.name, event), n) for event, n in store_journal.metrics.items())
+    return totals
+
+
+# Read at scrape time from what the stores, cache and scheduler already count
+telemetry.Callback("chat_sessions_active", "Sessions stored and not expired.",
+                   lambda: len(conversations))
+telemetry.Callback("chat_sessions_bytes", "Approximate memory held by in-process sessions.",
+                   lambda: getattr(conversations, "bytes", 0))
+telemetry.Callback("chat_sessions_busy", "Sessions with a turn running or queued.",
+                   lambda: len(session_locks))
+telemetry.Callback("orders_stored", "Orders in the order store.", lambda: len(orders))
+telemetry.Callback("orders_write_failures_total", "Orders confirmed to the customer that the store failed to write.",
+                   lambda: orders.stats().get("write_failures", 0), kind="counter")
+telemetry.Callback("admin_feed_subscribers", "Dashboards connected to /admin/feed.",
+                   lambda: sum(len(f) for f in list(order_feeds.values())))
+telemetry.Callback("admin_feed_events_total", "Feed events published, delivered and resynced.",
+                   feed_totals, labels=("event",), kind="counter")
+telemetry.Callback("tenants_cached", "Tenants (and unknown ids) held in the registry.",
+                   lambda: len(tenant_registry))
+telemetry.Callback("tenant_registry_events_total", "Tenant lookups, loads, reloads and evictions.",
+                   lambda: tenant_registry.metrics, labels=("event",), kind="counter")
+telemetry.Callback("llm_in_flight", "Turns waiting on or talking to the LLM.", llm.in_flight)
+telemetry.Callback("llm_queue_depth", "Calls waiting in the scheduler.", lambda: llm.scheduler.queued)
+telemetry.Callback("llm_running", "Calls holding a scheduler slot.", lambda: llm.scheduler.running)
+telemetry.Callback("llm_scheduler_events_total", "Scheduler dispatches, retries, 429s and give-ups.",
+                   lambda: llm.scheduler.metrics, labels=("event",), kind="counter")
+telemetry.Callback("response_cache_events_total", "Reply cache hits, misses, stores and evictions.",
+                   lambda: reply_cache.metrics, labels=("event",), kind="counter")
+telemetry.Callback("session_store_events_total", "Session store hits, misses and evictions.",
+                   lambda: conversations.metrics, labels=("event",), kind="counter")
+telemetry.Callback("journal_events_total", "Records, bytes, fsyncs and snapshots written by the log stores.",
+                   journal_totals, labels=("journal", "event"), kind="counter")
+telemetry.Callback("jobs_pending", "Background jobs queued, running or waiting to retry.",
+                   lambda: order_jobs.pending)
+telemetry.Callback("jobs_oldest_queued_seconds", "How long the oldest queued background job has waited.",
+                   lambda: order_jobs.lag())
+telemetry.Callback("jobs_total", "Background jobs published, done, retried and dead-lettered.",
+                   lambda: order_jobs.metrics, labels=("event",), kind="counter")
+telemetry.Callback("chat_in_flight", "Chat turns holding an admission slot.", lambda: chat_slots.active)
+telemetry.Callback("chat_rejected_total", "Chat requests turned away with 429, by limit.",
+                   lambda: {"ip": ip_limiter.metrics["limited"], "session": session_limiter.metrics["limited"],
+                            "in_flight": chat_slots.metrics["shed"]}, labels=("limit",), kind="counter")
+telemetry.Callback("voice_calls_active", "Voice calls connected.", lambda: voice.active_calls)
+telemetry.Callback("voice_events_total", "Voice calls, turns, barge-ins and errors.",
+                   lambda: voice.metrics, labels=("event",), kind="counter")
+telemetry.Callback("llm_route_turns_total", "Turns routed, by classified kind and model.",
+                   lambda: router.metrics, labels=("kind", "model"), kind="counter")
+telemetry.Callback("llm_route_escalations_total", "Small-model replies retried on the large model.",
+                   lambda: router.escalations, labels=("reason",), kind="counter")
+telemetry.Callback("order_capture_total", "Orders captured, rejected and total-corrected.",
+                   lambda: order_capture.metrics, labels=("result",), kind="counter")
+telemetry.Callback("order_capture_failures_total", "Rejected orders by reason.",
+                   lambda: order_capture.failures, labels=("reason",), kind="counter")
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
+# Off unless PROFILER=1: samples the event loop's stack for ?seconds= and
+# returns collapsed stacks (flamegraph.pl / speedscope); ?focus=take_turn
+# keeps only samples from inside the chat hot path
+PROFILER = os.getenv("PROFILER") == "1"
+
+@app.get("/debug/profile")
+async def profile(seconds: float = Query(10, gt=0, le=120), hz: int = Query(100, ge=1, le=1000),
+                  focus: Optional[str] = None):
+    if not PROFILER:
+        raise HTTPException(status_code=404, detail="Not Found")
+    sampler = profiler.SamplingProfiler(threading.get_ident(), hz, focus).start()
+    await asyncio.sleep(seconds)
+    sampler.stop()
+    return PlainTextResponse(f"# {sampler.samples} samples at {hz} Hz\n" + sampler.collapsed())
 
 @app.get("/widget.js")
-def widget_script():
-    js = """
-(function() {
-    // Inject styles
-    const style = document.createElement('style');
-    style.textContent = `
-        #botwaiter-btn {
-            position: fixed;
-            bottom: 24px;
-            right: 24px;
-            width: 60px;
-            height: 60px;
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            cursor: pointer;
-            box-shadow: 0 8px 24px rgba(102,126,234,0.5);
-            z-index: 99999;
-            transition: transform 0.3s;
-            font-size: 26px;
-            border: none;
-        }
-        #botwaiter-btn:hover { transform: scale(1.1); }
-        #botwaiter-badge {
-            position: absolute;
-            top: -4px;
-            right: -4px;
-            width: 18px;
-            height: 18px;
-            background: #22c55e;
-            border-radius: 50%;
-            border: 2px solid white;
-            animation: bw-blink 2s infinite;
-        }
-        @keyframes bw-blink {
-            0%, 100% { opacity: 1; }
-            50% { opacity: 0.4; }
-        }
-        #botwaiter-window {
-            position: fixed;
-            bottom: 100px;
-            right: 24px;
-            max-height: calc(100vh - 140px);
-            width: 360px;
-            height: 520px;
-            max-height: calc(100vh - 160px);
-            background: #0f0f1a;
-            border-radius: 20px;
-            box-shadow: 0 20px 60px rgba(0,0,0,0.4);
-            z-index: 99998;
-            display: none;
-            flex-direction: column;
-            overflow: hidden;
-            border: 1px solid rgba(255,255,255,0.08);
-            font-family: 'Segoe UI', sans-serif;
-        }
-        #botwaiter-window.open { display: flex; }
-        .bw-header {
-            background: #1a1a2e;
-            padding: 14px 18px;
-            display: flex;
-            align-items: center;
-            gap: 12px;
-            border-bottom: 1px solid rgba(255,255,255,0.06);
-        }
-        .bw-avatar {
-            width: 38px; height: 38px;
-            background: linear-gradient(135deg, #f093fb, #f5576c);
-            border-radius: 10px;
-            display: flex; align-items: center; justify-content: center;
-            font-size: 18px;
-        }
-        .bw-header-info h4 { color: white; font-size: 13px; margin: 0; }
-        .bw-header-info p { color: #22c55e; font-size: 11px; margin: 2px 0 0; }
-        .bw-close {
-            margin-left: auto;
-            background: none; border: none;
-            color: #64748b; font-size: 20px;
-            cursor: pointer; line-height: 1;
-        }
-        .bw-messages {
-            flex: 1;
-            overflow-y: auto;
-            padding: 16px;
-            display: flex;
-            flex-direction: column;
-            gap: 10px;
-            background: #0f0f1a;
-        }
-        .bw-msg {
-            max-width: 80%;
-            padding: 10px 14px;
-            border-radius: 14px;
-            font-size: 13px;
-            line-height: 1.5;
-            color: #e2e8f0;
-        }
-        .bw-msg.bot {
-            background: #1e1e32;
-            align-self: flex-start;
-            border-radius: 4px 14px 14px 14px;
-            border: 1px solid rgba(255,255,255,0.06);
-        }
-        .bw-msg.user {
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            align-self: flex-end;
-            border-radius: 14px 4px 14px 14px;
-        }
-        .bw-input-area {
-            padding: 12px 16px;
-            background: #1a1a2e;
-            display: flex;
-            gap: 8px;
-            border-top: 1px solid rgba(255,255,255,0.06);
-        }
-        .bw-input {
-            flex: 1;
-            padding: 10px 14px;
-            background: #0f0f1a;
-            border: 1px solid rgba(255,255,255,0.1);
-            border-radius: 10px;
-            color: white;
-            font-size: 13px;
-            outline: none;
-        }
-        .bw-send {
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            border: none; color: white;
-            width: 38px; height: 38px;
-            border-radius: 10px;
-            cursor: pointer; font-size: 16px;
-        }
-        .bw-powered {
-            text-align: center;
-            padding: 8px;
-            background: #1a1a2e;
-            font-size: 11px;
-            color: #475569;
-        }
-        .bw-powered a { color: #667eea; text-decoration: none; }
-    `;
-    document.head.appendChild(style);
-
-    // Create widget button
-    const btn = document.createElement('button');
-    btn.id = 'botwaiter-btn';
-    btn.innerHTML = '🤖<div class="bw-badge" id="botwaiter-badge"></div>';
-    document.body.appendChild(btn);
-
-    // Create chat window
-    const win = document.createElement('div');
-    win.id = 'botwaiter-window';
-    win.innerHTML = `
-        <div class="bw-header">
-            <div class="bw-avatar">🍽️</div>
-            <div class="bw-header-info">
-                <h4>AI Restaurant Assistant</h4>
-                <p>● Online — Ready to help</p>
-            </div>
-            <button class="bw-close" onclick="document.getElementById('botwaiter-window').classList.remove('open')">✕</button>
-        </div>
-        <div class="bw-messages" id="bw-messages">
-            <div class="bw-msg bot">Salam! 👋 I can help you with our menu and orders. Type "menu" to get started!</div>
-        </div>
-        <div class="bw-input-area">
-            <input class="bw-input" id="bw-input" placeholder="Type your message..." />
-            <button class="bw-send" onclick="bwSend()">➤</button>
-        </div>
-        <div class="bw-powered">Powered by <a href="https://web-production-edbf6.up.railway.app" target="_blank">BotWaiter</a></div>
-    `;
-    document.body.appendChild(win);
-
-    // Toggle window
-    btn.onclick = () => {
-        win.classList.toggle('open');
-    };
-
-    // Enter key
-    setTimeout(() => {
-        const input = document.getElementById('bw-input');
-        if (input) input.addEventListener('keypress', (e) => {
-            if (e.key === 'Enter') bwSend();
-        });
-    }, 500);
-
-    // Send message
-    window.bwSend = async function() {
-        const input = document.getElementById('bw-input');
-        const messages = document.getElementById('bw-messages');
-        const text = input.value.trim();
-        if (!text) return;
-
-        const userMsg = document.createElement('div');
-        userMsg.className = 'bw-msg user';
-        userMsg.textContent = text;
-        messages.appendChild(userMsg);
-        input.value = '';
-
-        const typing = document.createElement('div');
-        typing.className = 'bw-msg bot';
-        typing.id = 'bw-typing';
-        typing.textContent = '...';
-        messages.appendChild(typing);
-        messages.scrollTop = messages.scrollHeight;
-
-        try {
-            const res = await fetch('https://web-production-edbf6.up.railway.app/chat', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text: text, session_id: 'widget_session_1' })
-            });
-            const data = await res.json();
-            document.getElementById('bw-typing')?.remove();
-            const botMsg = document.createElement('div');
-            botMsg.className = 'bw-msg bot';
-            botMsg.textContent = data.response;
-            messages.appendChild(botMsg);
-            messages.scrollTop = messages.scrollHeight;
-        } catch(e) {
-            document.getElementById('bw-typing')?.remove();
-        }
-    };
-})();
-"""
-    from fastapi.responses import Response
-    return Response(content=js, media_type="application/javascript")
\ No newline at end of file
+def widget_script(request: Request, tenant: str = tenants.DEFAULT):
+    # Embed with <script src=".../widget.js?tenant=ID">; each tenant's script
+    # is generated once and cached
+    return tenant_registry.widget(tenant_for(tenant)).response(request)
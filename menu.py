@@ -0,0 +1,164 @@
+"""Structured menu and a local answerer for menu, price and total questions.
+
+answer() handles only turns it fully understands and returns None for
+everything else, so the LLM still sees every turn it has to reason about.
+"""
+import difflib
+import re
+from functools import lru_cache
+
+# name -> (price, spellings customers actually type, incl. Roman Urdu)
+MENU = {
+    "Zinger Burger": (350, ["zinger burger", "zinger", "zingar", "zingr", "burger", "burgar"]),
+    "Chicken Karahi": (850, ["chicken karahi", "karahi", "karai", "kadahi", "kadai", "karhai",
+                             "murgh karahi", "chicken karai"]),
+    "Biryani": (450, ["biryani", "biriyani", "briyani", "biryane", "beryani", "biriani"]),
+    "Fries": (150, ["fries", "french fries", "fry", "chips"]),
+    "Cold Drink": (100, ["cold drink", "cold drinks", "drink", "drinks", "coke", "pepsi",
+                         "soft drink", "thanda"]),
+    "Pizza": (700, ["pizza", "piza", "pitza", "pizzah"]),
+}
+
+NUMBERS = {
+    "ek": 1, "aik": 1, "one": 1, "a": 1, "an": 1,
+    "do": 2, "two": 2, "teen": 3, "three": 3, "char": 4, "chaar": 4, "four": 4,
+    "paanch": 5, "panch": 5, "five": 5, "chay": 6, "che": 6, "six": 6,
+}
+
+MENU_WORDS = {"menu", "list", "items", "card"}
+PRICE_WORDS = {"price", "prices", "rate", "rates", "kitne", "kitna", "kitnay", "qeemat",
+               "cost", "much"}
+TOTAL_WORDS = {"total", "bill", "sum", "altogether"}
+FILLER = {
+    "the", "of", "for", "is", "what", "whats", "how", "me", "please", "plz", "pls", "show",
+    "send", "your", "you", "have", "do", "kya", "hai", "hain", "ka", "ki", "ke", "ko",
+    "dikhao", "dikha", "dikhayen", "batao", "bata", "bataen", "bhai", "sir", "aur", "and",
+    "with", "plus", "bana", "banega", "banay", "hoga", "ga", "gi", "will", "be", "it",
+    "x", "?", "hello", "hi", "salam", "assalam", "o", "alaikum", "acha", "ok", "tell",
+    "order", "ya", "or", "ap", "aap", "apka", "apki", "aapka", "aapki", "in", "on",
+}
+
+_TOKEN = re.compile(r"\d+|[a-z]+")
+
+
+def tokens(text):
+    return _TOKEN.findall(text.lower())
+
+
+class Menu:
+    """One restaurant's menu: prices, spellings and the local answerer.
+
+    Everything derived from the table (alias index, prompt line, typo
+    cache) is built once here, so a Menu can be shared by every request.
+    """
+
+    def __init__(self, items):
+        # name -> (price, spellings)
+        self.items = {name: (int(price), list(spellings)) for name, (price, spellings) in items.items()}
+        self.prices = {name: price for name, (price, _) in self.items.items()}
+        # The MENU line of the system prompt is generated from the same table
+        self.line = ", ".join(f"{name} Rs.{price}" for name, price in self.prices.items())
+        self.aliases = {}
+        for name, (_, spellings) in self.items.items():
+            for alias in [name.lower(), *spellings]:
+                self.aliases[tuple(tokens(alias))] = name
+        self.aliases.pop((), None)
+        self.max_alias_words = max((len(a) for a in self.aliases), default=1)
+        self.single_words = [a[0] for a in self.aliases if len(a) == 1]
+        self.fuzzy_word = lru_cache(maxsize=1024)(self._fuzzy_word)
+
+    @classmethod
+    def from_config(cls, config):
+        """Menu from {"Name": price} or {"Name": {"price": n, "aliases": [...]}}."""
+        items = {}
+        for name, entry in config.items():
+            if isinstance(entry, dict):
+                items[name] = (entry["price"], entry.get("aliases", []))
+            else:
+                items[name] = (entry, [])
+        if not items:
+            raise ValueError("menu has no items")
+        return cls(items)
+
+    def _fuzzy_word(self, word):
+        """Closest single-word menu spelling for a typo'd word, if any."""
+        if len(word) < 4:
+            return None
+        match = difflib.get_close_matches(word, self.single_words, n=1, cutoff=0.8)
+        return self.aliases[(match[0],)] if match else None
+
+    def scan(self, text):
+        """Split a message into (items with quantities, other words).
+
+        Items are (name, qty) in the order mentioned; a number right before an
+        item is its quantity, otherwise qty is None.
+        """
+        words = tokens(text)
+        items = []
+        other = []
+        qty = None
+        i = 0
+        while i < len(words):
+            word = words[i]
+            if word.isdigit() or (word in NUMBERS and i + 1 < len(words)
+                                  and self._item_at(words, i + 1)[0]):
+                qty = int(word) if word.isdigit() else NUMBERS[word]
+                i += 1
+                continue
+            name, width = self._item_at(words, i)
+            if name:
+                items.append((name, qty))
+                qty = None
+                i += width
+                continue
+            other.append(word)
+            i += 1
+        return items, other
+
+    def _item_at(self, words, i):
+        for width in range(min(self.max_alias_words, len(words) - i), 0, -1):
+            name = self.aliases.get(tuple(words[i:i + width]))
+            if name:
+                return name, width
+        name = self.fuzzy_word(words[i])
+        return (name, 1) if name else (None, 0)
+
+    def total(self, items):
+        return sum(self.prices[name] * (qty or 1) for name, qty in items)
+
+    def menu_reply(self):
+        return "Hamara menu:\n" + "\n".join(f"• {name} — Rs.{price}" for name, price in self.prices.items())
+
+    def answer(self, text):
+        """Reply to a pure menu/price/total question, or None to ask the LLM."""
+        if len(text) > 200:
+            return None
+        items, other = self.scan(text)
+        words = set(other)
+        unknown = words - FILLER - MENU_WORDS - PRICE_WORDS - TOTAL_WORDS
+        if unknown:
+            return None
+        counted = any(qty for _, qty in items)
+        if items and (words & TOTAL_WORDS or (words & PRICE_WORDS and counted)):
+            merged = {}
+            for name, qty in items:
+                merged[name] = merged.get(name, 0) + (qty or 1)
+            items = list(merged.items())
+            return f"{describe(items)} — total Rs.{self.total(items)}."
+        if words & PRICE_WORDS and items:
+            return ", ".join(f"{name} Rs.{self.prices[name]}"
+                             for name in dict.fromkeys(n for n, _ in items)) + "."
+        if words & MENU_WORDS and not items:
+            return self.menu_reply()
+        return None
+
+
+def describe(items):
+    return ", ".join(f"{qty or 1} {name}" for name, qty in items)
+
+
+# The built-in restaurant; module-level names keep working for it
+DEFAULT = Menu(MENU)
+PRICES = DEFAULT.prices
+total = DEFAULT.total
+answer = DEFAULT.answer
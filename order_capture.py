@@ -0,0 +1,286 @@
+"""Turning the bot's order confirmation into a validated order.
+
+The model reports a finished order either by calling the place_order tool
+(order_tool(), the default) or with an ORDER_COMPLETE:{...} block in its
+text. from_tool_calls() folds a tool call into the same text form, so
+everything downstream (caching, history, parsing) sees one format:
+
+    OrderParser   incremental: fed streamed tokens, passes the visible text
+                  through and cuts the JSON object out by brace matching
+    validate()    resolves items against the menu (aliases, typos,
+                  quantities), checks name and phone, recomputes total
+"""
+import json
+import logging
+import re
+
+import menu
+
+log = logging.getLogger(__name__)
+
+ORDER_MARKER = "ORDER_COMPLETE:"
+MAX_QTY = 50
+# How far past the marker the opening brace may be (spaces, ```json, ...)
+MAX_GAP = 16
+
+
+def order_tool(catalog):
+    """The place_order tool schema, with item names limited to catalog's menu."""
+    return {
+        "type": "function",
+        "function": {
+            "name": "place_order",
+            "description": "Place the customer's order once they have given their name and phone number.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string", "description": "Customer's name"},
+                    "phone": {"type": "string", "description": "Customer's phone number"},
+                    "items": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "item": {"type": "string", "enum": list(catalog.prices)},
+                                "qty": {"type": "integer", "minimum": 1, "maximum": MAX_QTY},
+                            },
+                            "required": ["item", "qty"],
+                        },
+                    },
+                },
+                "required": ["name", "phone", "items"],
+            },
+        },
+    }
+
+
+metrics = {"orders": 0, "failed": 0, "total_corrected": 0}
+failures = {}  # reason -> count
+
+# "2x Zinger", "2 * Zinger", "Zinger x2", "Zinger (2)"
+_LEADING_QTY = re.compile(r"^\s*(\d+)\s*[x×*]?\s*(.+)$", re.I)
+_TRAILING_QTY = re.compile(r"^(.+?)\s*(?:[x×*]\s*(\d+)|\((\d+)\))\s*$", re.I)
+
+
+class OrderError(ValueError):
+    """Why an order was rejected; `reason` is a fixed label for the metrics."""
+
+    def __init__(self, message, reason=None):
+        super().__init__(message)
+        self.reason = reason or message
+
+
+class OrderParser:
+    """Streamed reply text in, visible text out, order JSON cut out.
+
+    feed() returns the text that is safe to show so far: everything except
+    the marker and the JSON object after it. A tail that could still turn
+    into the marker (e.g. "ORDER_") is held until the next token decides.
+    The object's end is found with a brace/string state machine, so text
+    after it (even with braces) is shown and multi-line JSON still parses.
+    """
+
+    TEXT, OBJECT, AFTER = range(3)
+
+    def __init__(self):
+        self.text = ""
+        self.shown = ""
+        self.sent = 0
+        self.phase = self.TEXT
+        self.found = False  # marker seen
+        self.start = -1  # index of the opening brace
+        self.end = -1  # index just past the closing brace
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, token):
+        self.text += token
+        text = self.text
+        out = ""
+        if self.phase == self.TEXT:
+            idx = text.find(ORDER_MARKER, self.sent)
+            if idx == -1:
+                safe = len(text)
+                for k in range(min(len(ORDER_MARKER) - 1, len(text) - self.sent), 0, -1):
+                    if text.endswith(ORDER_MARKER[:k]):
+                        safe -= k
+                        break
+                out = text[self.sent:safe]
+                self.sent = safe
+                self.shown += out
+                return out
+            out = text[self.sent:idx]
+            self.found = True
+            self._pos = idx + len(ORDER_MARKER)
+            self.phase = self.OBJECT
+        if self.phase == self.OBJECT:
+            self._scan()
+            if self.phase == self.OBJECT:
+                self.shown += out
+                return out
+        out += text[self.sent:]
+        self.sent = len(text)
+        self.shown += out
+        return out
+
+    def _scan(self):
+        text = self.text
+        i = self._pos
+        if self.start == -1:
+            brace = text.find("{", i, i + MAX_GAP + 1)
+            if brace == -1:
+                if len(text) - i > MAX_GAP:
+                    self._close(i)  # no object after the marker
+                return
+            self.start = i = brace
+        depth, in_string, escape = self._depth, self._in_string, self._escape
+        n = len(text)
+        while i < n:
+            c = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif c == "\\":
+                    escape = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+                if depth == 0:
+                    self._close(i + 1)
+                    return
+            i += 1
+        self._pos, self._depth, self._in_string, self._escape = i, depth, in_string, escape
+
+    def _close(self, end):
+        self.end = self.sent = end
+        self.phase = self.AFTER
+
+    def order_json(self):
+        """The order object's source text, or None if there is none (yet)."""
+        if self.start >= 0 and self.end > self.start:
+            return self.text[self.start:self.end]
+        return None
+
+    def finish(self):
+        """Visible text once the reply is complete."""
+        if self.phase == self.TEXT and self.sent < len(self.text):
+            # A held tail that never became the marker ("... your ORDER")
+            self.shown += self.text[self.sent:]
+            self.sent = len(self.text)
+        return self.shown.replace("```json", "").replace("```", "").strip()
+
+
+def parse(text):
+    parser = OrderParser()
+    parser.feed(text)
+    return parser
+
+
+def _resolve(entry, catalog):
+    """(name, qty) for one item, given as {"item", "qty"} or free text like "2x Zinger"."""
+    if isinstance(entry, dict):
+        label = str(entry.get("item") or entry.get("name") or "")
+        qty = entry.get("qty", entry.get("quantity"))
+    else:
+        label, qty = str(entry), None
+    match = _LEADING_QTY.match(label)
+    if match:
+        said, label = match.group(1), match.group(2)
+    else:
+        match = _TRAILING_QTY.match(label)
+        said = match and (match.group(2) or match.group(3))
+        if said:
+            label = match.group(1)
+    found, _ = catalog.scan(label)
+    if len(found) != 1:
+        if not found:
+            raise OrderError(f"'{label}' is not on our menu", "unknown item")
+        raise OrderError(f"unclear item '{label}'", "unclear item")
+    name = found[0][0]
+    try:
+        qty = int(qty if qty is not None else said or 1)
+    except (TypeError, ValueError):
+        raise OrderError(f"bad quantity for {name}", "bad quantity")
+    if not 1 <= qty <= MAX_QTY:
+        raise OrderError(f"quantity for {name} must be 1-{MAX_QTY}", "bad quantity")
+    return name, qty
+
+
+def validate(data, catalog=menu.DEFAULT):
+    """Check an order object and rebuild it from catalog, a menu.Menu.
+
+    Returns {"name", "phone", "items", "total"} with items as one menu name
+    per unit and total computed from menu prices; the model's own total is
+    ignored. Raises OrderError saying what is wrong.
+    """
+    if not isinstance(data, dict):
+        raise OrderError("order is not an object")
+    name = str(data.get("name") or "").strip()
+    phone = str(data.get("phone") or "").strip()
+    if not name:
+        raise OrderError("name is missing")
+    if sum(c.isdigit() for c in phone) < 7:
+        raise OrderError("phone number is missing or invalid")
+    entries = data.get("items")
+    if not entries or not isinstance(entries, list):
+        raise OrderError("no items in the order")
+    counts = {}
+    for entry in entries:
+        item, qty = _resolve(entry, catalog)
+        counts[item] = counts.get(item, 0) + qty
+    items = list(counts.items())
+    return {"name": name, "phone": phone,
+            "items": [item for item, qty in items for _ in range(qty)], "total": catalog.total(items)}
+
+
+def extract(parser, catalog=menu.DEFAULT):
+    """Validated order from a parsed reply, None if the reply has no order.
+
+    Raises OrderError (and counts it) when there is an order that fails.
+    """
+    if not parser.found:
+        return None
+    try:
+        source = parser.order_json()
+        if source is None:
+            raise OrderError("order details were cut off")
+        try:
+            data = json.loads(source)
+        except ValueError:
+            raise OrderError("order details were garbled")
+        order = validate(data, catalog)
+    except OrderError as exc:
+        metrics["failed"] += 1
+        failures[exc.reason] = failures.get(exc.reason, 0) + 1
+        log.warning("order capture failed: %s in %r", exc, parser.text[-300:])
+        raise
+    metrics["orders"] += 1
+    if data.get("total") is not None and str(data["total"]).strip() != str(order["total"]):
+        metrics["total_corrected"] += 1
+    return order
+
+
+def from_tool_calls(calls):
+    """ORDER_COMPLETE text for a place_order call among calls ({"name", "arguments"})."""
+    for call in calls or ():
+        if call["name"] == "place_order":
+            return f"\n{ORDER_MARKER}{call['arguments']}"
+    return ""
+
+
+def summary(order):
+    counts = {}
+    for item in order["items"]:
+        counts[item] = counts.get(item, 0) + 1
+    return f"{menu.describe(list(counts.items()))} — total Rs.{order['total']}"
+
+
+def stats():
+    return {**metrics, "failure_reasons": dict(failures)}
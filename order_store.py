@@ -0,0 +1,467 @@
+"""Order persistence.
+
+Orders are plain dicts in the shape /orders has always returned
+({"id", "time", "name", "phone", "items", "total", ...}). Any extra keys the
+bot adds (e.g. "rating") are kept as-is. Every restaurant's orders share
+one store; "tenant" says whose an order is (missing means the built-in
+default restaurant) and every query can be limited to one tenant.
+
+Import/export between that JSON shape and a store:
+
+    python order_store.py export orders.json
+    python order_store.py import orders.json
+"""
+import bisect
+import datetime
+import itertools
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+import journal
+
+DEFAULT_TENANT = "default"
+# Queued to SQLiteOrderStore's writer thread to reserve the next block of ids
+_RESERVE = object()
+
+log = logging.getLogger(__name__)
+
+
+def now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class OrderStore:
+    """Interface every order backend implements.
+
+    add() assigns the id and time and returns the stored order; it must not
+    block on disk so the /chat path stays fast.
+    """
+
+    def add(self, order):
+        raise NotImplementedError
+
+    def get(self, order_id):
+        raise NotImplementedError
+
+    def all(self):
+        raise NotImplementedError
+
+    def by_phone(self, phone):
+        raise NotImplementedError
+
+    def page(self, before=None, limit=50, **filters):
+        """Up to `limit` orders, newest id first, with id < before.
+
+        Filters: tenant, since/until (time range, until exclusive), phone,
+        item (case-insensitive exact name) and min_total.
+        """
+        raise NotImplementedError
+
+    def count(self, tenant=None):
+        """Number of orders, for one tenant or all of them."""
+        raise NotImplementedError
+
+    def iter(self, chunk=500, **filters):
+        """Yield every matching order, newest first, one page at a time."""
+        before = None
+        while True:
+            batch = self.page(before=before, limit=chunk, **filters)
+            yield from batch
+            if len(batch) < chunk:
+                return
+            before = batch[-1]["id"]
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        """Backend counters for /admin/stats; write_failures are orders confirmed but not stored."""
+        return {}
+
+
+class MemoryOrderStore(OrderStore):
+    """Process-local list; fine for tests and single-worker demos."""
+
+    def __init__(self):
+        self._orders = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._counts = {}  # tenant -> orders
+
+    def add(self, order):
+        order = dict(order)
+        with self._lock:
+            order["id"] = next(self._ids)
+            order.setdefault("time", now())
+            self._keep(order)
+        return order
+
+    def _keep(self, order):
+        self._orders.append(order)
+        tenant = order.get("tenant", DEFAULT_TENANT)
+        self._counts[tenant] = self._counts.get(tenant, 0) + 1
+
+    def get(self, order_id):
+        # Orders are appended in id order
+        i = bisect.bisect_left(self._orders, order_id, key=lambda o: o["id"])
+        return self._orders[i] if i < len(self._orders) and self._orders[i]["id"] == order_id else None
+
+    def all(self):
+        return list(self._orders)
+
+    def by_phone(self, phone):
+        return [o for o in self._orders if o.get("phone") == phone]
+
+    def page(self, before=None, limit=50, tenant=None, since=None, until=None, phone=None,
+             item=None, min_total=None):
+        item = item.lower() if item else None
+        end = len(self._orders)
+        if before is not None:
+            end = bisect.bisect_left(self._orders, before, key=lambda o: o["id"])
+        found = []
+        for i in range(end - 1, -1, -1):
+            o = self._orders[i]
+            if len(found) >= limit:
+                break
+            if ((tenant and o.get("tenant", DEFAULT_TENANT) != tenant)
+                    or (since and o["time"] < since)
+                    or (until and o["time"] >= until)
+                    or (phone and o.get("phone") != phone)
+                    or (item and item not in (i.lower() for i in o.get("items", [])))
+                    or (min_total is not None and (o.get("total") or 0) < min_total)):
+                continue
+            found.append(o)
+        return found
+
+    def count(self, tenant=None):
+        return len(self._orders) if tenant is None else self._counts.get(tenant, 0)
+
+    def __len__(self):
+        return len(self._orders)
+
+
+class LoggedOrderStore(MemoryOrderStore):
+    """MemoryOrderStore that survives restarts through a journal.Journal.
+
+    Every order is appended to the journal as it is added (fsynced in
+    batches, off the request path); every journal.snapshot_every orders
+    the whole list is snapshotted. Startup loads the snapshot and replays
+    the orders after it. One process only, like the memory store.
+    """
+
+    def __init__(self, journal):
+        super().__init__()
+        self.journal = journal
+        state, records = journal.recover()
+        for order in (state or []) + records:
+            self._keep(order)
+        self._ids = itertools.count(self._orders[-1]["id"] + 1 if self._orders else 1)
+
+    def add(self, order):
+        order = dict(order)
+        with self._lock:
+            order["id"] = next(self._ids)
+            order.setdefault("time", now())
+            self._keep(order)
+            if self.journal.append(order):
+                # Orders are never changed once stored, so a list copy will do
+                self.journal.snapshot(list(self._orders))
+        return order
+
+    def flush(self):
+        self.journal.flush()
+
+    def close(self):
+        with self._lock:
+            if self.journal.since_snapshot:
+                self.journal.snapshot(list(self._orders))
+        self.journal.close()
+
+    def stats(self):
+        return self.journal.stats()
+
+
+class SQLiteOrderStore(OrderStore):
+    """Orders in a SQLite file shared by every worker.
+
+    Ids come from blocks reserved in one short transaction, so allocation is
+    atomic across processes without a write per order. The next block is
+    reserved ahead on the writer thread, so add() doesn't wait on another
+    worker's write lock unless more than a block of orders arrives at once. Inserts go through a
+    writer thread that group-commits whatever has queued up within
+    flush_interval; reads flush first so they always see every order.
+    A batch that still can't be written after write_retries (the file
+    locked by another worker past sqlite's timeout) is logged whole, so
+    the orders can be recovered from the log; the writer carries on.
+    """
+
+    def __init__(self, path="orders.db", batch_size=256, flush_interval=0.05, id_block=20, write_retries=3):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.id_block = id_block
+        self.write_retries = write_retries
+        self.write_failures = 0
+        self._next = self._end = 0
+        self._id_lock = threading.Lock()
+        self._spare = None  # first id of the block reserved ahead
+        self._reserving = False
+        self._local = threading.local()
+        self._queue = queue.Queue()
+
+        db = self._db()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY,
+                tenant TEXT NOT NULL DEFAULT 'default',
+                time TEXT NOT NULL,
+                phone TEXT,
+                total INTEGER,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS orders_phone ON orders(phone);
+            CREATE INDEX IF NOT EXISTS orders_time ON orders(time);
+            CREATE TABLE IF NOT EXISTS id_blocks (name TEXT PRIMARY KEY, next INTEGER NOT NULL);
+        """)
+        # Files from before multi-tenancy: their orders are the default tenant's
+        if "tenant" not in {row[1] for row in db.execute("PRAGMA table_info(orders)")}:
+            db.execute(f"ALTER TABLE orders ADD COLUMN tenant TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'")
+        db.execute("CREATE INDEX IF NOT EXISTS orders_tenant ON orders(tenant, id)")
+        self._start_writer()
+        self._reserving = True  # the first block too, before any order needs it
+        self._queue.put(_RESERVE)
+
+    def _start_writer(self):
+        self._writer = threading.Thread(target=self._write_loop, name="order-writer", daemon=True)
+        self._writer.start()
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, isolation_level=None, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _reserve(self, count):
+        """Reserve `count` ids for this process and return the first one."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT next FROM id_blocks WHERE name = 'orders'").fetchone()
+            if row is None:
+                first = (db.execute("SELECT MAX(id) FROM orders").fetchone()[0] or 0) + 1
+            else:
+                first = row[0]
+            db.execute("INSERT OR REPLACE INTO id_blocks (name, next) VALUES ('orders', ?)",
+                       (first + count,))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return first
+
+    def _next_id(self):
+        with self._id_lock:
+            if self._next >= self._end:
+                if self._spare is not None:
+                    self._next, self._spare = self._spare, None
+                else:
+                    self._next = self._reserve(self.id_block)
+                self._end = self._next + self.id_block
+            order_id = self._next
+            self._next += 1
+            if self._spare is None and not self._reserving:
+                self._reserving = True
+                self._queue.put(_RESERVE)
+            return order_id
+
+    def _reserve_ahead(self):
+        try:
+            first = self._reserve(self.id_block)
+        except Exception:
+            log.exception("could not reserve order ids ahead")  # add() will reserve them itself
+            first = None
+        with self._id_lock:
+            self._spare = first
+            self._reserving = False
+
+    def add(self, order):
+        order = dict(order)
+        order["id"] = self._next_id()
+        order.setdefault("time", now())
+        if not self._writer.is_alive():
+            log.error("order writer thread had stopped, restarting it")
+            self._start_writer()
+        self._queue.put(order)
+        return order
+
+    def _write_loop(self):
+        db = self._db()
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            if batch[0] is None:
+                batch, stop = [], True
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            try:
+                orders = [item for item in batch if item is not _RESERVE]
+                if len(orders) < len(batch):
+                    self._reserve_ahead()
+                if orders:
+                    self._write(db, orders)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+
+    def _write(self, db, batch):
+        for attempt in range(self.write_retries + 1):
+            try:
+                self._insert(db, batch)
+                return
+            except Exception as exc:
+                error = exc
+                if attempt < self.write_retries:
+                    time.sleep(0.1 * 2 ** attempt)
+        self.write_failures += len(batch)
+        log.error("could not store %d orders (%s): %s", len(batch), error,
+                  json.dumps(batch, ensure_ascii=False, default=str))
+
+    @staticmethod
+    def _insert(db, batch):
+        with db:
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT OR REPLACE INTO orders (id, tenant, time, phone, total, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(o["id"], o.get("tenant", DEFAULT_TENANT), o["time"], o.get("phone"), o.get("total"),
+                  json.dumps(o)) for o in batch])
+
+    def stats(self):
+        return {"write_failures": self.write_failures, "queued": self._queue.qsize()}
+
+    def flush(self):
+        # Not queue.join(): that would wait forever if the writer had died
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks and self._writer.is_alive():
+                done.wait(0.1)
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+    def _select(self, where="", params=()):
+        self.flush()
+        rows = self._db().execute(f"SELECT data FROM orders {where} ORDER BY id", params)
+        return [json.loads(r[0]) for r in rows]
+
+    def get(self, order_id):
+        found = self._select("WHERE id = ?", (order_id,))
+        return found[0] if found else None
+
+    def all(self):
+        return self._select()
+
+    def by_phone(self, phone):
+        return self._select("WHERE phone = ?", (phone,))
+
+    def page(self, before=None, limit=50, tenant=None, since=None, until=None, phone=None,
+             item=None, min_total=None):
+        where, params = [], []
+        for clause, value in (("id < ?", before), ("tenant = ?", tenant),
+                              ("time >= ?", since), ("time < ?", until),
+                              ("phone = ?", phone), ("total >= ?", min_total)):
+            if value is not None and value != "":
+                where.append(clause)
+                params.append(value)
+        if item:
+            where.append("EXISTS (SELECT 1 FROM json_each(data, '$.items') "
+                         "WHERE value = ? COLLATE NOCASE)")
+            params.append(item)
+        params.append(limit)
+        self.flush()
+        rows = self._db().execute(
+            "SELECT data FROM orders" + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY id DESC LIMIT ?", params)
+        return [json.loads(r[0]) for r in rows]
+
+    def count(self, tenant=None):
+        self.flush()
+        if tenant is None:
+            return self._db().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+        return self._db().execute("SELECT COUNT(*) FROM orders WHERE tenant = ?", (tenant,)).fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def import_orders(self, orders):
+        """Copy orders keeping their ids, and move id allocation past them."""
+        self.flush()
+        batch = [dict(o, time=o.get("time") or now()) for o in orders]
+        self._insert(self._db(), batch)
+        top = max((o["id"] for o in batch), default=0)
+        with self._id_lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO id_blocks (name, next) VALUES ('orders', "
+                       "MAX(?, COALESCE((SELECT next FROM id_blocks WHERE name = 'orders'), 1)))",
+                       (top + 1,))
+            self._next = self._end = 0
+        return len(batch)
+
+
+def open_store():
+    """Build the store selected by ORDER_STORE (sqlite, log or memory)."""
+    kind = os.getenv("ORDER_STORE", "sqlite")
+    if kind == "memory":
+        return MemoryOrderStore()
+    if kind == "log":
+        return LoggedOrderStore(journal.Journal(
+            os.getenv("JOURNAL_DIR", "journal"), "orders",
+            fsync_interval=float(os.getenv("JOURNAL_FSYNC_INTERVAL", "0.05")),
+            snapshot_every=int(os.getenv("JOURNAL_SNAPSHOT_EVERY", "100000"))))
+    return SQLiteOrderStore(os.getenv("ORDER_DB", "orders.db"))
+
+
+def main(argv):
+    if len(argv) != 3 or argv[1] not in ("import", "export"):
+        sys.exit("usage: python order_store.py import|export FILE.json")
+    store = SQLiteOrderStore(os.getenv("ORDER_DB", "orders.db"))
+    if argv[1] == "export":
+        data = store.all()
+        with open(argv[2], "w") as f:
+            json.dump({"total_orders": len(data), "orders": data}, f, indent=2, ensure_ascii=False)
+        print(f"exported {len(data)} orders to {argv[2]}")
+    else:
+        with open(argv[2]) as f:
+            data = json.load(f)
+        count = store.import_orders(data["orders"] if isinstance(data, dict) else data)
+        print(f"imported {count} orders into {store.path}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,53 @@
+"""Low-rate sampling profiler for the event loop thread.
+
+A daemon thread reads the target thread's current Python stack every
+1/hz seconds (sys._current_frames) and counts identical stacks. Nothing is
+installed in the profiled code, so the cost is the sampler's own CPU time
+(a few µs per sample) and the request path is untouched while it's off.
+collapsed() returns "frame;frame;frame count" lines, the input format of
+flamegraph.pl and speedscope.
+"""
+import collections
+import os
+import sys
+import threading
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id, hz=100, focus=None):
+        self.thread_id = thread_id
+        self.interval = 1.0 / hz
+        self.focus = focus  # keep only stacks with a frame whose name contains this
+        self.samples = 0
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.samples += 1
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if self.focus and not any(self.focus in f for f in stack):
+                continue
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
@@ -0,0 +1,156 @@
+"""Which model answers a chat turn.
+
+Most turns are simple: a greeting, adding or removing items, giving a
+name and number. Those go to a small, fast model with a tight max_tokens.
+Complaints, open questions and anything the classifier isn't sure about
+go to the large model. A small-model reply that should have placed an
+order but didn't produce a valid one is asked again of the large model
+(an escalation), so a cheap miss costs latency rather than an order.
+
+    route(session, text, catalog)            Route for a turn, after observe_user()
+    failure(parser, chosen, session, catalog) why a reply needs escalating, or None
+    escalate(chosen, reason)                 the large-model Route to retry with
+"""
+import json
+import logging
+import os
+import re
+
+import context
+import llm
+import menu
+import order_capture
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("MODEL_ROUTING", "1") != "0"
+SMALL_MODEL = os.getenv("GROQ_SMALL_MODEL", "llama-3.1-8b-instant")
+SMALL_MAX_TOKENS = int(os.getenv("GROQ_SMALL_MAX_TOKENS", "150"))
+SMALL_TEMPERATURE = float(os.getenv("GROQ_SMALL_TEMPERATURE", "0.3"))
+# Below this the turn goes to the large model whatever it looks like
+MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.6"))
+
+SMALL_KINDS = {"greeting", "adding", "details"}
+GREETINGS = {"hi", "hello", "hey", "salam", "salaam", "assalam", "assalamualaikum", "aoa", "o",
+             "alaikum", "walaikum", "shukriya", "shukria", "thanks", "thank", "thx", "you",
+             "jazakallah", "ok", "okay", "acha", "theek", "thik", "hai", "bye", "allah", "hafiz"}
+COMPLAINT_WORDS = {"complaint", "shikayat", "late", "cold", "wrong", "galat", "refund", "bekar",
+                   "bakwas", "ganda", "kharab", "missing", "aya", "ayi", "manager", "worst", "bad",
+                   "bura", "disappointed", "angry"}
+QUESTION_WORDS = {"?", "kya", "konsa", "kaunsa", "kaisa", "kaisi", "kyun", "why", "which", "when",
+                  "kab", "time", "der", "spicy", "best", "recommend", "delivery", "open", "kahan",
+                  "where", "halal", "deal", "deals", "discount"}
+ORDER_WORDS = {"add", "karo", "kar", "do", "de", "dein", "chahiye", "mujhe", "hata", "hatao",
+               "remove", "cancel", "aur", "bhi", "want", "need", "i", "get", "give", "nahi",
+               "ek", "aik", "one", "extra", "more", "zyada", "kam", "less", "naam", "mera", "meri",
+               "name", "number", "phone", "is", "my", "main", "hoon"}
+
+_WORDS = re.compile(r"[a-z0-9']+|\?")
+
+metrics = {}  # (kind, model) -> turns
+escalations = {}  # reason -> count
+
+
+class Route:
+    """The model and generation limits chosen for one turn."""
+
+    __slots__ = ("kind", "confidence", "model", "max_tokens", "temperature", "escalated")
+
+    def __init__(self, kind, confidence, model, max_tokens, temperature, escalated=None):
+        self.kind = kind
+        self.confidence = confidence
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.escalated = escalated
+
+    @property
+    def small(self):
+        return self.model != llm.MODEL
+
+    def params(self):
+        """Keyword arguments for llm.complete()/stream() and the cache key."""
+        return {"model": self.model, "max_tokens": self.max_tokens, "temperature": self.temperature}
+
+
+def classify(session, text, catalog=menu.DEFAULT):
+    """(kind, confidence) for a customer message.
+
+    kind is one of greeting, adding, details (name/phone), complaint,
+    question or other.
+    """
+    words = _WORDS.findall(text.lower())
+    if not words:
+        return "other", 0.0
+    found = set(words)
+    items, other = catalog.scan(text)
+    # Words that are part of an item name ("thanda") don't count
+    if COMPLAINT_WORDS.intersection(other):
+        return "complaint", 0.9
+    if context.PHONE.search(text):
+        return "details", 0.9
+    if found & QUESTION_WORDS:
+        return "question", 0.8
+    if items:
+        unknown = [w for w in other if w not in menu.FILLER and w not in ORDER_WORDS]
+        return "adding", 0.9 if len(unknown) <= 1 else max(0.9 - 0.15 * len(unknown), 0.2)
+    name = context.NAME.search(text)
+    if name and name.group(1).lower() not in context.NOT_NAMES:
+        # A name on its own is routine once there is something in the cart
+        return "details", 0.8 if session["state"]["cart"] else 0.5
+    if found <= GREETINGS | menu.FILLER:
+        return "greeting", 0.9
+    return "other", 0.3
+
+
+def large(kind="other", confidence=1.0, escalated=None):
+    return Route(kind, confidence, llm.MODEL, llm.MAX_TOKENS, llm.TEMPERATURE, escalated)
+
+
+def route(session, text, catalog=menu.DEFAULT):
+    """The Route for a turn whose message has been observed into session."""
+    kind, confidence = classify(session, text, catalog)
+    if ENABLED and kind in SMALL_KINDS and confidence >= MIN_CONFIDENCE:
+        chosen = Route(kind, confidence, SMALL_MODEL, SMALL_MAX_TOKENS, SMALL_TEMPERATURE)
+    else:
+        chosen = large(kind, confidence)
+    key = (kind, chosen.model)
+    metrics[key] = metrics.get(key, 0) + 1
+    log.debug("route %s (%.2f) -> %s", kind, confidence, chosen.model)
+    return chosen
+
+
+def failure(parser, chosen, session, catalog=menu.DEFAULT):
+    """Why a reply has to be asked again of the large model, or None.
+
+    A reply fails when it has an order that doesn't validate, or has none
+    on a details turn from a customer with items in the cart and a phone
+    number given. Nothing is counted in order_capture's metrics.
+    """
+    if not parser.found:
+        return "no order" if chosen.kind == "details" and context.confirming(session) else None
+    source = parser.order_json()
+    if source is None:
+        return "order cut off"
+    try:
+        order_capture.validate(json.loads(source), catalog)
+    except order_capture.OrderError as exc:
+        return exc.reason
+    except ValueError:
+        return "order garbled"
+    return None
+
+
+def escalate(chosen, reason):
+    """The large-model Route to retry a failed small-model reply with."""
+    escalations[reason] = escalations.get(reason, 0) + 1
+    log.info("escalating %s turn from %s to %s: %s", chosen.kind, chosen.model, llm.MODEL, reason)
+    return large(chosen.kind, chosen.confidence, escalated=reason)
+
+
+def stats():
+    turns = {}
+    for (kind, model), count in list(metrics.items()):  # /admin/stats reads it from a thread
+        turns.setdefault(model, {})[kind] = count
+    return {"enabled": ENABLED, "small_model": SMALL_MODEL, "large_model": llm.MODEL,
+            "turns": turns, "escalations": dict(escalations)}
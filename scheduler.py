@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+# Lower runs first
+URGENT = 0
+NORMAL = 1
+
+
+class TokenBucket:
+    """Continuously refilling allowance of `limit` units per `period` seconds.
+
+    A limit of 0 means unlimited.
+    """
+
+    def __init__(self, limit, period=60.0):
+        self.limit = limit
+        self.rate = limit / period if limit else 0.0
+        self.level = float(limit)
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.limit, self.level + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait(self, n, now):
+        """Seconds until n units are available (0 if they are now)."""
+        if not self.limit:
+            return 0.0
+        self._refill(now)
+        n = min(n, self.limit)  # a single oversized call waits for a full bucket, not forever
+        return 0.0 if self.level >= n else (n - self.level) / self.rate
+
+    def take(self, n):
+        if self.limit:
+            self.level -= min(n, self.limit)
+
+    def give(self, n):
+        if self.limit:
+            self.level = min(self.limit, self.level + n)
+
+
+class Scheduler:
+    """Admission control for outbound LLM calls in one worker.
+
+    Callers acquire() before a call and release() after it. Waiting calls
+    are ordered by priority, then by a per-session fair-queueing tag (a
+    session with several queued calls takes turns with the others rather
+    than going first with all of them), then by arrival. A call starts when
+    a concurrency slot is free and the requests/minute and tokens/minute
+    buckets can cover it; pause() holds everything back after a 429.
+    """
+
+    def __init__(self, concurrency=32, rpm=0, tpm=0, period=60.0, queue_timeout=30.0):
+        self.concurrency = concurrency
+        self.requests = TokenBucket(rpm, period)
+        self.tokens = TokenBucket(tpm, period)
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.queued = 0
+        self.paused_until = 0.0
+        self._heap = []  # [priority, tag, seq, future, session, cost, enqueued]
+        self._seq = itertools.count()
+        self._vtime = 0
+        self._tags = {}  # session -> tag of its newest queued call
+        self._timer = None
+        self._waits = deque(maxlen=1000)
+        self.metrics = {"dispatched": 0, "urgent": 0, "timed_out": 0, "rate_limited": 0,
+                        "retries": 0, "gave_up": 0}
+
+    async def acquire(self, cost, session=None, priority=NORMAL):
+        """Wait until a call costing about `cost` tokens may start.
+
+        Raises asyncio.TimeoutError after queue_timeout seconds in the queue.
+        """
+        tag = max(self._vtime, self._tags.get(session, 0)) + 1
+        if session is not None:
+            self._tags[session] = tag
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, [priority, tag, next(self._seq), future, session, cost,
+                                    time.monotonic()])
+        self.queued += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as exc:
+            if future.done() and not future.cancelled():
+                self.release(cost, 0)  # granted just as we gave up
+            else:
+                self.queued -= 1
+                if isinstance(exc, asyncio.TimeoutError):
+                    self.metrics["timed_out"] += 1
+                self._dispatch()
+            raise
+
+    def release(self, cost, used=None):
+        """Free the call's slot; `used` (actual tokens) corrects the estimate."""
+        self.running -= 1
+        if used is not None and used < cost:
+            self.tokens.give(cost - used)
+        self._dispatch()
+
+    def pause(self, seconds):
+        """Hold every queued call for `seconds`, e.g. from a 429 Retry-After."""
+        self.metrics["rate_limited"] += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self._dispatch()
+
+    def _dispatch(self):
+        heap = self._heap
+        now = time.monotonic()
+        while heap:
+            priority, tag, _, future, session, cost, enqueued = heap[0]
+            if future.done():  # caller gave up
+                heapq.heappop(heap)
+                self._forget(session, tag)
+                continue
+            if self.running >= self.concurrency:
+                return
+            delay = max(self.paused_until - now, self.requests.wait(1, now),
+                        self.tokens.wait(cost, now))
+            if delay > 0:
+                self._wake_in(delay)
+                return
+            heapq.heappop(heap)
+            self._forget(session, tag)
+            self._vtime = max(self._vtime, tag)
+            self.requests.take(1)
+            self.tokens.take(cost)
+            self.running += 1
+            self.queued -= 1
+            self.metrics["dispatched"] += 1
+            if priority == URGENT:
+                self.metrics["urgent"] += 1
+            self._waits.append(now - enqueued)
+            future.set_result(None)
+
+    def _forget(self, session, tag):
+        if session is not None and self._tags.get(session) == tag:
+            del self._tags[session]
+
+    def _wake_in(self, delay):
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._timer is not None:
+            if self._timer.when() <= when:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._wake)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self):
+        waits = sorted(self._waits)
+        pick = lambda q: round(waits[min(int(q * len(waits)), len(waits) - 1)] * 1000, 1) if waits else 0.0
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "wait_ms_p50": pick(0.5),
+            "wait_ms_p95": pick(0.95),
+            "wait_ms_max": pick(1.0),
+            **self.metrics,
+        }
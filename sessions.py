@@ -0,0 +1,321 @@
+import asyncio
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import journal
+
+# Rough per-message cost on top of the text itself (dict + two str headers,
+# the serialized copy's header), and for the rest of a session dict (token
+# counts, cart state)
+MESSAGE_OVERHEAD = 330
+SESSION_OVERHEAD = 600
+
+
+def session_size(session):
+    # The text is held twice: in the message and in its serialized copy
+    return SESSION_OVERHEAD + sum(2 * len(m["content"]) + MESSAGE_OVERHEAD for m in session["history"])
+
+
+class KeyedLock:
+    """One asyncio lock per key, created on first use and dropped when idle.
+
+    Turns on the same session run one after another; different sessions
+    never wait on each other. Waiters are served in arrival order. Only
+    within one process: with several workers sharing a store, two turns on
+    one session in different workers can still interleave.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, holders + waiters]
+
+    async def acquire(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._unref(key, entry)
+            raise
+
+    def release(self, key):
+        entry = self._locks[key]
+        entry[0].release()
+        self._unref(key, entry)
+
+    def _unref(self, key, entry):
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def __len__(self):
+        return len(self._locks)
+
+
+class SessionStore:
+    """Where chat sessions (see context.py for the dict layout) live between turns.
+
+    get() returns the stored session, or None for new or expired ones;
+    save() replaces it. Backends count their own evictions in self.metrics.
+    A blocking store's calls can wait on disk or other processes, so the
+    app makes them from a thread rather than the event loop.
+    """
+
+    blocking = False
+
+    def __init__(self):
+        self.metrics = {"hits": 0, "misses": 0, "evicted_ttl": 0, "evicted_lru": 0}
+
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def save(self, session_id, session):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {"sessions": len(self), **self.metrics}
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU with idle TTL and hard caps on sessions and bytes.
+
+    Sessions are kept in access order, so expired ones collect at the front
+    and are swept there on every save.
+    """
+
+    def __init__(self, max_sessions=100_000, max_bytes=256 * 1024 * 1024, ttl=3600):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._data = OrderedDict()  # session_id -> (last_used, size, session)
+
+    def get(self, session_id):
+        entry = self._data.get(session_id)
+        if entry is None:
+            self.metrics["misses"] += 1
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            self._drop(session_id)
+            self.metrics["evicted_ttl"] += 1
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["hits"] += 1
+        return entry[2]
+
+    def save(self, session_id, session):
+        now = time.monotonic()
+        if session_id in self._data:
+            self._drop(session_id)
+        size = session_size(session)
+        self._data[session_id] = (now, size, session)
+        self.bytes += size
+        self._evict(now)
+
+    def delete(self, session_id):
+        if session_id in self._data:
+            self._drop(session_id)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {**super().stats(), "bytes": self.bytes}
+
+    def _drop(self, session_id):
+        self.bytes -= self._data.pop(session_id)[1]
+
+    def _evict(self, now):
+        data = self._data
+        while data:
+            session_id, (last_used, _, _) = next(iter(data.items()))
+            if now - last_used > self.ttl:
+                self.metrics["evicted_ttl"] += 1
+            elif len(data) > self.max_sessions or self.bytes > self.max_bytes:
+                self.metrics["evicted_lru"] += 1
+            else:
+                break
+            self._drop(session_id)
+
+
+class LoggedSessionStore(MemorySessionStore):
+    """MemorySessionStore that survives restarts through a journal.Journal.
+
+    A save logs only what the turn changed: the messages added since the
+    last one logged for the session, how many earlier ones are still kept,
+    the window and the cart/customer state. Deletes are logged too;
+    evictions are not (replay evicts the same sessions again). "wire" is
+    never stored, context rebuilds it on the session's next turn.
+    """
+
+    def __init__(self, journal, **limits):
+        super().__init__(**limits)
+        self.journal = journal
+        self._logged = {}  # session_id -> last message logged
+        state, records = journal.recover()
+        replayed = OrderedDict()  # session_id -> [last used (wall clock), history, tokens, window, state]
+        for session_id, *entry in state or []:
+            replayed[session_id] = entry
+        for record in records:
+            if record[0] == "d":
+                replayed.pop(record[1], None)
+                continue
+            _, session_id, used, keep, messages, tokens, window, session_state = record
+            entry = replayed.pop(session_id, None)
+            history, counts = (entry[1][len(entry[1]) - keep:], entry[2][len(entry[2]) - keep:]) \
+                if entry and keep else ([], [])
+            replayed[session_id] = [used, history + messages, counts + tokens, window, session_state]
+        wall, now = time.time(), time.monotonic()
+        for session_id, (used, history, tokens, window, session_state) in replayed.items():
+            if wall - used > self.ttl:
+                continue
+            session = {"history": history, "tokens": tokens, "window": window, "state": session_state}
+            size = session_size(session)
+            self._data[session_id] = (now - (wall - used), size, session)
+            self.bytes += size
+            if history:
+                self._logged[session_id] = history[-1]
+        self._evict(now)
+
+    def save(self, session_id, session):
+        history = session["history"]
+        last = self._logged.get(session_id)
+        keep = len(history)
+        while keep and history[keep - 1] is not last:
+            keep -= 1
+        record = ("s", session_id, time.time(), keep, history[keep:], session["tokens"][keep:],
+                  session["window"], session["state"])
+        super().save(session_id, session)
+        if history:
+            self._logged[session_id] = history[-1]
+        if self.journal.append(record):
+            self.journal.snapshot(self._state())
+
+    def delete(self, session_id):
+        if session_id in self._data:
+            super().delete(session_id)
+            if self.journal.append(("d", session_id)):
+                self.journal.snapshot(self._state())
+
+    def _drop(self, session_id):
+        super()._drop(session_id)
+        self._logged.pop(session_id, None)
+
+    def _state(self):
+        # Copies of everything a later turn changes in place; marshal'd by the writer thread
+        offset = time.time() - time.monotonic()
+        return [(session_id, used + offset, list(s["history"]), list(s["tokens"]), s["window"],
+                 {**s["state"], "cart": dict(s["state"]["cart"])})
+                for session_id, (used, _, s) in self._data.items()]
+
+    def close(self):
+        if self.journal.since_snapshot:
+            self.journal.snapshot(self._state())
+        self.journal.close()
+
+    def stats(self):
+        return {**super().stats(), "journal": self.journal.stats()}
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file (WAL mode) shared by every uvicorn worker.
+
+    Calls wait up to 10 s for another worker's write lock, so it is a
+    blocking store. "wire" is left out of the row, as in the log store;
+    context rebuilds it on load.
+    """
+
+    blocking = True
+
+    def __init__(self, path="sessions.db", ttl=3600, purge_every=1000):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+        db = self._db()
+        db.execute("CREATE TABLE IF NOT EXISTS sessions ("
+                   "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated)")
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, isolation_level=None, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, session_id):
+        row = self._db().execute(
+            "SELECT data FROM sessions WHERE id = ? AND updated > ?",
+            (session_id, time.time() - self.ttl)).fetchone()
+        if row is None:
+            self.metrics["misses"] += 1
+            return None
+        self.metrics["hits"] += 1
+        return json.loads(row[0])
+
+    def save(self, session_id, session):
+        self._db().execute(
+            "INSERT OR REPLACE INTO sessions (id, data, updated) VALUES (?, ?, ?)",
+            (session_id, json.dumps({k: v for k, v in session.items() if k != "wire"}), time.time()))
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge()
+
+    def delete(self, session_id):
+        self._db().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def purge(self):
+        cur = self._db().execute("DELETE FROM sessions WHERE updated <= ?",
+                                 (time.time() - self.ttl,))
+        self.metrics["evicted_ttl"] += cur.rowcount
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def open_store():
+    """Build the store selected by SESSION_STORE (memory, log or sqlite)."""
+    kind = os.getenv("SESSION_STORE", "memory")
+    ttl = float(os.getenv("SESSION_TTL", "3600"))
+    if kind == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB", "sessions.db"), ttl=ttl)
+    limits = {
+        "max_sessions": int(os.getenv("SESSION_MAX", "100000")),
+        "max_bytes": int(os.getenv("SESSION_MAX_MB", "256")) * 1024 * 1024,
+        "ttl": ttl,
+    }
+    if kind == "log":
+        return LoggedSessionStore(journal.Journal(
+            os.getenv("JOURNAL_DIR", "journal"), "sessions",
+            fsync_interval=float(os.getenv("JOURNAL_FSYNC_INTERVAL", "0.05")),
+            snapshot_every=int(os.getenv("JOURNAL_SNAPSHOT_EVERY", "100000"))), **limits)
+    return MemorySessionStore(**limits)
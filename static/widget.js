@@ -0,0 +1,292 @@
+(function() {
+    // Filled in per restaurant by /widget.js?tenant=ID; replies come from
+    // the server this script was loaded from
+    const BW = __BOTWAITER_CONFIG__;
+    const BW_API = document.currentScript ? new URL(document.currentScript.src).origin : location.origin;
+
+    // One session per visitor and restaurant, kept across page loads
+    let bwSession = null;
+    try {
+        bwSession = localStorage.getItem('botwaiter_session_' + BW.tenant);
+    } catch (e) {}
+    if (!bwSession) {
+        bwSession = 'w_' + Math.random().toString(36).slice(2) + Date.now().toString(36);
+        try {
+            localStorage.setItem('botwaiter_session_' + BW.tenant, bwSession);
+        } catch (e) {}
+    }
+
+    // Inject styles
+    const style = document.createElement('style');
+    style.textContent = `
+        #botwaiter-btn {
+            position: fixed;
+            bottom: 24px;
+            right: 24px;
+            width: 60px;
+            height: 60px;
+            background: linear-gradient(135deg, #667eea, #764ba2);
+            border-radius: 50%;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            cursor: pointer;
+            box-shadow: 0 8px 24px rgba(102,126,234,0.5);
+            z-index: 99999;
+            transition: transform 0.3s;
+            font-size: 26px;
+            border: none;
+        }
+        #botwaiter-btn:hover { transform: scale(1.1); }
+        #botwaiter-badge {
+            position: absolute;
+            top: -4px;
+            right: -4px;
+            width: 18px;
+            height: 18px;
+            background: #22c55e;
+            border-radius: 50%;
+            border: 2px solid white;
+            animation: bw-blink 2s infinite;
+        }
+        @keyframes bw-blink {
+            0%, 100% { opacity: 1; }
+            50% { opacity: 0.4; }
+        }
+        #botwaiter-window {
+            position: fixed;
+            bottom: 100px;
+            right: 24px;
+            max-height: calc(100vh - 140px);
+            width: 360px;
+            height: 520px;
+            max-height: calc(100vh - 160px);
+            background: #0f0f1a;
+            border-radius: 20px;
+            box-shadow: 0 20px 60px rgba(0,0,0,0.4);
+            z-index: 99998;
+            display: none;
+            flex-direction: column;
+            overflow: hidden;
+            border: 1px solid rgba(255,255,255,0.08);
+            font-family: 'Segoe UI', sans-serif;
+        }
+        #botwaiter-window.open { display: flex; }
+        .bw-header {
+            background: #1a1a2e;
+            padding: 14px 18px;
+            display: flex;
+            align-items: center;
+            gap: 12px;
+            border-bottom: 1px solid rgba(255,255,255,0.06);
+        }
+        .bw-avatar {
+            width: 38px; height: 38px;
+            background: linear-gradient(135deg, #f093fb, #f5576c);
+            border-radius: 10px;
+            display: flex; align-items: center; justify-content: center;
+            font-size: 18px;
+        }
+        .bw-header-info h4 { color: white; font-size: 13px; margin: 0; }
+        .bw-header-info p { color: #22c55e; font-size: 11px; margin: 2px 0 0; }
+        .bw-close {
+            margin-left: auto;
+            background: none; border: none;
+            color: #64748b; font-size: 20px;
+            cursor: pointer; line-height: 1;
+        }
+        .bw-messages {
+            flex: 1;
+            overflow-y: auto;
+            padding: 16px;
+            display: flex;
+            flex-direction: column;
+            gap: 10px;
+            background: #0f0f1a;
+        }
+        .bw-msg {
+            max-width: 80%;
+            padding: 10px 14px;
+            border-radius: 14px;
+            font-size: 13px;
+            line-height: 1.5;
+            color: #e2e8f0;
+        }
+        .bw-msg.bot {
+            background: #1e1e32;
+            align-self: flex-start;
+            border-radius: 4px 14px 14px 14px;
+            border: 1px solid rgba(255,255,255,0.06);
+        }
+        .bw-msg.user {
+            background: linear-gradient(135deg, #667eea, #764ba2);
+            align-self: flex-end;
+            border-radius: 14px 4px 14px 14px;
+        }
+        .bw-input-area {
+            padding: 12px 16px;
+            background: #1a1a2e;
+            display: flex;
+            gap: 8px;
+            border-top: 1px solid rgba(255,255,255,0.06);
+        }
+        .bw-input {
+            flex: 1;
+            padding: 10px 14px;
+            background: #0f0f1a;
+            border: 1px solid rgba(255,255,255,0.1);
+            border-radius: 10px;
+            color: white;
+            font-size: 13px;
+            outline: none;
+        }
+        .bw-send {
+            background: linear-gradient(135deg, #667eea, #764ba2);
+            border: none; color: white;
+            width: 38px; height: 38px;
+            border-radius: 10px;
+            cursor: pointer; font-size: 16px;
+        }
+        .bw-powered {
+            text-align: center;
+            padding: 8px;
+            background: #1a1a2e;
+            font-size: 11px;
+            color: #475569;
+        }
+        .bw-powered a { color: #667eea; text-decoration: none; }
+    `;
+    document.head.appendChild(style);
+
+    // Create widget button
+    const btn = document.createElement('button');
+    btn.id = 'botwaiter-btn';
+    btn.innerHTML = '🤖<div class="bw-badge" id="botwaiter-badge"></div>';
+    document.body.appendChild(btn);
+
+    // Create chat window
+    const win = document.createElement('div');
+    win.id = 'botwaiter-window';
+    win.innerHTML = `
+        <div class="bw-header">
+            <div class="bw-avatar">🍽️</div>
+            <div class="bw-header-info">
+                <h4 id="bw-title"></h4>
+                <p>● Online — Ready to help</p>
+            </div>
+            <button class="bw-close" onclick="document.getElementById('botwaiter-window').classList.remove('open')">✕</button>
+        </div>
+        <div class="bw-messages" id="bw-messages">
+            <div class="bw-msg bot" id="bw-greeting"></div>
+        </div>
+        <div class="bw-input-area">
+            <input class="bw-input" id="bw-input" placeholder="Type your message..." />
+            <button class="bw-send" onclick="bwSend()">➤</button>
+        </div>
+        <div class="bw-powered">Powered by <a id="bw-home" target="_blank">BotWaiter</a></div>
+    `;
+    document.body.appendChild(win);
+    // Set as text: names and greetings come from restaurant config
+    document.getElementById('bw-title').textContent = BW.name;
+    document.getElementById('bw-greeting').textContent = BW.greeting;
+    document.getElementById('bw-home').href = BW_API;
+
+    // Toggle window
+    btn.onclick = () => {
+        win.classList.toggle('open');
+    };
+
+    // Enter key
+    setTimeout(() => {
+        const input = document.getElementById('bw-input');
+        if (input) input.addEventListener('keypress', (e) => {
+            if (e.key === 'Enter') bwSend();
+        });
+    }, 500);
+
+    // Send message
+    window.bwSend = async function() {
+        const input = document.getElementById('bw-input');
+        const messages = document.getElementById('bw-messages');
+        const text = input.value.trim();
+        if (!text) return;
+
+        const userMsg = document.createElement('div');
+        userMsg.className = 'bw-msg user';
+        userMsg.textContent = text;
+        messages.appendChild(userMsg);
+        input.value = '';
+
+        const typing = document.createElement('div');
+        typing.className = 'bw-msg bot';
+        typing.id = 'bw-typing';
+        typing.textContent = '...';
+        messages.appendChild(typing);
+        messages.scrollTop = messages.scrollHeight;
+
+        try {
+            const res = await fetch(BW_API + '/chat?stream=1', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ text: text, session_id: bwSession, tenant: BW.tenant })
+            });
+            let botMsg = null;
+            const reply = await bwReadStream(res, (token) => {
+                if (!botMsg) {
+                    document.getElementById('bw-typing')?.remove();
+                    botMsg = document.createElement('div');
+                    botMsg.className = 'bw-msg bot';
+                    messages.appendChild(botMsg);
+                }
+                botMsg.textContent += token;
+                messages.scrollTop = messages.scrollHeight;
+            });
+            document.getElementById('bw-typing')?.remove();
+            if (!botMsg) {
+                botMsg = document.createElement('div');
+                botMsg.className = 'bw-msg bot';
+                messages.appendChild(botMsg);
+            }
+            botMsg.textContent = reply;
+            messages.scrollTop = messages.scrollHeight;
+        } catch(e) {
+            document.getElementById('bw-typing')?.remove();
+            const errMsg = document.createElement('div');
+            errMsg.className = 'bw-msg bot';
+            errMsg.textContent = e.detail || 'Sorry, connection issue. Please try again!';
+            messages.appendChild(errMsg);
+            messages.scrollTop = messages.scrollHeight;
+        }
+    };
+
+    // Read /chat?stream=1 server-sent events; returns the final reply.
+    // Errors carry the server's detail: a refused request (429, 503, 422)
+    // answers with JSON instead of a stream, a failed turn with an "error" event
+    async function bwReadStream(res, onToken) {
+        if (!res.ok) {
+            const body = await res.json().catch(() => ({}));
+            const detail = typeof body.detail === 'string' ? body.detail
+                : res.status === 422 ? 'That message is too long, please shorten it.' : '';
+            throw Object.assign(new Error(detail || res.statusText), { detail: detail });
+        }
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buf = '', reply = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buf += decoder.decode(value, { stream: true });
+            let end;
+            while ((end = buf.indexOf('\n\n')) !== -1) {
+                const line = buf.slice(0, end).split('\n').find(l => l.startsWith('data: '));
+                buf = buf.slice(end + 2);
+                if (!line) continue;
+                const data = JSON.parse(line.slice(6));
+                if (data.detail) throw Object.assign(new Error(data.detail), { detail: data.detail });
+                if (data.token) onToken(data.token);
+                if (data.response !== undefined) reply = data.response;
+            }
+        }
+        return reply;
+    }
+})();
@@ -0,0 +1,193 @@
+"""In-process metrics in the Prometheus text format, without a client library.
+
+Instruments register themselves in REGISTRY when created; render() is what
+/metrics serves. Recording is a dict lookup, a bisect and two additions, so
+it can sit on the hot path. Values that other modules already count (cache
+hits, store sizes, scheduler counters) are read only at scrape time through
+callback instruments.
+"""
+import bisect
+import time
+
+REGISTRY = []
+
+# Seconds; covers fast-path replies (~100 µs) up to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2,
+                   0.3, 0.4, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (25, 50, 100, 200, 300, 400, 500, 750, 1000, 1500, 2000, 4000)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        return self.header() + list(self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        super().__init__(name, doc, labels)
+        self._values = {}
+
+    def inc(self, *labels, value=1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def samples(self):
+        for key, value in list(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+
+
+class Histogram(Metric):
+    """Fixed-bucket histogram; quantile() estimates from the buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def quantile(self, q, *labels):
+        """Linear interpolation inside the bucket holding the q-th observation."""
+        series = self._series.get(labels)
+        if not series:
+            return 0.0
+        counts = series[0]
+        rank = q * sum(counts)
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self, *labels):
+        return {f"p{round(q * 100)}": round(self.quantile(q, *labels), 6) for q in (0.5, 0.95, 0.99)}
+
+    def series(self):
+        return list(self._series)
+
+    def samples(self):
+        for key, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(self.labels + ("le",), key + (_number(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {cumulative}"
+
+
+class Callback(Metric):
+    """Gauge or counter whose value(s) are read from fn() at scrape time.
+
+    fn returns a number, or a dict of label value (or tuple of them) -> number.
+    """
+
+    def __init__(self, name, doc, fn, labels=(), kind="gauge"):
+        super().__init__(name, doc, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            yield f"{self.name} {_number(value)}"
+            return
+        # Copied first: fn may return a dict the event loop is adding keys to
+        # while a scrape runs in the threadpool
+        for key, v in list(value.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            yield f"{self.name}{_labels(self.labels, key)} {_number(v)}"
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_DURATION = Histogram("http_request_duration_seconds",
+                          "Time from request start to the last body byte, by route.",
+                          labels=("method", "route", "status"))
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request into HTTP_DURATION.
+
+    The route label is the matched path template (e.g. /orders), so ids in
+    URLs don't create new series. Streaming responses are timed until their
+    last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+        done = [False]
+
+        def record():
+            done[0] = True
+            route = scope.get("route")
+            HTTP_DURATION.observe(time.perf_counter() - start, scope["method"],
+                                  route.path if route is not None else "unmatched", status[0])
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                record()
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if not done[0]:
+                record()
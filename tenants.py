@@ -0,0 +1,154 @@
+"""Restaurants served by one deployment.
+
+Each tenant other than the built-in "default" is one JSON file,
+TENANTS_DIR/<id>.json:
+
+    {"name": "Karachi Grill",
+     "menu": {"Seekh Kebab": {"price": 400, "aliases": ["kebab", "seekh"]},
+              "Naan": 40},
+     "greeting": "Salam! Kebab ya karahi?",
+     "rules": "- We only deliver in DHA and Clifton"}
+
+Files are read the first time a tenant is asked for; the parsed menu,
+rendered system prompt, tool schema and their serialized request prefix
+are built then and kept in an LRU, so a request for a known tenant costs
+a dict lookup however many tenants there are. A cached tenant's file is re-checked (one stat) every `ttl`
+seconds and rebuilt if it changed; unknown ids are remembered for `ttl`
+too, so a new file is picked up without a restart.
+"""
+import collections
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import llm
+import menu
+from assets import SCRIPT_CACHE, Asset
+
+log = logging.getLogger(__name__)
+
+DEFAULT = "default"
+TENANT_ID = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+WIDGET_PLACEHOLDER = "__BOTWAITER_CONFIG__"
+DEFAULT_NAME = "AI Restaurant Assistant"
+DEFAULT_GREETING = 'Salam! 👋 I can help you with our menu and orders. Type "menu" to get started!'
+
+
+def session_key(tenant_id, session_id):
+    """Store and lock key for a session; tenants can't see each other's sessions.
+
+    Every tenant is prefixed, the default one too: a bare default key would
+    let session_id "acme:demo" name tenant acme's session "demo".
+    """
+    return f"{tenant_id}:{session_id}"
+
+
+class Tenant:
+    """One restaurant's configuration, with everything derived from it built once.
+
+    prompt(tenant) renders the system prompt and tools(catalog) returns the
+    LLM tools for a menu (or None); both come from the app.
+    """
+
+    def __init__(self, tenant_id, config, prompt, tools, mtime=None):
+        self.id = tenant_id
+        self.name = config.get("name") or DEFAULT_NAME
+        self.greeting = config.get("greeting") or DEFAULT_GREETING
+        self.rules = config.get("rules", "")
+        self.catalog = menu.Menu.from_config(config["menu"]) if "menu" in config else menu.DEFAULT
+        self.system_prompt = prompt(self)
+        self.tools = tools(self.catalog)
+        self.prefix = llm.Prefix(self.system_prompt, self.tools)
+        self.mtime = mtime
+
+
+class TenantRegistry:
+    """Tenant lookup with an LRU of built tenants and of their widget scripts.
+
+    Widget scripts are kept in a smaller LRU of their own: with gzip and
+    brotli variants they are the largest thing built per tenant, and
+    browsers cache them anyway.
+    """
+
+    def __init__(self, directory, prompt, tools, widget_template="", max_cached=10_000,
+                 max_widgets=1000, ttl=300):
+        self.directory = directory
+        self.prompt = prompt
+        self.tools = tools
+        self.widget_template = widget_template
+        self.max_cached = max_cached
+        self.max_widgets = max_widgets
+        self.ttl = ttl
+        self.default = Tenant(DEFAULT, {}, prompt, tools)
+        self._cache = collections.OrderedDict()  # id -> (Tenant or None if unknown, checked at)
+        self._widgets = collections.OrderedDict()  # id -> (Tenant, Asset)
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "loads": 0, "reloads": 0, "unknown": 0, "errors": 0,
+                        "evictions": 0, "widgets_built": 0}
+
+    def get(self, tenant_id):
+        """The Tenant for tenant_id, or None if there is no such tenant."""
+        if tenant_id == DEFAULT:
+            return self.default
+        if not TENANT_ID.fullmatch(tenant_id):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(tenant_id)
+            if entry is not None:
+                self._cache.move_to_end(tenant_id)
+        if entry is not None and now - entry[1] < self.ttl:
+            self.metrics["hits"] += 1
+            return entry[0]
+        tenant = self._load(tenant_id, entry[0] if entry else None)
+        with self._lock:
+            self._cache[tenant_id] = (tenant, now)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+                self.metrics["evictions"] += 1
+        return tenant
+
+    def _load(self, tenant_id, cached):
+        path = os.path.join(self.directory, f"{tenant_id}.json")
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self.metrics["unknown"] += 1
+            return None
+        if cached is not None and cached.mtime == mtime:
+            return cached
+        try:
+            with open(path, encoding="utf-8") as f:
+                tenant = Tenant(tenant_id, json.load(f), self.prompt, self.tools, mtime)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+            # Keep serving the last good config rather than taking a tenant down
+            self.metrics["errors"] += 1
+            log.warning("tenant %s: bad config %s: %s", tenant_id, path, exc)
+            return cached
+        self.metrics["reloads" if cached is not None else "loads"] += 1
+        return tenant
+
+    def widget(self, tenant):
+        """The widget script with tenant's id, name and greeting built in."""
+        with self._lock:
+            entry = self._widgets.get(tenant.id)
+            if entry is not None and entry[0] is tenant:
+                self._widgets.move_to_end(tenant.id)
+                return entry[1]
+        config = json.dumps({"tenant": tenant.id, "name": tenant.name, "greeting": tenant.greeting},
+                            ensure_ascii=False)
+        script = Asset(self.widget_template.replace(WIDGET_PLACEHOLDER, config),
+                       "application/javascript", SCRIPT_CACHE)
+        self.metrics["widgets_built"] += 1
+        with self._lock:
+            self._widgets[tenant.id] = (tenant, script)
+            self._widgets.move_to_end(tenant.id)
+            while len(self._widgets) > self.max_widgets:
+                self._widgets.popitem(last=False)
+        return script
+
+    def __len__(self):
+        return len(self._cache)
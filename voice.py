@@ -0,0 +1,449 @@
+"""Voice calls over one WebSocket: caller audio in, spoken replies out.
+
+    caller PCM ─> SpeechToText ─ partial / final transcript ─> chat turn (take_turn)
+                                                                  │ reply text as it streams
+    caller <─ PCM <─ TextToSpeech <─ sentences <─ SentenceChunker <┘
+
+The caller sends 16 kHz mono 16-bit little-endian PCM as binary frames
+(any size) and may send {"type": "stop"} to hang up. The server sends
+JSON text frames ({"type": "ready" | "partial" | "final" | "reply" |
+"barge_in" | "done" | "error", ...}) and the reply audio as binary frames
+at the "ready" message's tts_sample_rate. Partial transcripts are only
+sent back for display; a turn starts from the final one, since a chat
+turn changes the session and can't be taken back if the caller goes on.
+
+Each reply sentence is synthesized and sent as soon as the LLM has
+written it, so the caller hears the first sentence while the rest is
+still being generated. Audio is paced to real time (at most AUDIO_LEAD
+seconds ahead of playback), so when the caller talks over the bot for
+BARGE_IN_MS the rest of the reply is dropped and a "barge_in" message
+tells the client to flush what it has buffered. The chat turn itself
+still completes and is saved, like a streamed /chat turn whose client
+went away.
+
+Engines are picked by STT_ENGINE (vosk, scripted) and TTS_ENGINE
+(piper, tone). vosk and piper are local and offline; the scripted and
+tone engines stand in for them in benches.
+"""
+import array
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import sys
+import time
+
+import telemetry
+
+log = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2
+
+# A frame this loud (RMS of 16-bit samples) counts as speech
+SPEECH_RMS = int(os.getenv("VOICE_SPEECH_RMS", "500"))
+# Silence that ends an utterance, for engines without their own endpointing
+ENDPOINT_MS = int(os.getenv("VOICE_ENDPOINT_MS", "500"))
+# Speech over the bot's reply for this long interrupts it
+BARGE_IN_MS = int(os.getenv("VOICE_BARGE_IN_MS", "200"))
+# How far ahead of playback reply audio is sent
+AUDIO_LEAD = float(os.getenv("VOICE_AUDIO_LEAD", "0.3"))
+# Off: the reply is synthesized in one piece once the LLM has finished
+CHUNK_SENTENCES = os.getenv("VOICE_SENTENCE_CHUNKS", "1") != "0"
+STT_ENGINE = os.getenv("STT_ENGINE", "vosk")
+TTS_ENGINE = os.getenv("TTS_ENGINE", "piper")
+
+LATENCY = telemetry.Histogram(
+    "voice_latency_seconds",
+    "Voice turn latency: transcript (end of speech to final transcript), first_audio (end of "
+    "speech to the first reply audio sent), barge_in (caller speech to the reply stopping).",
+    labels=("stage",))
+
+metrics = {"calls": 0, "turns": 0, "barge_ins": 0, "errors": 0}
+active_calls = 0
+
+
+def frame_rms(frame):
+    samples = array.array("h", frame)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class Vad:
+    """Speech or silence per 20 ms frame by loudness, with the current run lengths."""
+
+    def __init__(self, threshold=SPEECH_RMS):
+        self.threshold = threshold
+        self.speech_ms = 0  # current run of speech
+        self.silence_ms = 0  # current run of silence
+        self._buffer = b""
+
+    def feed(self, pcm):
+        """Yield True/False (speech or not) for each whole frame in pcm."""
+        data = self._buffer + pcm
+        end = len(data) - len(data) % FRAME_BYTES
+        for start in range(0, end, FRAME_BYTES):
+            if frame_rms(data[start:start + FRAME_BYTES]) >= self.threshold:
+                self.speech_ms += FRAME_MS
+                self.silence_ms = 0
+                yield True
+            else:
+                self.silence_ms += FRAME_MS
+                self.speech_ms = 0
+                yield False
+        self._buffer = data[end:]
+
+
+class ScriptedSTT:
+    """Stand-in recognizer: the caller says the next line of a script.
+
+    Utterances are found by loudness (Vad) and end after ENDPOINT_MS of
+    silence; while one lasts, partials reveal its words at
+    words_per_second of speech. Only the audio's timing matters.
+    """
+
+    blocking = False
+
+    def __init__(self, script, words_per_second=2.5, endpoint_ms=ENDPOINT_MS):
+        self.script = list(script)
+        self.words_per_second = words_per_second
+        self.endpoint_ms = endpoint_ms
+        self.vad = Vad()
+        self._speech_ms = 0  # in the current utterance
+        self._shown = 0
+
+    def feed(self, pcm):
+        events = []
+        for speech in self.vad.feed(pcm):
+            if speech:
+                self._speech_ms += FRAME_MS
+                words = self._words()
+                heard = min(int(self._speech_ms / 1000 * self.words_per_second), len(words) - 1)
+                if heard > self._shown:
+                    self._shown = heard
+                    events.append(("partial", " ".join(words[:heard])))
+            elif self._speech_ms and self.vad.silence_ms >= self.endpoint_ms:
+                events.extend(self._final())
+        return events
+
+    def finish(self):
+        return self._final() if self._speech_ms else []
+
+    def _words(self):
+        return self.script[0].split() if self.script else [""]
+
+    def _final(self):
+        self._speech_ms = self._shown = 0
+        return [("final", self.script.pop(0))] if self.script else []
+
+
+_vosk_models = {}
+
+
+class VoskSTT:
+    """Vosk (alphacephei.com/vosk), offline; `pip install vosk` and VOSK_MODEL=<model dir>."""
+
+    blocking = True  # recognition runs in a thread
+
+    def __init__(self, model_path=None):
+        import vosk
+
+        model_path = model_path or os.getenv("VOSK_MODEL", "model")
+        model = _vosk_models.get(model_path)
+        if model is None:
+            model = _vosk_models[model_path] = vosk.Model(model_path)
+        self.recognizer = vosk.KaldiRecognizer(model, SAMPLE_RATE)
+        self._partial = ""
+
+    def feed(self, pcm):
+        if self.recognizer.AcceptWaveform(pcm):
+            self._partial = ""
+            text = json.loads(self.recognizer.Result()).get("text", "")
+            return [("final", text)] if text else []
+        partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        if partial and partial != self._partial:
+            self._partial = partial
+            return [("partial", partial)]
+        return []
+
+    def finish(self):
+        text = json.loads(self.recognizer.FinalResult()).get("text", "")
+        return [("final", text)] if text else []
+
+
+class ToneTTS:
+    """Stand-in synthesizer: a quiet tone as long as the text would take to say.
+
+    Like a real engine rendering a sentence before returning it, the
+    first chunk takes delay plus delay_per_word for each word.
+    """
+
+    def __init__(self, ms_per_word=300, delay=0.03, delay_per_word=0.02, chunk_ms=100, sample_rate=SAMPLE_RATE):
+        self.ms_per_word = ms_per_word
+        self.delay = delay
+        self.delay_per_word = delay_per_word
+        self.chunk_ms = chunk_ms
+        self.sample_rate = sample_rate
+        samples = array.array("h", (int(2000 * math.sin(2 * math.pi * 220 * i / sample_rate))
+                                    for i in range(sample_rate * chunk_ms // 1000)))
+        if sys.byteorder == "big":
+            samples.byteswap()
+        self._chunk = samples.tobytes()
+
+    async def synthesize(self, text):
+        words = max(len(text.split()), 1)
+        await asyncio.sleep(self.delay + self.delay_per_word * words)
+        left = words * self.ms_per_word
+        while left > 0:
+            ms = min(left, self.chunk_ms)
+            yield self._chunk[:self.sample_rate * ms // 1000 * 2]
+            left -= ms
+
+
+class PiperTTS:
+    """Piper (github.com/rhasspy/piper), offline, one process per sentence.
+
+    PIPER_MODEL is the .onnx voice and PIPER_SAMPLE_RATE its rate (from
+    the voice's .json, 22050 for most).
+    """
+
+    def __init__(self, model=None, binary=None, sample_rate=None):
+        self.model = model or os.getenv("PIPER_MODEL", "voice.onnx")
+        binary = binary or os.getenv("PIPER_BINARY", "piper")
+        self.binary = shutil.which(binary)
+        self.sample_rate = sample_rate or int(os.getenv("PIPER_SAMPLE_RATE", "22050"))
+        # Checked here (OSError) so a call is refused up front instead of going quiet at its first reply
+        if self.binary is None:
+            raise FileNotFoundError(f"piper not found: {binary}")
+        if not os.path.exists(self.model):
+            raise FileNotFoundError(f"piper voice not found: {self.model}")
+
+    async def synthesize(self, text):
+        proc = await asyncio.create_subprocess_exec(
+            self.binary, "--model", self.model, "--output_raw",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL)
+        try:
+            proc.stdin.write(text.replace("\n", " ").encode("utf-8") + b"\n")
+            await proc.stdin.drain()
+            proc.stdin.close()
+            while True:
+                chunk = await proc.stdout.read(4096)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+
+
+STT_ENGINES = {"vosk": VoskSTT, "scripted": lambda: ScriptedSTT([])}
+TTS_ENGINES = {"piper": PiperTTS, "tone": ToneTTS}
+
+
+def open_stt():
+    return STT_ENGINES[STT_ENGINE]()
+
+
+def open_tts():
+    return TTS_ENGINES[TTS_ENGINE]()
+
+
+_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+
+
+class SentenceChunker:
+    """Cuts streamed reply text into pieces that can be spoken on their own.
+
+    A piece ends at a sentence end followed by whitespace, or a newline,
+    once it has min_chars; one without a sentence end is cut at a comma
+    or space before max_chars. "Rs.350" is never split.
+    """
+
+    def __init__(self, min_chars=12, max_chars=160):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        pieces = []
+        while True:
+            match = _BOUNDARY.search(self.buffer, self.min_chars - 1 if self.min_chars else 0)
+            if match:
+                cut = match.end()
+            elif len(self.buffer) > self.max_chars:
+                cut = max(self.buffer.rfind(", ", 0, self.max_chars) + 2,
+                          self.buffer.rfind(" ", 0, self.max_chars) + 1) or self.max_chars
+            else:
+                break
+            piece, self.buffer = self.buffer[:cut].strip(), self.buffer[cut:]
+            if piece:
+                pieces.append(piece)
+        return pieces
+
+    def flush(self):
+        piece, self.buffer = self.buffer.strip(), ""
+        return [piece] if piece else []
+
+
+class Call:
+    """One caller's WebSocket: transcribes, runs turns one at a time, speaks replies.
+
+    turn(text, emit) runs a chat turn for a final transcript and returns
+    the reply to show; emit gets the reply text as it streams.
+    """
+
+    def __init__(self, websocket, turn, stt, tts):
+        self.websocket = websocket
+        self.turn = turn
+        self.stt = stt
+        self.tts = tts
+        self.vad = Vad()
+        self.last_speech = time.monotonic()  # end of the caller's latest speech frame
+        self.speech_started = None  # start of the caller's current run of speech
+        self.speaker = None  # task sending the current reply's audio
+        self.turns = asyncio.Queue()
+        self._play_until = 0.0
+
+    async def run(self):
+        global active_calls
+        metrics["calls"] += 1
+        active_calls += 1
+        worker = asyncio.create_task(self._take_turns())
+        try:
+            await self.websocket.send_json({"type": "ready", "sample_rate": SAMPLE_RATE,
+                                            "tts_sample_rate": self.tts.sample_rate})
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    await self.hear(message["bytes"])
+                elif message.get("text") and json.loads(message["text"]).get("type") == "stop":
+                    await self.transcribed(self.stt.finish())
+                    self.turns.put_nowait(None)
+                    await worker  # the last turn's reply is spoken before hanging up
+                    await self.websocket.close()
+                    break
+        finally:
+            active_calls -= 1
+            worker.cancel()
+            if self.speaker is not None:
+                self.speaker.cancel()
+
+    async def hear(self, pcm):
+        now = time.monotonic()
+        for speech in self.vad.feed(pcm):
+            if not speech:
+                self.speech_started = None
+                continue
+            self.last_speech = now
+            if self.speech_started is None:
+                self.speech_started = now
+            if self.vad.speech_ms >= BARGE_IN_MS and self.speaker is not None and not self.speaker.done():
+                await self.barge_in()
+        events = await asyncio.to_thread(self.stt.feed, pcm) if self.stt.blocking else self.stt.feed(pcm)
+        await self.transcribed(events)
+
+    async def transcribed(self, events):
+        for kind, text in events:
+            await self.websocket.send_json({"type": kind, "text": text})
+            if kind == "final":
+                LATENCY.observe(time.monotonic() - self.last_speech, "transcript")
+                self.turns.put_nowait((text, self.last_speech))
+
+    async def barge_in(self):
+        self.speaker.cancel()
+        metrics["barge_ins"] += 1
+        self._play_until = 0.0
+        LATENCY.observe(time.monotonic() - self.speech_started, "barge_in")
+        await self.websocket.send_json({"type": "barge_in"})
+
+    async def _take_turns(self):
+        while True:
+            item = await self.turns.get()
+            if item is None:
+                return
+            try:
+                await self.respond(*item)
+            except Exception:
+                # The call goes on; the caller can say it again
+                metrics["errors"] += 1
+                log.exception("voice turn failed")
+
+    async def respond(self, text, spoke_at):
+        metrics["turns"] += 1
+        sentences = asyncio.Queue()
+        chunker = SentenceChunker() if CHUNK_SENTENCES else None
+        streamed = []
+
+        def emit(piece):
+            streamed.append(piece)
+            if chunker is not None:
+                for sentence in chunker.feed(piece):
+                    sentences.put_nowait(sentence)
+
+        self.speaker = asyncio.create_task(self._speak(sentences, spoke_at))
+        try:
+            reply = await self.turn(text, emit)
+        except Exception:
+            self.speaker.cancel()
+            await self.websocket.send_json({"type": "error", "detail": "Internal error"})
+            raise
+        # The reply may end with more than was streamed (an order summary);
+        # if it was replaced instead (an escalated turn), it is said whole
+        said = "".join(streamed)
+        rest = reply[len(said):] if chunker is not None and reply.startswith(said) else reply
+        for sentence in (chunker.feed(rest) + chunker.flush()) if chunker is not None else [rest]:
+            sentences.put_nowait(sentence)
+        sentences.put_nowait(None)
+        interrupted = False
+        try:
+            await self.speaker
+        except asyncio.CancelledError:
+            if not self.speaker.cancelled():
+                raise
+            interrupted = True
+        except Exception:
+            # Synthesis failed: the reply still goes out as text
+            metrics["errors"] += 1
+            log.exception("voice reply could not be spoken")
+            await self.websocket.send_json({"type": "error", "detail": "Could not speak the reply"})
+        await self.websocket.send_json({"type": "done", "text": reply, "interrupted": interrupted})
+
+    async def _speak(self, sentences, spoke_at):
+        first = True
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                return
+            await self.websocket.send_json({"type": "reply", "text": sentence})
+            async for chunk in self.tts.synthesize(sentence):
+                if first:
+                    LATENCY.observe(time.monotonic() - spoke_at, "first_audio")
+                    first = False
+                await self.websocket.send_bytes(chunk)
+                await self._pace(len(chunk) / 2 / self.tts.sample_rate)
+
+    async def _pace(self, seconds):
+        # Keep at most AUDIO_LEAD of audio queued at the caller, so a
+        # barge-in has little to flush
+        now = time.monotonic()
+        self._play_until = max(self._play_until, now) + seconds
+        ahead = self._play_until - now - AUDIO_LEAD
+        if ahead > 0:
+            await asyncio.sleep(ahead)
+
+
+def stats():
+    return {"active_calls": active_calls, **metrics, "stt": STT_ENGINE, "tts": TTS_ENGINE,
+            "sentence_chunks": CHUNK_SENTENCES}